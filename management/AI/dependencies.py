@@ -0,0 +1,37 @@
+# Define tool dependencies and data flow.
+# "requires" is both the tool's place in the execution graph and the only
+# context its prompt may carry; "token_budget" caps that prompt (see prompts.py).
+# "optional" inputs are passed along when the context has them and are never
+# waited for: the tool runs without them.
+TOOL_DEPENDENCY_MAP = {
+    "analyse_lab_report": {
+        "requires": ["customer_request", "guideline"],
+        "optional": ["parameter_violations"],
+        "provides": ["treatment_specs"],
+        "description": "Analyzes water lab reports to generate treatment specifications"
+    },
+    "treatment_recommendation": {
+        "requires": ["treatment_specs", "customer_request"],
+        "provides": ["ro_system_specs"],
+        "description": "Recommends treatment systems based on analysis",
+        "token_budget": 2000
+    },
+    "ro_sizing": {
+        "requires": ["ro_system_specs", "customer_request"],
+        "provides": ["sizing_details"],
+        "description": "Calculates RO system sizing requirements",
+        "token_budget": 2000
+    },
+    "quotation_generator": {
+        "requires": ["sizing_details", "customer_request"],
+        "provides": ["cost_estimate"],
+        "description": "Generates cost estimates for the system",
+        "token_budget": 2000
+    },
+    "proposal_generator": {
+        "requires": ["ro_system_specs", "customer_request", "cost_estimate"],
+        "provides": ["final_proposal"],
+        "description": "Generates final customer proposal",
+        "token_budget": 3000
+    }
+}
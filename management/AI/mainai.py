@@ -1,13 +1,12 @@
 import os
 from dotenv import load_dotenv
-from typing import Annotated, Sequence, TypedDict, Dict, Any, List, Optional
+from typing import Annotated, Callable, Sequence, TypedDict, Dict, Any, List, Optional
 from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage, SystemMessage
 from langgraph.graph.message import add_messages
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 import requests
 from requests.auth import HTTPBasicAuth
-from langchain_openai import ChatOpenAI
 from decouple import config
 import json
 import logging
@@ -18,6 +17,9 @@ from typing import List, Dict, Any, Optional, Sequence
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from graphlib import TopologicalSorter
 
 class ToolResult(TypedDict):
     tool_name: str
@@ -25,9 +27,9 @@ class ToolResult(TypedDict):
     error: Optional[str]
 
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from .tools import get_pump_details, AgentState
+from .tools import get_pump_details, AgentState, token_listener
+from .dependencies import TOOL_DEPENDENCY_MAP
 
 from .tools import analyse_lab_report,treatment_recommendation,ro_sizing,quotation_generator,proposal_generator
 
@@ -44,15 +46,6 @@ import logging
 tools = [analyse_lab_report,treatment_recommendation,ro_sizing,quotation_generator,proposal_generator ]
 tools_by_name = {tool.name: tool for tool in tools}
 
-# Create LLM class
-llm = ChatGoogleGenerativeAI(
-    model= "gemini-2.0-flash",
-    temperature=1.0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    google_api_key=config('GOOGLE_SECRET_KEY'),
-)
 class SequentialAgentState(TypedDict):
     """State for a sequential tool execution workflow."""
     messages: Annotated[Sequence[BaseMessage], add_messages] # Keep for logging/context if needed
@@ -70,34 +63,6 @@ from typing import Dict, List, Optional, TypedDict
 from pydantic import BaseModel
 import logging
 
-# Define tool dependencies and data flow
-TOOL_DEPENDENCY_MAP = {
-    "analyse_lab_report": {
-        "requires": ["customer_request", "guideline"],
-        "provides": ["treatment_specs"],
-        "description": "Analyzes water lab reports to generate treatment specifications"
-    },
-    "treatment_recommendation": {
-        "requires": ["treatment_specs", "customer_request"],
-        "provides": ["ro_system_specs"],
-        "description": "Recommends treatment systems based on analysis"
-    },
-    "ro_sizing": {
-        "requires": ["ro_system_specs", "customer_request"],
-        "provides": ["sizing_details"],
-        "description": "Calculates RO system sizing requirements"
-    },
-    "quotation_generator": {
-        "requires": ["sizing_details", "customer_request"],
-        "provides": ["cost_estimate"],
-        "description": "Generates cost estimates for the system"
-    },
-    "proposal_generator": {
-        "requires": ["ro_system_specs", "customer_request", "cost_estimate"],
-        "provides": ["final_proposal"],
-        "description": "Generates final customer proposal"
-    }
-}
 
 
 class ToolExecutionResult(BaseModel):
@@ -106,137 +71,249 @@ class ToolExecutionResult(BaseModel):
     error: Optional[str] = None
     missing_inputs: Optional[List[str]] = None
 
+# Upper bound on tools (LLM round-trips) running at once
+MAX_PARALLEL_TOOLS = config('AI_MAX_PARALLEL_TOOLS', default=4, cast=int)
+
+
+class ProgressLog(list):
+    """Execution log that reports every appended entry to an optional callback."""
+
+    def __init__(self, on_progress=None):
+        super().__init__()
+        self.on_progress = on_progress
+
+    def append(self, entry):
+        super().append(entry)
+        if self.on_progress:
+            self.on_progress(entry)
+
+
+def tool_graph(tool_names: Sequence[str]) -> Dict[str, set]:
+    """Map each tool to the tools among ``tool_names`` that provide one of its inputs."""
+    providers: Dict[str, List[str]] = {}
+    for name in tool_names:
+        for output in TOOL_DEPENDENCY_MAP[name]["provides"]:
+            providers.setdefault(output, []).append(name)
+    return {
+        name: {p for inp in TOOL_DEPENDENCY_MAP[name]["requires"] for p in providers.get(inp, []) if p != name}
+        for name in tool_names
+    }
+
+
+def _with_dependencies(target_tool: str) -> List[str]:
+    """The target tool plus every tool it transitively depends on, in map order."""
+    graph = tool_graph(list(TOOL_DEPENDENCY_MAP))
+    selected, stack = set(), [target_tool]
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(graph[name])
+    return [name for name in TOOL_DEPENDENCY_MAP if name in selected]
+
+
+def _invoke_tool(tool_name: str, tool, tool_input: Dict[str, Any], stream=None) -> Dict[str, Any]:
+    """Run one tool and validate its declared outputs; raises ValueError on failure."""
+    logging.debug(f"{tool_name} - Inputs: {tool_input}")
+    listening = None
+    if stream is not None:
+        stream.tool_started(tool_name)
+        listening = token_listener.set(lambda text: stream.token(tool_name, text))
+    try:
+        result = tool.invoke(tool_input)
+        logging.debug(f"{tool_name} - Raw result: {result}")
+
+        if isinstance(result, dict) and 'success' in result:
+            if not result['success']:
+                raise ValueError(f"Tool reported failure: {result.get('error', 'Unknown error')}")
+            tool_output = result['data']
+        else:
+            tool_output = result
+
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON output from tool: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Tool execution failed: {str(e)}")
+    finally:
+        if listening is not None:
+            token_listener.reset(listening)
+
+    expected_outputs = TOOL_DEPENDENCY_MAP[tool_name]["provides"]
+    if not all(out in tool_output for out in expected_outputs):
+        missing = [out for out in expected_outputs if out not in tool_output]
+        raise ValueError(f"Missing expected outputs: {missing}")
+    return tool_output
+
+
 def execute_tool_sequence(
     initial_data: Dict[str, Any],
     target_tool: Optional[str] = None,
-    full_sequence: bool = False
+    full_sequence: bool = False,
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    checkpoints=None,
+    stream=None
 ) -> Dict[str, Any]:
     """
-    Executes tools in logical sequence with comprehensive error handling.
-    
+    Executes tools as a dependency graph with comprehensive error handling.
+
+    The graph comes from the requires/provides declarations in
+    TOOL_DEPENDENCY_MAP. Every tool whose inputs are ready runs concurrently
+    on a bounded thread pool, so independent LLM round-trips overlap.
+
     Args:
         initial_data: Complete input data including customer_request and guideline
-        target_tool: If specified, runs only up to this tool (with dependencies)
+        target_tool: If specified, runs only this tool and its dependencies
         full_sequence: If True, runs all tools regardless of target_tool
-    
+        max_workers: Thread pool size (default MAX_PARALLEL_TOOLS)
+        on_progress: Called with each execution log entry as it is recorded
+        checkpoints: Optional store with load(tool, inputs) / save(tool, inputs, outputs);
+            tools whose inputs match a saved checkpoint are restored instead of re-run
+        stream: Optional sink with tool_started(tool) / token(tool, text); markdown
+            tools relay their LLM tokens to it as they arrive
+
     Returns:
         Dictionary containing:
-        - execution_sequence: List of tools executed
+        - execution_sequence: Log of tools in completion order, with timing
         - results: Outputs from each tool
-        - final_output: Result from last executed tool
+        - final_output: Result from the last tool in dependency order
         - errors: Any encountered errors
         - status: Overall success status
     """
     context = initial_data.copy()
-    execution_log = []
+    execution_log = ProgressLog(on_progress)
     errors = []
 
     logging.info("Starting tool execution sequence.")
     logging.debug(f"Initial data: {initial_data}")
-    
-    # Determine execution sequence
+
+    # Determine which tools to run
     all_tools = list(TOOL_DEPENDENCY_MAP.keys())
-    if target_tool:
-        try:
-            target_index = all_tools.index(target_tool)
-            tool_sequence = all_tools[:target_index + 1]
-            logging.info(f"Target tool specified: {target_tool}, running tools up to it.")
-        except ValueError:
+    if full_sequence:
+        tool_sequence = all_tools
+    elif target_tool:
+        if target_tool in TOOL_DEPENDENCY_MAP:
+            tool_sequence = _with_dependencies(target_tool)
+            logging.info(f"Target tool specified: {target_tool}, running it with its dependencies.")
+        else:
             errors.append(f"Invalid target tool: {target_tool}")
             logging.warning(f"Invalid target tool: {target_tool}")
-            tool_sequence = all_tools if full_sequence else []
+            tool_sequence = []
     else:
-        tool_sequence = all_tools if full_sequence else []
+        tool_sequence = []
         logging.info("No target tool specified, using full_sequence: %s", full_sequence)
 
-    logging.info(f"Tool execution sequence determined: {tool_sequence}")
-    
-    # Execute the determined sequence
-    for tool_name in tool_sequence:
-        logging.info(f"Executing tool: {tool_name}")
-        tool = globals().get(tool_name)
-        
-        if not tool:
-            error_msg = f"Tool not found: {tool_name}"
-            logging.error(error_msg)
-            errors.append(error_msg)
-            continue
-
-        required_inputs = TOOL_DEPENDENCY_MAP[tool_name]["requires"]
-        missing_inputs = [inp for inp in required_inputs if inp not in context]
-        
-        if missing_inputs:
-            error_msg = f"Skipping {tool_name} - Missing inputs: {missing_inputs}"
-            logging.warning(error_msg)
-            errors.append(error_msg)
-            execution_log.append({
-                "tool": tool_name,
-                "status": "skipped",
-                "reason": error_msg,
-                "timestamp": datetime.now().isoformat()
-            })
-            continue
-
-        try:
-            tool_input = {k: context[k] for k in required_inputs}
-            logging.debug(f"{tool_name} - Inputs: {tool_input}")
-            
-            try:
-                result = tool.invoke(tool_input)
-                logging.debug(f"{tool_name} - Raw result: {result}")
-                
-                if isinstance(result, dict) and 'success' in result:
-                    if not result['success']:
-                        raise ValueError(f"Tool reported failure: {result.get('error', 'Unknown error')}")
-                    tool_output = result['data']
-                else:
-                    tool_output = result
-
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON output from tool: {str(e)}")
-            except Exception as e:
-                raise ValueError(f"Tool execution failed: {str(e)}")
-
-            expected_outputs = TOOL_DEPENDENCY_MAP[tool_name]["provides"]
-            if not all(out in tool_output for out in expected_outputs):
-                missing = [out for out in expected_outputs if out not in tool_output]
-                raise ValueError(f"Missing expected outputs: {missing}")
-
-            context.update(tool_output)
-            execution_log.append({
-                "tool": tool_name,
-                "status": "success",
-                # "inputs": tool_input,
-                "outputs": tool_output,
-                "timestamp": datetime.now().isoformat()
-            })
-            logging.info(f"{tool_name} executed successfully.")
-            logging.debug(f"{tool_name} - Outputs: {tool_output}")
-
-        except Exception as e:
-            error_msg = f"Error in {tool_name}: {str(e)}"
-            logging.error(error_msg)
-            errors.append(error_msg)
-            execution_log.append({
-                "tool": tool_name,
-                "status": "failed",
-                "error": error_msg,
-                "timestamp": datetime.now().isoformat(),
-                "context_snapshot": context.copy()
-            })
-
-            if tool_name == target_tool:
-                logging.info(f"Target tool {target_tool} failed. Stopping sequence.")
-                break
+    logging.info(f"Tool execution graph determined: {tool_sequence}")
+
+    sorter = TopologicalSorter(tool_graph(tool_sequence))
+    sorter.prepare()
+    order = {name: i for i, name in enumerate(tool_sequence)}
+    running = {}
+    stop = False
+
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_PARALLEL_TOOLS, thread_name_prefix="ai-tool") as pool:
+        while sorter.is_active() and not stop:
+            # Start everything that became ready; context is only written on this thread
+            for tool_name in sorter.get_ready():
+                tool = tools_by_name.get(tool_name)
+                if not tool:
+                    error_msg = f"Tool not found: {tool_name}"
+                    logging.error(error_msg)
+                    errors.append(error_msg)
+                    sorter.done(tool_name)
+                    continue
+
+                required_inputs = TOOL_DEPENDENCY_MAP[tool_name]["requires"]
+                missing_inputs = [inp for inp in required_inputs if inp not in context]
+                if missing_inputs:
+                    error_msg = f"Skipping {tool_name} - Missing inputs: {missing_inputs}"
+                    logging.warning(error_msg)
+                    errors.append(error_msg)
+                    execution_log.append({
+                        "tool": tool_name,
+                        "status": "skipped",
+                        "reason": error_msg,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    sorter.done(tool_name)
+                    continue
+
+                tool_input = {k: context[k] for k in required_inputs}
+                tool_input.update(
+                    (k, context[k]) for k in TOOL_DEPENDENCY_MAP[tool_name].get("optional", []) if k in context
+                )
+                restored = checkpoints.load(tool_name, tool_input) if checkpoints else None
+                if restored is not None:
+                    logging.info(f"Restored {tool_name} from checkpoint.")
+                    context.update(restored)
+                    execution_log.append({
+                        "tool": tool_name,
+                        "status": "restored",
+                        "outputs": restored,
+                        "duration_ms": 0,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    sorter.done(tool_name)
+                    continue
+
+                logging.info(f"Executing tool: {tool_name}")
+                future = pool.submit(_invoke_tool, tool_name, tool, tool_input, stream)
+                running[future] = (tool_name, tool_input, datetime.now(), time.perf_counter())
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                tool_name, tool_input, started_at, started = running.pop(future)
+                duration_ms = round((time.perf_counter() - started) * 1000, 1)
+                try:
+                    tool_output = future.result()
+                    context.update(tool_output)
+                    if checkpoints:
+                        checkpoints.save(tool_name, tool_input, tool_output)
+                    execution_log.append({
+                        "tool": tool_name,
+                        "status": "success",
+                        # "inputs": tool_input,
+                        "outputs": tool_output,
+                        "started_at": started_at.isoformat(),
+                        "duration_ms": duration_ms,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    logging.info(f"{tool_name} executed successfully in {duration_ms} ms.")
+                    logging.debug(f"{tool_name} - Outputs: {tool_output}")
+
+                except Exception as e:
+                    error_msg = f"Error in {tool_name}: {str(e)}"
+                    logging.error(error_msg)
+                    errors.append(error_msg)
+                    execution_log.append({
+                        "tool": tool_name,
+                        "status": "failed",
+                        "error": error_msg,
+                        "started_at": started_at.isoformat(),
+                        "duration_ms": duration_ms,
+                        "timestamp": datetime.now().isoformat(),
+                        "context_snapshot": context.copy()
+                    })
+
+                    if tool_name == target_tool:
+                        logging.info(f"Target tool {target_tool} failed. Stopping sequence.")
+                        stop = True
+                # Dependents of a failed tool become ready too and are skipped for missing inputs
+                sorter.done(tool_name)
 
     final_output = None
-    successful_steps = [e for e in execution_log if e['status'] == 'success']
+    successful_steps = sorted(
+        (e for e in execution_log if e['status'] in ('success', 'restored')), key=lambda e: order[e['tool']]
+    )
     if successful_steps:
         final_output = successful_steps[-1]['outputs']
 
     logging.info("Tool execution sequence complete.")
     return {
-        "execution_sequence": execution_log,
+        "execution_sequence": list(execution_log),
         "results": context,
         "final_output": final_output,
         "errors": errors,
@@ -0,0 +1,112 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from django.conf import settings
+
+from .dependencies import TOOL_DEPENDENCY_MAP
+
+logger = logging.getLogger(__name__)
+
+# Parameters at or above this fraction of a limit (exceedance ratio) stay in prompts
+NEAR_LIMIT_RATIO = 0.8
+VIOLATED = ("above_max", "below_min")
+# Customer request fields dropped first when a prompt is over budget
+OPTIONAL_REQUEST_FIELDS = ("notes",)
+# Long strings (upstream markdown) are never cut below this many characters
+MIN_TRUNCATED_CHARS = 200
+TRUNCATION_MARK = " …[truncated]"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """cl100k_base, or None when tiktoken can't load it (e.g. no network to fetch the BPE file)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.AI_PROMPT_ENCODING)
+    except Exception as e:
+        logger.warning(f"Token counts are estimated, tiktoken unavailable: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # ~4 characters per token for English and JSON
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def compact(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def relevant_parameters(parameters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Violated and near-limit parameters. Parameters without a status (no
+    guideline to compare against) are kept, since nothing says they pass.
+    """
+    return [
+        # Registry ids mean nothing to the model
+        {k: v for k, v in param.items() if k != "parameter_id"}
+        for param in parameters
+        if "status" not in param
+        or param["status"] in VIOLATED
+        or (param.get("exceedance_ratio") or 0) >= NEAR_LIMIT_RATIO
+    ]
+
+
+def _strings(data):
+    """(container, key) for every string in nested dicts and lists."""
+    items = data.items() if isinstance(data, dict) else enumerate(data)
+    for key, value in items:
+        if isinstance(value, str):
+            yield data, key
+        elif isinstance(value, (dict, list)):
+            yield from _strings(value)
+
+
+def _truncate_longest(context: Dict[str, Any]) -> bool:
+    """Halve the longest string in ``context``; False when nothing is left to shorten."""
+    candidates = [(c, k) for c, k in _strings(context) if len(c[k]) > MIN_TRUNCATED_CHARS + len(TRUNCATION_MARK)]
+    if not candidates:
+        return False
+    container, key = max(candidates, key=lambda ck: len(ck[0][ck[1]]))
+    text = container[key].removesuffix(TRUNCATION_MARK)
+    container[key] = text[:max(len(text) // 2, MIN_TRUNCATED_CHARS)] + TRUNCATION_MARK
+    return True
+
+
+def tool_context(tool_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The keys the tool declares in TOOL_DEPENDENCY_MAP, with water parameters narrowed to the relevant ones."""
+    context = {key: input_data[key] for key in TOOL_DEPENDENCY_MAP[tool_name]["requires"] if key in input_data}
+    request = context.get("customer_request")
+    if isinstance(request, dict) and "water_parameters" in request:
+        context["customer_request"] = {**request, "water_parameters": relevant_parameters(request["water_parameters"])}
+    return context
+
+
+def build_prompt(tool_name: str, instructions: str, input_data: Dict[str, Any]) -> str:
+    """
+    Instructions followed by the tool's context as compact JSON, kept within
+    the tool's token_budget: optional request fields go first, then the longest
+    strings are halved until it fits.
+    """
+    instructions = "\n".join(line.strip() for line in instructions.strip().splitlines())
+    budget = TOOL_DEPENDENCY_MAP[tool_name].get("token_budget", settings.AI_PROMPT_TOKEN_BUDGET)
+    context = json.loads(compact(tool_context(tool_name, input_data)))
+
+    def render():
+        return f"{instructions}\n\nInput (JSON):\n{compact(context)}"
+
+    prompt = render()
+    optional = [field for field in OPTIONAL_REQUEST_FIELDS if field in context.get("customer_request", {})]
+    while count_tokens(prompt) > budget:
+        if optional:
+            context["customer_request"].pop(optional.pop(0))
+        elif not _truncate_longest(context):
+            logger.warning(f"{tool_name} prompt is {count_tokens(prompt)} tokens, over its {budget} budget")
+            break
+        prompt = render()
+    return prompt
@@ -0,0 +1,74 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from decouple import config
+
+
+def _gemini():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        # model= "gemini-2.0-flash",
+        model='gemini-1.5-pro',
+        temperature=1.0,
+        max_tokens=None,
+        timeout=None,
+        max_retries=0,  # retried across providers by ProviderRouter
+        google_api_key=config('GOOGLE_SECRET_KEY'),
+    )
+
+
+def _nvidia():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model="deepseek-ai/deepseek-r1",
+        # model='meta/llama-4-scout-17b-16e-instruct',
+        # model="google/gemma-3-27b-it",
+        temperature=0.3,
+        max_tokens=1024,
+        timeout=None,
+        # top_p=0.7,
+        max_retries=0,  # retried across providers by ProviderRouter
+        api_key=config('NVIDIA_SECRET_KEY'),
+        base_url="https://integrate.api.nvidia.com/v1",
+    )
+
+
+# Invoke kwargs that make a provider answer in JSON natively, for calls with an output schema.
+# NVIDIA's DeepSeek R1 has no JSON mode; its replies go through structured.extract_json / repair_json.
+JSON_MODES = {
+    "gemini": {"generation_config": {"response_mime_type": "application/json"}},
+}
+
+
+class ProviderRegistry:
+    """
+    LLM clients by provider name, each built (and its SDK imported) on first
+    use, so processes that never call an LLM never load LangChain's providers.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]], json_modes: Optional[Dict[str, Dict]] = None):
+        self._factories = factories
+        self._json_modes = json_modes or {}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self._factories[name]()
+        return client
+
+    def clients(self) -> List[Any]:
+        """Every provider's client, primary first (ProviderRouter reorders them per call)."""
+        return [self.get(name) for name in self._factories]
+
+    def json_mode(self, client) -> Dict[str, Any]:
+        """The client's native JSON-output invoke kwargs ({} if its provider has none)."""
+        name = next((name for name, built in self._clients.items() if built is client), None)
+        return self._json_modes.get(name, {})
+
+
+registry = ProviderRegistry({"gemini": _gemini, "nvidia": _nvidia}, JSON_MODES)
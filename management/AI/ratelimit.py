@@ -0,0 +1,114 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+
+from ..services.locks import lock_cache
+
+logger = logging.getLogger(__name__)
+
+# Bucket state outlives a quiet spell by this long; an expired bucket is simply full
+STATE_TIMEOUT = 3600
+LOCK_TIMEOUT = 5
+
+
+class RateLimitExceeded(Exception):
+    """The provider's quota would not free up within LLM_RATE_LIMIT_MAX_WAIT_SECONDS."""
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one model, shared by
+    every worker through the "locks" cache, whose atomic add() serializes
+    updates. A call takes one request and its estimated tokens, waiting (up to
+    a bound) for both buckets to refill.
+    """
+
+    def __init__(self, model: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_key = f"llm:bucket:{model}"
+        self.queue_key = f"llm:queue:{model}"
+
+    @contextmanager
+    def _locked(self):
+        lock_key = f"{self.state_key}:lock"
+        while not lock_cache.add(lock_key, 1, LOCK_TIMEOUT):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            lock_cache.delete(lock_key)
+
+    def _refilled(self, now: float) -> dict:
+        state = lock_cache.get(self.state_key) or {"requests": self.rpm, "tokens": self.tpm, "at": now}
+        elapsed = now - state["at"]
+        if self.rpm:
+            state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60)
+        state["at"] = now
+        return state
+
+    def _take(self, tokens: int) -> float:
+        """Take the quota and return 0, or return the seconds until it should be there."""
+        with self._locked():
+            state = self._refilled(time.time())
+            wait = 0.0
+            if self.rpm:
+                wait = max(wait, (1 - state["requests"]) * 60 / self.rpm)
+            if self.tpm:
+                # A call larger than the whole bucket waits for a full one
+                wait = max(wait, (min(tokens, self.tpm) - state["tokens"]) * 60 / self.tpm)
+            if wait <= 0:
+                if self.rpm:
+                    state["requests"] -= 1
+                if self.tpm:
+                    state["tokens"] -= min(tokens, self.tpm)
+            lock_cache.set(self.state_key, state, STATE_TIMEOUT)
+            return max(wait, 0.0)
+
+    def _adjust_queue(self, delta: int):
+        # Under the bucket lock, since incr() is not atomic on every backend
+        with self._locked():
+            lock_cache.set(self.queue_key, (lock_cache.get(self.queue_key) or 0) + delta, None)
+
+    def queue_depth(self) -> int:
+        return max(lock_cache.get(self.queue_key) or 0, 0)
+
+    def acquire(self, tokens: int, max_wait: float) -> float:
+        """Block until the call may proceed; returns seconds waited. Raises RateLimitExceeded."""
+        started = time.monotonic()
+        self._adjust_queue(1)
+        try:
+            while True:
+                wait = self._take(tokens)
+                waited = time.monotonic() - started
+                if wait <= 0:
+                    return waited
+                if waited + wait > max_wait:
+                    raise RateLimitExceeded(
+                        f"{self.model}: quota frees up in {wait:.1f}s, past the {max_wait:.0f}s wait limit"
+                    )
+                time.sleep(wait)
+        finally:
+            self._adjust_queue(-1)
+
+    def settle(self, reserved: int, used: int):
+        """Correct the token bucket once the provider reports the tokens a call actually used."""
+        if not self.tpm or reserved == used:
+            return
+        with self._locked():
+            state = self._refilled(time.time())
+            state["tokens"] = min(self.tpm, state["tokens"] + reserved - used)
+            lock_cache.set(self.state_key, state, STATE_TIMEOUT)
+
+
+def limiter_for(model: str) -> Optional[TokenBucketLimiter]:
+    quota = settings.LLM_RATE_LIMITS.get(model)
+    if not quota:
+        return None
+    return TokenBucketLimiter(model, quota.get("rpm"), quota.get("tpm"))
@@ -0,0 +1,142 @@
+import logging
+import time
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..services import llm_cache, llm_stats
+from .prompts import count_tokens
+from .ratelimit import RateLimitExceeded, limiter_for
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+
+
+def classify_error(error: Exception) -> str:
+    """Tell rate limiting (HTTP 429 / quota exhausted) apart from other provider failures."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429 or type(error).__name__ in ("RateLimitError", "ResourceExhausted"):
+        return RATE_LIMITED
+    return ERROR
+
+
+class ProviderRouter:
+    """
+    Orders LLM clients for each call: healthy providers first, fastest (median
+    latency) first, providers without samples after them in configured order.
+
+    A provider failing LLM_BREAKER_FAILURES times in a row, or above
+    LLM_BREAKER_ERROR_RATE over its recent calls, has its circuit opened for
+    LLM_BREAKER_COOLDOWN_SECONDS (LLM_RATE_LIMIT_COOLDOWN_SECONDS for a 429).
+    After the cooldown one caller probes it; success closes the circuit.
+    State lives in the Django cache, so every worker shares it.
+    """
+
+    def __init__(self, clients: List[Any]):
+        self.clients = clients
+
+    @staticmethod
+    def _breaker_key(model: str) -> str:
+        return f"llm:breaker:{model}"
+
+    def _breaker(self, model: str) -> Dict[str, Any]:
+        return cache.get(self._breaker_key(model)) or {"failures": 0, "open_until": 0}
+
+    def is_available(self, model: str) -> bool:
+        open_until = self._breaker(model)["open_until"]
+        if not open_until:
+            return True
+        if time.time() < open_until:
+            return False
+        # Half-open: a single caller gets to probe the provider
+        return cache.add(f"llm:probe:{model}", 1, settings.LLM_BREAKER_COOLDOWN_SECONDS)
+
+    def order(self) -> List[Any]:
+        ranked = []
+        for index, client in enumerate(self.clients):
+            model = llm_cache.model_name(client)
+            if self.is_available(model):
+                latency = llm_stats.latency_percentile(model, 50)
+                ranked.append((latency is None, latency or 0, index, client))
+        if not ranked:
+            # Every circuit is open: trying beats failing outright
+            return list(self.clients)
+        return [client for *_, client in sorted(ranked, key=lambda r: r[:3])]
+
+    def acquire(self, client, prompt: str) -> int:
+        """
+        Wait for the provider's request and token quota (LLM_RATE_LIMITS); returns
+        the tokens reserved. Raises RateLimitExceeded past the bounded wait.
+        """
+        limiter = limiter_for(llm_cache.model_name(client))
+        if limiter is None:
+            return 0
+        tokens = count_tokens(prompt) + (getattr(client, "max_tokens", None) or settings.LLM_COMPLETION_TOKEN_ESTIMATE)
+        limiter.acquire(tokens, settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS)
+        return tokens
+
+    def settle(self, client, reserved: int, message):
+        """
+        Correct a reservation from acquire() to the tokens the call used. A call
+        that never got a response (failed or cancelled; ``message`` None) gives
+        the whole reservation back.
+        """
+        limiter = limiter_for(llm_cache.model_name(client))
+        if limiter is None or not reserved:
+            return
+        if message is None:
+            limiter.settle(reserved, 0)
+            return
+        usage = getattr(message, "usage_metadata", None)
+        if isinstance(usage, dict) and usage.get("total_tokens"):
+            limiter.settle(reserved, usage["total_tokens"])
+
+    def record_success(self, client, seconds: float):
+        model = llm_cache.model_name(client)
+        llm_stats.record_latency(model, seconds)
+        llm_stats.record_outcome(model, OK)
+        if self._breaker(model)["failures"] or cache.get(f"llm:probe:{model}"):
+            cache.set(self._breaker_key(model), {"failures": 0, "open_until": 0}, None)
+            cache.delete(f"llm:probe:{model}")
+
+    def record_failure(self, client, error: Exception):
+        if isinstance(error, RateLimitExceeded):
+            # Throttled locally before reaching the provider: says nothing about its health
+            return
+        model = llm_cache.model_name(client)
+        outcome = classify_error(error)
+        llm_stats.record_outcome(model, outcome)
+        breaker = self._breaker(model)
+        breaker["failures"] += 1
+        rates = llm_stats.outcome_rates(model)
+        cooldown = None
+        if outcome == RATE_LIMITED:
+            cooldown = settings.LLM_RATE_LIMIT_COOLDOWN_SECONDS
+        elif breaker["failures"] >= settings.LLM_BREAKER_FAILURES or (
+            rates["calls"] >= llm_stats.MIN_SAMPLES and rates["error_rate"] > settings.LLM_BREAKER_ERROR_RATE
+        ):
+            cooldown = settings.LLM_BREAKER_COOLDOWN_SECONDS
+        if cooldown:
+            breaker["open_until"] = time.time() + cooldown
+            cache.delete(f"llm:probe:{model}")
+            logger.warning(f"Circuit open for {model} ({outcome}) for {cooldown}s")
+        cache.set(self._breaker_key(model), breaker, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        providers = {}
+        for client in self.clients:
+            model = llm_cache.model_name(client)
+            open_until = self._breaker(model)["open_until"]
+            limiter = limiter_for(model)
+            providers[model] = {
+                "circuit": "open" if time.time() < open_until else "half_open" if open_until else "closed",
+                "p50_seconds": llm_stats.latency_percentile(model, 50),
+                "p95_seconds": llm_stats.latency_percentile(model, 95),
+                "queue_depth": limiter.queue_depth() if limiter else 0,
+                **llm_stats.outcome_rates(model),
+            }
+        return providers
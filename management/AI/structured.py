@@ -0,0 +1,136 @@
+import json
+import re
+from typing import Any
+
+from ..services import llm_stats
+
+# Reasoning models (e.g. DeepSeek R1) think out loud before answering
+REASONING = re.compile(r"<think>.*?</think>", re.S | re.I)
+FENCED = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)```", re.S)
+WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null", "undefined": "null"}
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def strip_reasoning(text: str) -> str:
+    return REASONING.sub("", text).strip()
+
+
+def extract_json(text: str) -> str:
+    """
+    The JSON document in a model reply: the first fenced block holding an
+    object or array, else the first balanced {...} / [...] span (the rest of
+    the text if it never closes, for repair_json to finish).
+    """
+    text = strip_reasoning(text)
+    for block in FENCED.findall(text):
+        if block.strip()[:1] in ("{", "["):
+            return block.strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _trim(out: list) -> str:
+    """The output so far without a dangling comma (nothing may follow it now)."""
+    text = "".join(out).rstrip()
+    return text[:-1] if text.endswith(",") else text
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the near-misses models commonly produce: single or smart quotes,
+    unquoted keys, Python literals, comments, trailing commas, raw newlines in
+    strings, and output cut off before its closing quotes and brackets.
+    """
+    text = text.translate(SMART_QUOTES)
+    out, closers = [], []
+    quote, i, n = None, 0, len(text)
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < n:
+                # \' is only an escape in single-quoted strings, and isn't one in JSON
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            else:
+                out.append({'"': '\\"', "\n": "\\n", "\t": "\\t"}.get(ch, ch))
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif text.startswith("//", i) or ch == "#":
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            out = [_trim(out), ch]
+            if closers:
+                closers.pop()
+        elif ch.isalpha() or ch == "_":
+            word = WORD.match(text, i).group()
+            i += len(word)
+            is_key = text[i:].lstrip().startswith(":")
+            out.append(f'"{word}"' if is_key else LITERALS.get(word, word))
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote:
+        out.append('"')
+    tail = _trim(out)
+    if tail.endswith(":"):
+        tail += "null"
+    return tail + "".join(reversed(closers))
+
+
+def parse_response(text: str, schema: Any):
+    """
+    A model reply as ``schema``: the reply's text (reasoning stripped) for
+    ``str``, else its JSON, repaired if need be, validated by the Pydantic
+    model and dumped to a dict. Raises ValueError (or ValidationError).
+    """
+    if not text or not text.strip():
+        raise ValueError("Empty response")
+    if schema is str:
+        return strip_reasoning(text)
+    candidate = extract_json(text)
+    try:
+        parsed = json.loads(candidate)
+    except json.JSONDecodeError:
+        parsed = json.loads(repair_json(candidate))
+        llm_stats.incr("structured:repaired")
+    return schema.model_validate(parsed).model_dump()
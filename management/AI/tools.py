@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from typing import Annotated, Sequence, TypedDict, Dict, Any, List, Optional,Union
+from typing import Annotated, Callable, Sequence, TypedDict, Dict, Any, List, Optional,Union
 from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph.message import add_messages
@@ -8,7 +8,6 @@ from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 import requests
 from requests.auth import HTTPBasicAuth
-from langchain_openai import ChatOpenAI
 from decouple import config
 import json
 import logging
@@ -16,37 +15,24 @@ from langgraph.graph import StateGraph, END
 from langchain_core.runnables import RunnableConfig
 from datetime import datetime,timedelta
 import base64
-
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from asyncio import FIRST_COMPLETED
 
 from ..management.pdfs.gen import generate_quotation_pdf
-
-# Initialize the LLM
-llm2 = ChatOpenAI(
-    model="deepseek-ai/deepseek-r1",
-    # model='meta/llama-4-scout-17b-16e-instruct',
-    # model="google/gemma-3-27b-it",
-    temperature=0.3,  
-    max_tokens=1024,
-    timeout=None,
-#   top_p=0.7,
-    max_retries=2,
-    api_key=config('NVIDIA_SECRET_KEY'),
-    base_url="https://integrate.api.nvidia.com/v1",
-
-)
-
-# Create LLM class
-llm = ChatGoogleGenerativeAI(
-    # model= "gemini-2.0-flash",
-    model= 'gemini-1.5-pro',
-    temperature=1.0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    google_api_key=config('GOOGLE_SECRET_KEY'),
-)
-
+from ..services.parameters import registry
+from ..services.units import converter
+from ..services.treatment_rules import treatment_rules
+from ..services import ro_sizing as ro_engine
+from ..services import pricing
+from ..services import llm_cache, llm_stats
+from . import providers
+from .router import ProviderRouter
+from .prompts import build_prompt, compact
+from .structured import parse_response
+from django.conf import settings
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -109,7 +95,10 @@ class AgentState(TypedDict):
 
 class WaterAnalysisInput(BaseModel):
     customer_request: dict = Field(..., description="Contains water parameters, usage, and flow rate")
-    guideline: dict = Field(..., description="Water quality standards to compare against")
+    guideline: Optional[dict] = Field(..., description="Water quality standards to compare against (None without one)")
+    parameter_violations: Optional[List[dict]] = Field(
+        None, description="Stored violations of the lab values against the guideline, when already computed"
+    )
 
 class WaterAnalysisOutput(BaseModel):
     treatment_specs: dict = Field(..., description="Required treatments and priority level")
@@ -120,42 +109,293 @@ class TreatmentRecommendationInput(BaseModel):
     customer_request: dict = Field(..., description="Usage and technical requirements")
 
 class ROSizingInput(BaseModel):
-    treatment_specs: dict = Field(..., description="Recommended treatment system specs")
+    ro_system_specs: str = Field(..., description="Recommended treatment system specs (Markdown)")
     customer_request: dict = Field(..., description="Flow rate and location details")
 
 class QuotationInput(BaseModel):
-    system_specs: dict = Field(..., description="Finalized system specifications")
+    sizing_details: dict = Field(..., description="RO sizing result (see services.ro_sizing.size_ro)")
     customer_request: dict = Field(..., description="Contact and location info")
 
 class ProposalInput(BaseModel):
-    technical_specs: dict = Field(..., description="All technical specifications")
+    ro_system_specs: str = Field(..., description="Recommended treatment system specs (Markdown)")
+    customer_request: dict = Field(..., description="Usage, flow rate and location details")
     cost_estimate: dict = Field(..., description="Pricing breakdown")
 
+class CostComponent(BaseModel):
+    name: str
+    cost: float
+
+class QuotationEstimate(BaseModel):
+    base_price: float = Field(..., description="Total equipment cost")
+    components: List[CostComponent] = Field(default_factory=list)
+    total_cost: float
+
+class ProposalSpecs(BaseModel):
+    flow_rate: str
+    treatment_stages: List[str] = Field(default_factory=list)
+
+class ProposalCosts(BaseModel):
+    equipment: float
+    installation: float
+
+class ProposalOutput(BaseModel):
+    system_overview: str
+    technical_specs: ProposalSpecs
+    cost_breakdown: ProposalCosts
+
 # ----------------------
 # 2. TOOL IMPLEMENTATIONS
 # ----------------------
 
-def llm_fallback(prompt: str, schema: BaseModel) -> dict:
-    """Enhanced LLM executor with robust error handling"""
-    for llm_client in [llm, llm2]:  # Try both LLMs
+def _validate_response(response: str, schema: BaseModel) -> dict:
+    # Fenced, reasoning-wrapped or slightly malformed JSON is recovered here rather than retried on another provider
+    return parse_response(response, schema)
+
+
+def _invoke_kwargs(client, schema) -> Dict[str, Any]:
+    """Native JSON output for schema-bound calls, where the provider supports it."""
+    return {} if schema is str else providers.registry.json_mode(client)
+
+
+def _hedge_delay(primary) -> float:
+    """How long the primary may run before the secondary is fired: its observed latency percentile."""
+    observed = llm_stats.latency_percentile(llm_cache.model_name(primary), settings.LLM_HEDGE_PERCENTILE)
+    if observed is None:
+        return settings.LLM_HEDGE_DEFAULT_SECONDS
+    return max(observed, settings.LLM_HEDGE_MIN_SECONDS)
+
+
+async def _hedged_invoke(prompt: str, schema: BaseModel, router: ProviderRouter, clients: list, delay: float,
+                         outcomes: list):
+    """
+    Call clients[0]; once it runs past ``delay`` (or fails), also call the next
+    client. The first schema-valid response wins and the pending call is cancelled.
+    Finished calls are appended to ``outcomes`` as (client, error, elapsed seconds).
+    Returns (client index, raw response, validated result, hedged).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def attempt(i):
+        acquiring = asyncio.ensure_future(asyncio.to_thread(router.acquire, clients[i], prompt))
+        message = None
         try:
-            response = llm_client.invoke(prompt).content
-            print(response)
-            
-            # Validate response is non-empty JSON
-            if not response.strip():
-                raise ValueError("Empty response")
-                
-            parsed = json.loads(response)
-            validated = schema.model_validate(parsed)
-            return validated.model_dump()
-            
+            # Shielded: a cancelled attempt's worker thread still finishes reserving
+            reserved = await asyncio.shield(acquiring)
+            started = loop.time()
+            message = await clients[i].ainvoke(prompt, **_invoke_kwargs(clients[i], schema))
+            response = message.content
+            result = _validate_response(response, schema)
+        except Exception as e:
+            logger.warning(f"{clients[i]._llm_type} failed: {str(e)}")
+            outcomes.append((clients[i], e, None))
+            raise
+        finally:
+            def settle(acquired):
+                if not acquired.cancelled() and acquired.exception() is None:
+                    loop.run_in_executor(None, router.settle, clients[i], acquired.result(), message)
+            # Runs once the reservation exists, even for an attempt cancelled before it did
+            acquiring.add_done_callback(settle)
+        outcomes.append((clients[i], None, loop.time() - started))
+        return i, response, result
+
+    pending = {asyncio.create_task(attempt(0))}
+    fired, hedged = 1, False
+    last_error = None
+    while pending:
+        timeout = delay if fired < len(clients) else None
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                last_error = task.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return (*task.result(), hedged)
+        # Past the latency threshold, or every call in flight failed: bring in the next client
+        if fired < len(clients) and (not done or not pending):
+            hedged = hedged or not done
+            pending.add(asyncio.create_task(attempt(fired)))
+            fired += 1
+
+    raise ValueError(f"All LLMs failed to process request. Last error: {str(last_error)}")
+
+
+def _record_outcomes(router: ProviderRouter, outcomes: list):
+    for client, error, elapsed in outcomes:
+        if error is None:
+            router.record_success(client, elapsed)
+        else:
+            router.record_failure(client, error)
+
+
+_hedge_loop = None
+_hedge_loop_lock = threading.Lock()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """
+    The event loop hedged calls run on: one per process, on its own daemon
+    thread, so async clients keep their connections instead of losing them
+    with a fresh loop per call.
+    """
+    global _hedge_loop
+    with _hedge_loop_lock:
+        if _hedge_loop is None:
+            _hedge_loop = asyncio.new_event_loop()
+            threading.Thread(target=_hedge_loop.run_forever, name="llm-hedging", daemon=True).start()
+    return _hedge_loop
+
+
+def _hedging_available() -> bool:
+    if not settings.LLM_HEDGING_ENABLED:
+        return False
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    # Already inside an event loop (async caller): fall back to sequential calls
+    return False
+
+
+def llm_fallback(prompt: str, schema: BaseModel, use_cache: bool = True) -> dict:
+    """
+    Enhanced LLM executor with robust error handling.
+
+    Responses that validate are cached per (prompt, model, temperature, schema);
+    pass use_cache=False (or set LLM_CACHE_ENABLED=False) to always call the APIs.
+
+    Providers are ordered by ProviderRouter (fastest healthy first, failing
+    ones skipped). With LLM_HEDGING_ENABLED, a primary call slower than its
+    p95 latency is hedged with the next provider instead of waited out.
+    """
+    router = ProviderRouter(providers.registry.clients())
+    clients = router.order()
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    if use_cache:
+        keys = [llm_cache.cache_key(prompt, client, schema) for client in clients]
+        cached = llm_cache.get(*keys)
+        if cached is not None:
+            try:
+                return _validate_response(cached, schema)
+            except Exception as e:
+                logger.warning(f"Ignoring cached response that no longer validates: {str(e)}")
+
+    if _hedging_available():
+        outcomes = []
+        try:
+            i, response, result, hedged = asyncio.run_coroutine_threadsafe(
+                _hedged_invoke(prompt, schema, router, clients, _hedge_delay(clients[0]), outcomes), _event_loop()
+            ).result()
+        finally:
+            _record_outcomes(router, outcomes)
+        if hedged:
+            model = llm_cache.model_name(clients[i])
+            llm_stats.incr("hedge:fired")
+            llm_stats.incr(f"hedge:won:{model}")
+        if use_cache:
+            llm_cache.put(keys[i], clients[i], response)
+        return result
+
+    last_error = None
+    for i, llm_client in enumerate(clients):  # Try each provider, best first
+        reserved, message = 0, None
+        try:
+            reserved = router.acquire(llm_client, prompt)
+            started = time.monotonic()
+            message = llm_client.invoke(prompt, **_invoke_kwargs(llm_client, schema))
+            response = message.content
+
+            result = _validate_response(response, schema)
+            router.record_success(llm_client, time.monotonic() - started)
+            if use_cache:
+                llm_cache.put(keys[i], llm_client, response)
+            return result
+
         except Exception as e:
             logger.warning(f"{llm_client._llm_type} failed: {str(e)}")
+            router.record_failure(llm_client, e)
+            last_error = e
             continue
+        finally:
+            router.settle(llm_client, reserved, message)
     
     # If all LLMs fail
-    raise ValueError(f"All LLMs failed to process request. Last error: {str(e)}")
+    raise ValueError(f"All LLMs failed to process request. Last error: {str(last_error)}")
+
+# Set while a tool runs under a streaming pipeline; receives each markdown token
+token_listener: ContextVar[Optional[Callable[[str], None]]] = ContextVar("token_listener", default=None)
+
+
+def llm_stream(prompt: str, on_token: Callable[[str], None], use_cache: bool = True) -> str:
+    """
+    Stream a free-text (markdown) completion, passing each token to ``on_token``
+    as it arrives; returns the full text. A provider that fails before its
+    first token hands over to the next one; after that the error propagates.
+    """
+    router = ProviderRouter(providers.registry.clients())
+    clients = router.order()
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    if use_cache:
+        keys = [llm_cache.cache_key(prompt, client, str) for client in clients]
+        cached = llm_cache.get(*keys)
+        if cached is not None:
+            on_token(cached)
+            return cached
+
+    last_error = None
+    for i, llm_client in enumerate(clients):
+        chunks, reserved, message = [], 0, None
+        try:
+            reserved = router.acquire(llm_client, prompt)
+            started = time.monotonic()
+            for chunk in llm_client.stream(prompt):
+                # Chunks add up to the whole message, usage metadata included
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    on_token(chunk.content)
+        except Exception as e:
+            logger.warning(f"{llm_client._llm_type} failed while streaming: {str(e)}")
+            router.record_failure(llm_client, e)
+            if chunks:
+                raise
+            last_error = e
+            continue
+        finally:
+            router.settle(llm_client, reserved, message)
+        router.record_success(llm_client, time.monotonic() - started)
+        response = "".join(chunks)
+        if use_cache and response.strip():
+            llm_cache.put(keys[i], llm_client, response)
+        return response
+
+    raise ValueError(f"All LLMs failed to process request. Last error: {str(last_error)}")
+
+
+def llm_markdown(prompt: str) -> str:
+    """Markdown from the LLMs, streamed token by token when a pipeline stream is listening."""
+    listener = token_listener.get()
+    if listener is not None:
+        return llm_stream(prompt, listener)
+    return llm_fallback(prompt, str)
+
+
+def llm_structured(prompt: str, schema: BaseModel) -> dict:
+    """
+    ``schema`` output from the LLMs. Under a listening pipeline stream the raw
+    JSON is streamed as it arrives and parsed (repaired if need be) once
+    complete; a reply that still doesn't validate is asked for again unstreamed.
+    """
+    listener = token_listener.get()
+    if listener is not None:
+        response = llm_stream(prompt, listener)
+        try:
+            return _validate_response(response, schema)
+        except Exception as e:
+            logger.warning(f"Streamed response did not validate, retrying unstreamed: {str(e)}")
+    return llm_fallback(prompt, schema)
+
 
 @tool(args_schema=WaterAnalysisInput)
 def analyse_lab_report2(customer_request: dict, guideline: dict) -> dict:
@@ -173,163 +413,191 @@ def analyse_lab_report2(customer_request: dict, guideline: dict) -> dict:
         2. Strictly follow guideline limits
         3. Return JSON matching the schema"""
     
-    result = llm.invoke(prompt)
+    result = providers.registry.get("gemini").invoke(prompt)
     return WaterAnalysisOutput(
         treatment_specs={}, 
         parameter_violations=result["content"]
     ).model_dump()
     # return result.dict()
 
-@tool(args_schema=WaterAnalysisInput)
-def analyse_lab_report(customer_request: dict, guideline: dict) -> dict:
-    """Analyzes water parameters against guidelines"""
+def compare_lab_values(customer_request: dict, guideline: Optional[dict]) -> List[dict]:
+    """Violations of a request's lab values against guideline limits, compared on the spot."""
     violations = []
 
-    for param, customer_value in customer_request.items():
-        guideline_value = guideline.get(param)
+    # Match on canonical parameter ids so "TDS" meets "Total Dissolved Solids (TDS)";
+    # rows coming from the database already carry their resolved id
+    limits = {}
+    for name, guideline_value in (guideline or {}).items():
         if not guideline_value:
             continue
+        parameter_id = guideline_value.get("parameter_id") or registry.lookup(name)
+        if parameter_id is not None:
+            limits[parameter_id] = (guideline_value, converter.factor(parameter_id, guideline_value.get("unit", "")))
+
+    measured = customer_request.get("water_parameters")
+    if measured is None:
+        measured = [{"name": k, "value": v} for k, v in customer_request.items() if isinstance(v, (int, float))]
 
-        min_val = guideline_value.get("min")
-        max_val = guideline_value.get("max")
+    for param in measured:
+        parameter_id = param.get("parameter_id") or registry.lookup(param["name"])
+        if parameter_id not in limits:
+            continue
+        guideline_value, guideline_factor = limits[parameter_id]
+        customer_value = param["value"]
+        # Compare in the parameter's canonical unit (e.g. µg/L vs mg/L, EC vs TDS)
+        canonical_value = customer_value * converter.factor(parameter_id, param.get("unit", ""))
+
+        min_val = guideline_value.get("min", guideline_value.get("min_value"))
+        max_val = guideline_value.get("max", guideline_value.get("max_value"))
         unit = guideline_value.get("unit", "")
 
-        if min_val is not None and customer_value < min_val:
+        if min_val is not None and canonical_value < min_val * guideline_factor:
             violations.append({
-                "parameter": param,
+                "parameter": param["name"],
                 "value": customer_value,
                 "violation": "below minimum",
                 "guideline_range": f"{min_val} - {max_val} {unit}"
             })
-        elif max_val is not None and customer_value > max_val:
+        elif max_val is not None and canonical_value > max_val * guideline_factor:
             violations.append({
-                "parameter": param,
+                "parameter": param["name"],
                 "value": customer_value,
                 "violation": "above maximum",
                 "guideline_range": f"{min_val} - {max_val} {unit}"
             })
+    return violations
+
+
+@tool(args_schema=WaterAnalysisInput)
+def analyse_lab_report(customer_request: dict, guideline: Optional[dict],
+                       parameter_violations: Optional[List[dict]] = None) -> dict:
+    """Analyzes water parameters against guidelines"""
+    # The materialized compliance results (see build_tool_input) when there are any; comparing here is the fallback
+    violations = parameter_violations
+    if violations is None:
+        violations = compare_lab_values(customer_request, guideline)
 
     return {
-        "parameter_violations": violations
+        "parameter_violations": violations,
+        # What treatment_recommendation works from
+        "treatment_specs": {
+            "violated_parameters": sorted({v["parameter"] for v in violations}),
+            "violations": violations,
+        },
     }
 
 
 @tool(args_schema=TreatmentRecommendationInput)
-def treatment_recommendation(input_data: Dict[str, Any]) -> Dict[str, Any]:
+def treatment_recommendation(treatment_specs: dict, customer_request: dict) -> Dict[str, Any]:
     """Recommends treatment systems based on parameter violations and customer needs"""
-    parameter_violations = input_data.get("parameter_violations", {})
-    customer_request = input_data.get("customer_request", {})
-    prompt = f"""
-        You are a water treatment system design expert. Based on the data below, recommend:
+    input_data = {"treatment_specs": treatment_specs, "customer_request": customer_request}
+    # Textbook cases (known source, every violation covered by a rule) skip the LLM
+    if settings.AI_RULES_FAST_PATH:
+        recommendation = treatment_rules.recommend(customer_request or {})
+        if recommendation is not None:
+            llm_stats.incr("rules:hit")
+            return {"ro_system_specs": recommendation.markdown(), "recommendation_source": "rules"}
+        llm_stats.incr("rules:miss")
+
+    prompt = build_prompt("treatment_recommendation", """
+        You are a water treatment system design expert. Based on the treatment specs (violated
+        parameters) and the customer request (usage, daily flow rate, etc.) below, recommend:
 
         1. An RO system specification (type, capacity, and key components)
         2. A pretreatment plan (filtration method and required chemical adjustments)
 
-        Input Data:
-        - Treatment specs (violated parameters): {json.dumps(parameter_violations, indent=2)}
-        - Customer request (usage, daily flow rate,  etc.): {json.dumps(customer_request, indent=2)}
-        Write only the final Markdown output. Do not include JSON, commentary, or additional explanations. 
-        """
+        Write only the final Markdown output. Do not include JSON, commentary, or additional explanations.
+        """, input_data)
         # Return JSON matching this exact format:
         # {json.dumps({
         #     "ro_system_specs": {"type": "string", "capacity": "string", "components": ["string"]},
         #     "pretreatment": {"filtration": "string", "chemical_adjustments": ["string"]}
         # }, indent=2)}
-    
-    result = llm_fallback(prompt, str)  # Expecting a string (Markdown)
-    return {"treatment_specs": result}
+
+    result = llm_markdown(prompt)  # Expecting a string (Markdown)
+    return {"ro_system_specs": result, "recommendation_source": "llm"}
 
 
 @tool(args_schema=ROSizingInput)
-def ro_sizing(input_data: Dict[str, Any]) -> Dict[str, Any]:
+def ro_sizing(ro_system_specs: str, customer_request: dict) -> Dict[str, Any]:
     """Calculates RO system requirements"""
-    prompt = f"""
+    input_data = {"ro_system_specs": ro_system_specs, "customer_request": customer_request}
+    # Sized numerically from the flow rate and feed water; the LLM only covers requests without a flow rate
+    sizing = ro_engine.size_ro(customer_request or {})
+    if sizing is not None:
+        return {"ro_sizing": ro_engine.markdown(sizing), "sizing_details": sizing}
+
+    prompt = build_prompt("ro_sizing", """
         You are an RO system sizing expert. Based on the customer input below, calculate and summarize the following in Markdown:
 
         - Number of membranes required
         - Recommended tank capacity
         - Pump specifications (type and power)
 
-        ### Customer Input:
-        ```json
-        {json.dumps(input_data, indent=2)}
-        ```
-
         ### Output format (Markdown):
-        ```markdown
         ## RO Sizing
-
         - **Membranes Required**: X
         - **Tank Capacity**: X Liters
-        - **Pump Specs**:
-        - Type: X
-        - Power: X
-        ```
+        - **Pump Specs**: Type: X, Power: X
 
         Write only the Markdown output. No JSON or additional explanations.
-        """
-    result = llm_fallback(prompt, str)
-    return {"ro_sizing": result}
+        """, input_data)
+    result = llm_markdown(prompt)
+    # No numbers to price from: quotation_generator estimates from the summary
+    return {"ro_sizing": result, "sizing_details": {"summary": result}}
 
 @tool(args_schema=QuotationInput)
-def quotation_generator(input_data: Dict[str, Any]) -> Dict[str, Any]:
+def quotation_generator(sizing_details: dict, customer_request: dict) -> Dict[str, Any]:
     """Generates a cost estimate based on system specs and treatment plan"""
-
-    prompt = f"""
-        You are a project cost estimator. Using the information below, produce:
+    input_data = {"sizing_details": sizing_details, "customer_request": customer_request}
+    # Priced from the local catalog; the LLM only estimates when there is nothing to price from
+    customer_request = customer_request or {}
+    sizing = sizing_details
+    if "recommended" not in sizing:
+        sizing = ro_engine.size_ro(customer_request)
+    quotation = pricing.quote(customer_request, sizing) if sizing else None
+    if quotation is not None:
+        return {"quotation_generator": pricing.markdown(quotation), "cost_estimate": quotation}
+
+    prompt = build_prompt("quotation_generator", f"""
+        You are a project cost estimator. Using the input below, produce:
 
         - base_price: Total equipment cost (float)
         - components: List of items with their individual costs
         - total_cost: Sum of all costs (float)
 
-        Inputs:
-        ### Input Data:
-        ```json
-        {json.dumps(input_data, indent=2)}
-        ```
-
-        Return JSON exactly with markdown to allow you to be creative  as:
-        {json.dumps({
+        Return ONLY JSON matching:
+        {compact({
             "base_price": 0.0,
             "components": [{"name": "string", "cost": 0.0}],
             "total_cost": 0.0
-        }, indent=2)}
-        """
-    result = llm_fallback(prompt, str)
-    return {"quotation_generator": result}
+        })}
+        """, input_data)
+    result = llm_structured(prompt, QuotationEstimate)
+    return {"quotation_generator": result, "cost_estimate": result}
 
 @tool(args_schema=ProposalInput)
-def proposal_generator(input_data: Dict[str, Any]) -> Dict[str, Any]:
+def proposal_generator(ro_system_specs: str, customer_request: dict, cost_estimate: dict) -> Dict[str, Any]:
     """Generates a final customer proposal combining all details"""
-    # quotation = input_data.get("quotation", {})
-    # ro_system_specs = input_data.get("ro_system_specs", {})
-    # pretreatment = input_data.get("pretreatment", {})
-    # customer_request = input_data.get("customer_request", {})
-
-# - Quotation details: {json.dumps(quotation, indent=2)}
-# - RO system specs: {json.dumps(ro_system_specs, indent=2)}
-# - Pretreatment plan: {json.dumps(pretreatment, indent=2)}
-# - Customer request: {json.dumps(customer_request, indent=2)}
-    prompt = f"""
-        You are a technical consultant preparing a proposal document. Using the data below, create a JSON proposal containing:
+    input_data = {"ro_system_specs": ro_system_specs, "customer_request": customer_request, "cost_estimate": cost_estimate}
+    prompt = build_prompt("proposal_generator", f"""
+        You are a technical consultant preparing a proposal document. Using the input below, create a JSON proposal containing:
 
         1. system_overview: A concise summary string
         2. technical_specs: {{ "flow_rate": "string", "treatment_stages": ["string"] }}
         3. cost_breakdown: {{ "equipment": float, "installation": float }}
 
-        Inputs:
-        {json.dumps(input_data, indent=2)}
-
         Return ONLY the JSON matching this schema.
-        {json.dumps({
+        {compact({
             "system_overview": "string",
             "technical_specs": {"flow_rate": "string", "treatment_stages": ["string"]},
             "cost_breakdown": {"equipment": 0.0, "installation": 0.0}
-        }, indent=2)}
-        """
-    
-    result = llm_fallback(prompt, str)
-    return {"proposal_generator": result}
+        })}
+        """, input_data)
+
+    # JSON, so it is validated as a whole rather than streamed token by token
+    result = llm_structured(prompt, ProposalOutput)
+    return {"proposal_generator": result, "final_proposal": result}
 
 
 # ----------------------
@@ -741,7 +1009,7 @@ def get_product_details(no: str) -> Dict:
             }
         return {}
     except requests.RequestException as e:
-        str.error(f"Error fetching product details: {str(e)}")
+        logger.error(f"Error fetching product details: {str(e)}")
         return {}
     
 
@@ -3,8 +3,16 @@ from django.utils.html import format_html
 from .models import ManagementAttachment
 
 # admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (
+    CanonicalParameter,
+    CatalogItem,
+    ComplianceResult,
+    LLMResponse,
+    ParameterAlias,
+    PipelineBatch,
+    PipelineCheckpoint,
+    PipelineJob,
     WaterGuideline,
     WaterGuidelineParameter,
     CustomerRequest,
@@ -13,7 +21,18 @@ from .models import (
     WaterReportAttachment,
     ManagementAttachment,
 )
+from .services.batch import enqueue_requests
+
 
+class ParameterAliasInline(admin.TabularInline):
+    model = ParameterAlias
+    extra = 1
+
+@admin.register(CanonicalParameter)
+class CanonicalParameterAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "symbol", "unit", "health_weight")
+    search_fields = ("name", "symbol", "aliases__alias")
+    inlines = [ParameterAliasInline]
 
 class WaterGuidelineParameterInline(admin.TabularInline):
     model = WaterGuidelineParameter
@@ -28,16 +47,25 @@ class WaterGuidelineAdmin(admin.ModelAdmin):
 
 @admin.register(WaterGuidelineParameter)
 class WaterGuidelineParameterAdmin(admin.ModelAdmin):
-    list_display = ("name", "guideline", "min_value", "max_value", "unit")
+    list_display = ("name", "parameter", "guideline", "min_value", "max_value", "unit")
     list_filter = ("guideline__usage",)
+    readonly_fields = ("parameter",)
     search_fields = ("name", "guideline__body")
 
 @admin.register(CustomerRequest)
 class CustomerRequestAdmin(admin.ModelAdmin):
-    list_display = ("id", "customer", "water_source", "water_usage", "daily_water_requirement", "status")
+    list_display = ("id", "customer", "water_source", "water_usage", "daily_water_requirement", "status", "severity_score")
     list_filter = ("status", "water_usage")
     search_fields = ("customer__username", "water_source")
     raw_id_fields = ("customer", "handlers")
+    actions = ("run_ai_pipeline",)
+
+    @admin.action(description="Run the AI pipeline on selected requests")
+    def run_ai_pipeline(self, request, queryset):
+        jobs, errors = enqueue_requests(queryset)
+        self.message_user(request, f"Queued {len(jobs)} pipeline jobs for the worker pool.", messages.SUCCESS)
+        for request_id, error in errors.items():
+            self.message_user(request, f"Skipped {request_id}: {error}", messages.WARNING)
 
 @admin.register(WaterLabReport)
 class WaterLabReportAdmin(admin.ModelAdmin):
@@ -48,7 +76,7 @@ class WaterLabReportAdmin(admin.ModelAdmin):
 
 @admin.register(WaterLabParameter)
 class WaterLabParameterAdmin(admin.ModelAdmin):
-    list_display = ("id", "lab_report", "name", "value", "unit")
+    list_display = ("id", "lab_report", "name", "parameter", "value", "unit")
     list_filter = ("name", "unit")
     search_fields = (
         "id",  # own ID
@@ -60,6 +88,15 @@ class WaterLabParameterAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ComplianceResult)
+class ComplianceResultAdmin(admin.ModelAdmin):
+    list_display = ("id", "lab_report", "guideline", "passed", "updated_at")
+    list_filter = ("passed", "guideline__usage")
+    search_fields = ("lab_report__id", "guideline__body")
+    raw_id_fields = ("lab_report", "guideline")
+    readonly_fields = ("violations", "summary")
+
+
 @admin.register(WaterReportAttachment)
 class WaterReportAttachmentAdmin(admin.ModelAdmin):
     list_display = ("id", "document_type", "customer_request", "water_report", "is_sensitive", "created_at")
@@ -74,3 +111,41 @@ class ManagementAttachmentAdmin(admin.ModelAdmin):
     search_fields = ("caption", "description")
     raw_id_fields = ("content_type",)
 
+
+@admin.register(PipelineJob)
+class PipelineJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "customer_request", "status", "attempts", "worker", "batch", "created_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("id", "customer_request__id", "batch__name")
+    raw_id_fields = ("customer_request", "batch")
+    readonly_fields = ("tool_input", "progress", "result", "error")
+
+
+@admin.register(PipelineBatch)
+class PipelineBatchAdmin(admin.ModelAdmin):
+    list_display = ("name", "processed", "succeeded", "failed", "skipped", "created_at", "finished_at")
+    search_fields = ("name",)
+    readonly_fields = ("cursor_created_at", "cursor_id", "processed", "succeeded", "failed", "skipped", "finished_at")
+
+
+@admin.register(LLMResponse)
+class LLMResponseAdmin(admin.ModelAdmin):
+    list_display = ("key", "model", "hits", "created_at", "last_used_at", "expires_at")
+    list_filter = ("model",)
+    search_fields = ("key", "response")
+
+
+@admin.register(PipelineCheckpoint)
+class PipelineCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("customer_request", "tool", "input_hash", "updated_at")
+    list_filter = ("tool",)
+    search_fields = ("customer_request__id",)
+    raw_id_fields = ("customer_request",)
+
+
+@admin.register(CatalogItem)
+class CatalogItemAdmin(admin.ModelAdmin):
+    list_display = ("no", "description", "component", "product_model", "rating", "unit_price", "inventory", "active")
+    list_filter = ("component", "active", "item_category_code")
+    search_fields = ("no", "description", "product_model")
+    readonly_fields = ("synced_at",)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Backends whose add() is no lock at all (check-then-write, or always succeeds)
+NON_ATOMIC_CACHE_BACKENDS = (
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+LOCAL_MEMORY_CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register(Tags.caches)
+def check_lock_cache(app_configs, **kwargs):
+    """The LLM rate limiter and guideline store rebuild lock need a cache shared by every worker with an atomic add()."""
+    backend = settings.CACHES.get("locks", {}).get("BACKEND")
+    hint = "Set LOCK_CACHE_BACKEND to Redis, Memcached or the database cache (manage.py createcachetable)."
+    if backend is None:
+        return [Error("CACHES has no 'locks' alias.", hint=hint, id="management.E001")]
+    if backend in NON_ATOMIC_CACHE_BACKENDS:
+        return [Error(f"The 'locks' cache ({backend}) cannot take locks atomically.", hint=hint, id="management.E002")]
+    if backend == LOCAL_MEMORY_CACHE_BACKEND:
+        return [Warning("The 'locks' cache is per process; workers will not share locks or rate limits.",
+                        hint=hint, id="management.W001")]
+    return []
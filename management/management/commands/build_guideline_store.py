@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from management.services.guideline_store import guideline_store
+
+
+class Command(BaseCommand):
+    help = "Compile all active water guidelines into the shared memory-mapped guideline store."
+
+    def handle(self, *args, **kwargs):
+        compiled = guideline_store.build()
+        if compiled is None:
+            self.stdout.write(self.style.ERROR("❌ Guideline store could not be mapped after building"))
+            return
+        guidelines, parameters = compiled.limits.shape[1:]
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Compiled {guidelines} active guidelines x {parameters} parameters (version {compiled.version})"
+        ))
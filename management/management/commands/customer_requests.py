@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model
 from management.models import CustomerRequest, WaterLabReport, WaterLabParameter
 from profiles.models import UserRole
 from management.models import ReportSource, TestType, WaterUsageChoices
+from management.services.compliance_results import refresh_reports
+from management.services.parameters import registry
+from management.services.triage import refresh_severity
 
 
 User = get_user_model()
@@ -55,6 +58,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('Not enough customers or staff to proceed.'))
             return
 
+        request_ids, report_ids = [], []
         for i in range(20):  # Adjust number of requests you want to seed
             customer = random.choice(customers)
             handlers = random.sample(list(staff_users), k=random.randint(2, 5))
@@ -93,12 +97,20 @@ class Command(BaseCommand):
                 params.append(WaterLabParameter(
                     lab_report=report,
                     name=param_name,
+                    # bulk_create skips the pre_save signal that resolves names
+                    parameter_id=registry.intern(param_name),
                     unit=meta["unit"],
                     value=value
                 ))
 
             # Bulk insert the parameters
             WaterLabParameter.objects.bulk_create(params)
+            request_ids.append(request.id)
+            report_ids.append(report.id)
+
+        # Nor does it send post_save: materialize compliance results and severity scores here
+        refresh_reports(report_ids)
+        refresh_severity(request_ids)
 
         self.stdout.write(self.style.SUCCESS('✅ Successfully seeded CustomerRequest, WaterLabReport, and Parameters.'))
 
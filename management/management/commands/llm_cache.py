@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand
+from management.AI import providers
+from management.AI.router import ProviderRouter
+from management.services import llm_cache, llm_stats
+
+
+class Command(BaseCommand):
+    help = "Show LLM response cache, hedging, treatment rule, JSON repair and provider statistics, or evict / clear cached responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help="Drop expired and least recently used entries.")
+        parser.add_argument('--clear', action='store_true', help="Drop every cached response and reset counters.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Cleared {llm_cache.clear()} cached responses"))
+        elif options['evict']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Evicted {llm_cache.evict()} cached responses"))
+        clients = providers.registry.clients()
+        stats = llm_cache.stats()
+        stats["hedging"] = llm_stats.hedge_stats(llm_cache.model_name(client) for client in clients)
+        stats["treatment_rules"] = llm_stats.counters(["rules:hit", "rules:miss"])
+        stats["structured_output"] = llm_stats.counters(["structured:repaired"])
+        stats["providers"] = ProviderRouter(clients).snapshot()
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from management.models import WaterLabReport
+from management.services.compliance_results import refresh_reports
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the stored compliance results of every lab report "
+            "(run after bulk imports or resolve_parameters, which bypass signals).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        report_ids = list(WaterLabReport.objects.order_by('id').values_list('id', flat=True))
+        total = 0
+        for start in range(0, len(report_ids), batch_size):
+            total += refresh_reports(report_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Recomputed {total} compliance results for {len(report_ids)} lab reports"
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from management.services.parameters import registry
+from management.services.triage import refresh_severity
+
+
+class Command(BaseCommand):
+    help = "Recompute the triage severity score of every customer request (run after editing health weights)."
+
+    def handle(self, *args, **kwargs):
+        registry.invalidate()
+        updated = refresh_severity()
+        self.stdout.write(self.style.SUCCESS(f"✅ Updated {updated} severity scores"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from management.models import WaterGuidelineParameter, WaterLabParameter
+from management.services import compliance_results
+from management.services.guideline_cache import bump_guideline_version
+from management.services.guideline_store import bump_store_epoch
+from management.services.parameters import registry
+
+
+class Command(BaseCommand):
+    help = "Re-resolve lab and guideline parameter names to canonical parameter ids (run after editing aliases)."
+
+    def handle(self, *args, **kwargs):
+        registry.invalidate()
+        unknown = set()
+        # bulk_update sends no signals: the caches and results that hold the old ids are refreshed below
+        owners = {WaterLabParameter: set(), WaterGuidelineParameter: set()}
+        for model, owner_field in ((WaterLabParameter, 'lab_report_id'), (WaterGuidelineParameter, 'guideline_id')):
+            changed = []
+            for row in model.objects.only('id', 'name', 'parameter', owner_field):
+                parameter_id = registry.lookup(row.name)
+                if parameter_id is None:
+                    unknown.add(row.name)
+                if parameter_id != row.parameter_id:
+                    row.parameter_id = parameter_id
+                    changed.append(row)
+                    owners[model].add(getattr(row, owner_field))
+            model.objects.bulk_update(changed, ['parameter'], batch_size=500)
+            self.stdout.write(self.style.SUCCESS(f"✅ {model._meta.verbose_name_plural}: {len(changed)} rows re-resolved"))
+
+        guideline_ids = owners[WaterGuidelineParameter]
+        for guideline_id in guideline_ids:
+            bump_guideline_version(guideline_id)
+        if guideline_ids:
+            bump_store_epoch()
+        for guideline_id in guideline_ids:
+            compliance_results.refresh_guideline(guideline_id)
+        if owners[WaterLabParameter]:
+            compliance_results.refresh_reports(owners[WaterLabParameter])
+        if unknown:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ No canonical parameter or alias for: {', '.join(sorted(unknown))}"
+            ))
@@ -0,0 +1,71 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from management.models import PipelineBatch
+from management.services.batch import run_batch, select_requests
+
+
+class Command(BaseCommand):
+    help = ("Run the AI pipeline over a filtered set of customer requests. Batches are named and resumable: "
+            "running the same name again continues after the last finished request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Batch name; reuse it to resume an interrupted batch.")
+        parser.add_argument('--status', help="Only requests with this status.")
+        parser.add_argument('--usage', help="Only requests with this water usage.")
+        parser.add_argument('--since', help="Only requests created on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--until', help="Only requests created on or before this date (YYYY-MM-DD).")
+        parser.add_argument('--ids', help="Comma-separated customer request ids.")
+        parser.add_argument('--concurrency', type=int, default=settings.PIPELINE_WORKER_CONCURRENCY,
+                            help="Pipelines in flight at once.")
+        parser.add_argument('--per-minute', type=float, help="Start at most this many pipelines per minute.")
+        parser.add_argument('--no-resume', action='store_true',
+                            help="Re-run every tool instead of restoring checkpointed outputs.")
+        parser.add_argument('--restart', action='store_true', help="Reset the cursor and counters of an existing batch.")
+
+    def handle(self, *args, **options):
+        filters = {key: options[key] for key in ('status', 'since', 'until') if options[key]}
+        if options['usage']:
+            filters['water_usage'] = options['usage']
+        if options['ids']:
+            filters['ids'] = [pk.strip() for pk in options['ids'].split(',') if pk.strip()]
+
+        batch, created = PipelineBatch.objects.get_or_create(
+            name=options['name'], defaults={'filters': filters, 'resume': not options['no_resume']}
+        )
+        if not created:
+            if filters and filters != batch.filters:
+                raise CommandError(f"Batch {batch.name} was started with filters {batch.filters}; "
+                                   f"use a new name, or --restart to replace them.")
+            if options['restart']:
+                batch.filters = filters or batch.filters
+                batch.resume = not options['no_resume']
+                batch.cursor_created_at = batch.cursor_id = batch.finished_at = None
+                batch.processed = batch.succeeded = batch.failed = batch.skipped = 0
+                batch.save()
+            elif batch.finished_at:
+                self.stdout.write(self.style.SUCCESS(f"✅ Batch {batch.name} already finished; --restart to run it again"))
+                return
+
+        total = select_requests(batch.filters).count()
+        self.stdout.write(f"Batch {batch.name}: {batch.processed} of {total} requests already processed")
+
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                # Finish the pipelines in flight, start no more; the cursor keeps the place
+                signal.signal(sig, lambda *_: stop.set())
+
+        def report(request, outcome):
+            self.stdout.write(f"[{batch.processed}/{total}] {request.id} {outcome}")
+
+        run_batch(batch, concurrency=options['concurrency'], per_minute=options['per_minute'],
+                  stop=stop, on_result=report)
+
+        summary = f"{batch.succeeded} succeeded, {batch.failed} failed, {batch.skipped} skipped"
+        if batch.finished_at:
+            self.stdout.write(self.style.SUCCESS(f"✅ Batch {batch.name} finished: {summary}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Batch {batch.name} stopped: {summary}; run it again to resume"))
@@ -0,0 +1,38 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from management.services.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run a pool of AI pipeline workers that claim queued jobs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.PIPELINE_WORKER_CONCURRENCY)
+        parser.add_argument('--poll', type=float, default=settings.PIPELINE_WORKER_POLL_SECONDS,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--drain', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                # Finish the jobs in flight, claim no more
+                signal.signal(sig, lambda *_: stop.set())
+
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(target=work, args=(f"{prefix}:{i}", stop, options['poll'], options['drain']), daemon=True)
+            for i in range(options['concurrency'])
+        ]
+        self.stdout.write(self.style.SUCCESS(f"✅ Started {len(threads)} pipeline workers ({prefix})"))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS("✅ Pipeline workers stopped"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from management.models import CatalogItem
+
+# Catalog fields refreshed from the ERP (get_product_details keys); component and rating are kept
+SYNCED_FIELDS = (
+    'description', 'item_category_code', 'product_model', 'specifications', 'unit_price', 'inventory', 'warranty',
+)
+
+
+class Command(BaseCommand):
+    help = "Refresh catalog item prices, stock and warranty from the ERP; --no adds items to the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no', nargs='+', default=[], help="ERP item numbers to add (or refresh).")
+
+    def handle(self, *args, **options):
+        # Imported here: the AI tools module loads the LangChain stack
+        from management.AI.tools import get_product_details
+
+        numbers = list(dict.fromkeys([*CatalogItem.objects.values_list('no', flat=True), *options['no']]))
+        synced, missing = 0, []
+        for no in numbers:
+            details = get_product_details(no)
+            if not details:
+                missing.append(no)
+                continue
+            CatalogItem.objects.update_or_create(
+                no=no, defaults={**{field: details[field] for field in SYNCED_FIELDS}, 'synced_at': timezone.now()}
+            )
+            synced += 1
+        self.stdout.write(self.style.SUCCESS(f"✅ Synced {synced} catalog items"))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"⚠️ Not found in the ERP: {', '.join(missing)}"))
@@ -1,8 +1,6 @@
 import base64
 from datetime import datetime, timedelta
 import markdown2
-from weasyprint import HTML
-from weasyprint.text.fonts import FontConfiguration
 import logging
 logger = logging.getLogger(__name__)
 def generate_pdf_from_markdown(markdown_content: str, stylesheet=None) -> str:
@@ -26,6 +24,10 @@ def generate_pdf_from_markdown(markdown_content: str, stylesheet=None) -> str:
             .footer { margin-top: 50px; font-size: 0.8em; color: #7f8c8d; }
             """
         
+        # Imported here: WeasyPrint pulls in Pango and its font stack
+        from weasyprint import HTML
+        from weasyprint.text.fonts import FontConfiguration
+
         font_config = FontConfiguration()
         html = HTML(string=html_content)
         pdf = html.write_pdf(stylesheets=[stylesheet], font_config=font_config)
@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanonicalParameter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('symbol', models.CharField(blank=True, max_length=50)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='waterguidelineparameter',
+            name='parameter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='guideline_parameters', to='management.canonicalparameter'),
+        ),
+        migrations.AddField(
+            model_name='waterlabparameter',
+            name='parameter',
+            field=models.ForeignKey(blank=True, help_text='Canonical parameter resolved from the name on save.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lab_parameters', to='management.canonicalparameter'),
+        ),
+        migrations.CreateModel(
+            name='ParameterAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100, unique=True)),
+                ('parameter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='management.canonicalparameter')),
+            ],
+            options={
+                'verbose_name_plural': 'Parameter Aliases',
+            },
+        ),
+    ]
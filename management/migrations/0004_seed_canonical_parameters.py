@@ -0,0 +1,76 @@
+import re
+
+from django.db import migrations
+
+
+# name, symbol, aliases
+CANONICAL_PARAMETERS = [
+    ("pH", "pH", ["PH", "pH value", "Hydrogen ion concentration"]),
+    ("Total Dissolved Solids", "TDS", ["Total Dissolved Solids (TDS)", "Dissolved solids"]),
+    ("Total Suspended Solids", "TSS", ["Suspended Solids", "Total Suspended Solids (TSS)"]),
+    ("Turbidity", "NTU", ["Turbidity (NTU)"]),
+    ("Electrical Conductivity", "EC", ["Conductivity", "Specific Conductance", "Electrical Conductivity (EC)"]),
+    ("Salinity", "", []),
+    ("Colour", "", ["Color", "True Colour", "Apparent Colour"]),
+    ("Temperature", "", ["Temp"]),
+    ("Iron", "Fe", ["Total Iron", "Iron (Fe)"]),
+    ("Manganese", "Mn", ["Manganese (Mn)"]),
+    ("Chlorine", "Cl2", ["Free Chlorine", "Residual Chlorine", "Free Residual Chlorine"]),
+    ("Chloride", "Cl", ["Chlorides", "Chloride (Cl-)"]),
+    ("Nitrate", "NO3", ["Nitrates", "Nitrate (NO3)", "Nitrate as NO3"]),
+    ("Nitrite", "NO2", ["Nitrites", "Nitrite (NO2)"]),
+    ("Ammonia", "NH3", ["Ammonium", "Ammonia (NH3)"]),
+    ("Sulphate", "SO4", ["Sulfate", "Sulphates", "Sulfates"]),
+    ("Fluoride", "F", ["Fluorides", "Fluoride (F-)"]),
+    ("Lead", "Pb", ["Lead (Pb)"]),
+    ("Arsenic", "As", ["Arsenic (As)"]),
+    ("Copper", "Cu", ["Copper (Cu)"]),
+    ("Zinc", "Zn", ["Zinc (Zn)"]),
+    ("Sodium", "Na", ["Sodium (Na)"]),
+    ("Calcium", "Ca", ["Calcium (Ca)"]),
+    ("Magnesium", "Mg", ["Magnesium (Mg)"]),
+    ("Alkalinity", "", ["Total Alkalinity", "Alkalinity as CaCO3"]),
+    ("Hardness", "", ["Total Hardness", "Hardness as CaCO3", "Total Hardness (CaCO3)"]),
+    ("E. coli", "", ["Escherichia coli", "E.coli", "Faecal Coliforms", "Fecal Coliforms"]),
+    ("Total Coliforms", "", ["Coliforms", "Coliform Bacteria"]),
+]
+
+
+def _normalize(name):
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", (name or "").casefold()).split())
+
+
+def seed_parameters(apps, schema_editor):
+    CanonicalParameter = apps.get_model('management', 'CanonicalParameter')
+    ParameterAlias = apps.get_model('management', 'ParameterAlias')
+    WaterLabParameter = apps.get_model('management', 'WaterLabParameter')
+    WaterGuidelineParameter = apps.get_model('management', 'WaterGuidelineParameter')
+
+    ids = {}
+    for name, symbol, aliases in CANONICAL_PARAMETERS:
+        parameter, _ = CanonicalParameter.objects.get_or_create(name=name, defaults={'symbol': symbol})
+        for key in [name, symbol, *aliases]:
+            if key:
+                ids.setdefault(_normalize(key), parameter.id)
+        for alias in aliases:
+            ParameterAlias.objects.get_or_create(alias=alias, defaults={'parameter': parameter})
+
+    # Backfill existing rows; unknown names stay unresolved until given an alias (see resolve_parameters)
+    for model in (WaterLabParameter, WaterGuidelineParameter):
+        for row in model.objects.filter(parameter__isnull=True):
+            key = _normalize(row.name)
+            if key not in ids:
+                continue
+            row.parameter_id = ids[key]
+            row.save(update_fields=['parameter'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0003_canonical_parameters'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_parameters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+CANONICAL_UNITS = {
+    "pH": "",
+    "Total Dissolved Solids": "mg/L",
+    "Total Suspended Solids": "mg/L",
+    "Turbidity": "NTU",
+    "Electrical Conductivity": "µS/cm",
+    "Salinity": "mg/L",
+    "Colour": "TCU",
+    "Temperature": "°C",
+    "Iron": "mg/L",
+    "Manganese": "mg/L",
+    "Chlorine": "mg/L",
+    "Chloride": "mg/L",
+    "Nitrate": "mg/L",
+    "Nitrite": "mg/L",
+    "Ammonia": "mg/L",
+    "Sulphate": "mg/L",
+    "Fluoride": "mg/L",
+    "Lead": "mg/L",
+    "Arsenic": "mg/L",
+    "Copper": "mg/L",
+    "Zinc": "mg/L",
+    "Sodium": "mg/L",
+    "Calcium": "mg/L",
+    "Magnesium": "mg/L",
+    "Alkalinity": "mg/L",
+    "Hardness": "mg/L",
+    "E. coli": "CFU/100mL",
+    "Total Coliforms": "CFU/100mL",
+}
+
+
+def set_canonical_units(apps, schema_editor):
+    CanonicalParameter = apps.get_model('management', 'CanonicalParameter')
+    for name, unit in CANONICAL_UNITS.items():
+        CanonicalParameter.objects.filter(name=name).update(unit=unit)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0004_seed_canonical_parameters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='canonicalparameter',
+            name='unit',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.RunPython(set_canonical_units, migrations.RunPython.noop),
+    ]
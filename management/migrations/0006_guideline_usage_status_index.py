@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+def normalize_usages(apps, schema_editor):
+    # Same rule as management.models.normalize_usage, frozen here
+    normalize = lambda usage: "_".join((usage or "").replace("-", " ").casefold().split())
+    for model_name, field in (('WaterGuideline', 'usage'), ('CustomerRequest', 'water_usage')):
+        model = apps.get_model('management', model_name)
+        for pk, usage in model.objects.values_list('pk', field):
+            if normalize(usage) != usage:
+                model.objects.filter(pk=pk).update(**{field: normalize(usage)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0005_canonical_parameter_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_usages, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='waterguideline',
+            index=models.Index(fields=['usage', 'status'], name='management__usage_663519_idx'),
+        ),
+    ]
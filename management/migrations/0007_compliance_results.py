@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 00:42
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0006_guideline_usage_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceResult',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('passed', models.BooleanField(default=True, help_text='True when no measured parameter falls outside the guideline limits.')),
+                ('violations', models.JSONField(default=list, help_text='Per-parameter rows that fall below the minimum or above the maximum.')),
+                ('summary', models.JSONField(default=dict, help_text='Counts of checked, regulated and violated parameters and the worst exceedance.')),
+                ('guideline', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compliance_results', to='management.waterguideline')),
+                ('lab_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compliance_results', to='management.waterlabreport')),
+            ],
+            options={
+                'verbose_name': 'Compliance Result',
+                'verbose_name_plural': 'Compliance Results',
+                'indexes': [models.Index(fields=['guideline', 'passed'], name='management__guideli_c0c8f2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('lab_report', 'guideline'), name='unique_compliance_result')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 00:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Health-critical parameters weigh more in severity scores; everything else stays at 1.0
+HEALTH_WEIGHTS = {
+    "Lead": 10.0,
+    "Arsenic": 10.0,
+    "E. coli": 10.0,
+    "Nitrate": 5.0,
+    "Nitrite": 5.0,
+    "Fluoride": 5.0,
+    "Total Coliforms": 3.0,
+    "Manganese": 2.0,
+    "Ammonia": 2.0,
+}
+
+
+def set_health_weights(apps, schema_editor):
+    CanonicalParameter = apps.get_model('management', 'CanonicalParameter')
+    for name, weight in HEALTH_WEIGHTS.items():
+        CanonicalParameter.objects.filter(name=name).update(health_weight=weight)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0007_compliance_results'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='canonicalparameter',
+            name='health_weight',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.RunPython(set_health_weights, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='customerrequest',
+            name='severity_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='customerrequest',
+            index=models.Index(fields=['status', '-severity_score'], name='request_triage_idx'),
+        ),
+    ]
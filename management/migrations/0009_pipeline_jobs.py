@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 00:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0008_severity_triage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('tool_input', models.JSONField(default=dict, help_text='Pipeline input assembled when the job was enqueued.')),
+                ('progress', models.JSONField(default=list, help_text='Execution log entries, appended as each tool finishes.')),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, help_text='Worker currently or last holding the job.', max_length=100)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('customer_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_jobs', to='management.customerrequest')),
+            ],
+            options={
+                'verbose_name': 'Pipeline Job',
+                'verbose_name_plural': 'Pipeline Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='management__status_f93afa_idx')],
+            },
+        ),
+    ]
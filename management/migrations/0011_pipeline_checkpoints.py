@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-17 00:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0010_llm_response_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pipelinejob',
+            name='resume',
+            field=models.BooleanField(default=True, help_text='Reuse checkpointed tool outputs whose inputs are unchanged.'),
+        ),
+        migrations.CreateModel(
+            name='PipelineCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tool', models.CharField(max_length=100)),
+                ('input_hash', models.CharField(help_text="SHA-256 of the tool's JSON inputs.", max_length=64)),
+                ('output', models.JSONField(default=dict)),
+                ('customer_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_checkpoints', to='management.customerrequest')),
+            ],
+            options={
+                'verbose_name': 'Pipeline Checkpoint',
+                'verbose_name_plural': 'Pipeline Checkpoints',
+                'constraints': [models.UniqueConstraint(fields=('customer_request', 'tool'), name='unique_pipeline_checkpoint')],
+            },
+        ),
+    ]
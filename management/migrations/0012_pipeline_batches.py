@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 01:03
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0011_pipeline_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.SlugField(max_length=100, unique=True)),
+                ('filters', models.JSONField(default=dict, help_text='CustomerRequest filters the batch was started with.')),
+                ('resume', models.BooleanField(default=True, help_text='Reuse checkpointed tool outputs whose inputs are unchanged.')),
+                ('cursor_created_at', models.DateTimeField(blank=True, null=True)),
+                ('cursor_id', models.UUIDField(blank=True, null=True)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('succeeded', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0, help_text='Requests whose pipeline input could not be built.')),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Pipeline Batch',
+                'verbose_name_plural': 'Pipeline Batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='pipelinejob',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='management.pipelinebatch'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0012_pipeline_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogItem',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('no', models.CharField(help_text='ERP item number.', max_length=50, primary_key=True, serialize=False)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('item_category_code', models.CharField(blank=True, max_length=50)),
+                ('product_model', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('specifications', models.TextField(blank=True)),
+                ('unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('inventory', models.IntegerField(default=0)),
+                ('warranty', models.CharField(blank=True, max_length=100)),
+                ('component', models.CharField(blank=True, choices=[('membrane', 'RO Membrane'), ('pressure_vessel', 'Pressure Vessel'), ('high_pressure_pump', 'High-Pressure Pump'), ('product_tank', 'Product Water Tank'), ('antiscalant_dosing', 'Antiscalant Dosing'), ('control_panel', 'Control Panel'), ('sediment_filter', 'Sediment Filter'), ('carbon_filter', 'Activated Carbon Filter'), ('softener', 'Softener'), ('iron_filter', 'Iron Removal Filter'), ('uv_sterilizer', 'UV Sterilizer'), ('chemical_dosing', 'Chemical Dosing')], db_index=True, max_length=50)),
+                ('rating', models.FloatField(blank=True, help_text='Size the item is selected by: kW for pumps, litres for tanks, m³/h for filters and dosing, elements for pressure vessels.', null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog Item',
+                'verbose_name_plural': 'Catalog Items',
+                'ordering': ['component', 'rating'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0013_catalog_items'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogitem',
+            name='component',
+            field=models.CharField(blank=True, choices=[('membrane', 'RO Membrane'), ('pressure_vessel', 'Pressure Vessel'), ('high_pressure_pump', 'High-Pressure Pump'), ('product_tank', 'Product Water Tank'), ('antiscalant_dosing', 'Antiscalant Dosing'), ('control_panel', 'Control Panel'), ('sediment_filter', 'Sediment Filter'), ('multimedia_filter', 'Multi-media Filter'), ('carbon_filter', 'Activated Carbon Filter'), ('softener', 'Softener'), ('iron_filter', 'Iron Removal Filter'), ('uv_sterilizer', 'UV Sterilizer'), ('chemical_dosing', 'Chemical Dosing')], db_index=True, max_length=50),
+        ),
+    ]
@@ -61,6 +61,11 @@ class WaterUsageChoices(models.TextChoices):
 
 
 
+def normalize_usage(usage):
+    """'Fire Protection', ' DRINKING ' -> 'fire_protection', 'drinking' (the WaterUsageChoices values)"""
+    return "_".join((usage or "").replace("-", " ").casefold().split())
+
+
 class DocumentType(models.TextChoices):
     WATER_ANALYSIS_REPORT = 'WAR', 'Water Analysis Report'
     TREATMENT_PLAN = 'TP', 'Treatment Plan'
@@ -88,6 +93,21 @@ class ReportSource(models.TextChoices):
         INTERNAL = 'Internal', 'Internal'
         EXTERNAL = 'External', 'External'
 
+class CatalogComponent(models.TextChoices):
+    MEMBRANE = 'membrane', 'RO Membrane'
+    PRESSURE_VESSEL = 'pressure_vessel', 'Pressure Vessel'
+    HIGH_PRESSURE_PUMP = 'high_pressure_pump', 'High-Pressure Pump'
+    PRODUCT_TANK = 'product_tank', 'Product Water Tank'
+    ANTISCALANT_DOSING = 'antiscalant_dosing', 'Antiscalant Dosing'
+    CONTROL_PANEL = 'control_panel', 'Control Panel'
+    SEDIMENT_FILTER = 'sediment_filter', 'Sediment Filter'
+    MULTIMEDIA_FILTER = 'multimedia_filter', 'Multi-media Filter'
+    CARBON_FILTER = 'carbon_filter', 'Activated Carbon Filter'
+    SOFTENER = 'softener', 'Softener'
+    IRON_FILTER = 'iron_filter', 'Iron Removal Filter'
+    UV_STERILIZER = 'uv_sterilizer', 'UV Sterilizer'
+    CHEMICAL_DOSING = 'chemical_dosing', 'Chemical Dosing'
+
 class WeekDay(models.IntegerChoices):
     MONDAY = 0, 'Monday'
     TUESDAY = 1, 'Tuesday'
@@ -114,6 +134,34 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class CanonicalParameter(models.Model):
+    """
+    Registry entry for a water quality parameter. Free-text names on lab and
+    guideline rows are resolved to these integer ids on write.
+    """
+    name = models.CharField(max_length=100, unique=True)  # e.g. "Total Dissolved Solids"
+    symbol = models.CharField(max_length=50, blank=True)  # e.g. "TDS"
+    unit = models.CharField(max_length=50, blank=True)  # canonical unit values are converted to, e.g. "mg/L"
+    health_weight = models.FloatField(default=1.0)  # severity multiplier for exceedances, higher for health-critical parameters
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.name} ({self.symbol})" if self.symbol else self.name
+
+
+class ParameterAlias(models.Model):
+    parameter = models.ForeignKey(CanonicalParameter, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=100, unique=True)  # e.g. "Total Dissolved Solids (TDS)", "PH"
+
+    class Meta:
+        verbose_name_plural = "Parameter Aliases"
+
+    def __str__(self):
+        return f"{self.alias} -> {self.parameter.name}"
+
+
 class WaterGuideline(BaseUUIDModel, TimeStampedModel):
     body =models.CharField(max_length=255) # WHO, KEBS, EPA, etc.
     usage = models.CharField(max_length=50,choices=WaterUsageChoices.choices)  # e.g. "domestic", "bottling", "industrial"
@@ -127,6 +175,11 @@ class WaterGuideline(BaseUUIDModel, TimeStampedModel):
     # turbidity = models.FloatField()
     # total_dissolved_solids = models.FloatField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['usage', 'status']),
+        ]
+
     def __str__(self):
         return f"{self.body} - {self.usage}"
 
@@ -134,6 +187,7 @@ class WaterGuideline(BaseUUIDModel, TimeStampedModel):
 class WaterGuidelineParameter(models.Model):
     guideline = models.ForeignKey('WaterGuideline', on_delete=models.CASCADE, related_name='parameters')
     name = models.CharField(max_length=100)  # e.g. "pH", "Iron", "TDS"
+    parameter = models.ForeignKey(CanonicalParameter, on_delete=models.SET_NULL, null=True, blank=True, related_name='guideline_parameters')  # resolved from name on save
     unit = models.CharField(max_length=50)   # e.g. "mg/L", "NTU", "μS/cm"
     # value = models.FloatField()
     min_value = models.FloatField(null=True, blank=True)  # e.g. 6.5
@@ -156,6 +210,12 @@ class CustomerRequest(BaseUUIDModel, TimeStampedModel):
     extras = models.JSONField(default=dict)
     budjet = models.JSONField(default=dict)
     status = models.CharField(max_length=255,choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')])
+    severity_score = models.FloatField(default=0.0, editable=False)  # weighted exceedance of the worst lab report, for triage
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-severity_score'], name='request_triage_idx'),
+        ]
 
 
 class WaterLabReport(BaseUUIDModel, TimeStampedModel):
@@ -203,6 +263,14 @@ class WaterLabParameter(models.Model):
         max_length=100,
         help_text="Parameter name, e.g., pH, Iron, TDS."
     )
+    parameter = models.ForeignKey(
+        CanonicalParameter,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='lab_parameters',
+        help_text="Canonical parameter resolved from the name on save."
+    )
     unit = models.CharField(
         max_length=50,
         help_text="Measurement unit, e.g., mg/L, NTU."
@@ -222,6 +290,48 @@ class WaterLabParameter(models.Model):
         verbose_name_plural = "Water Lab Parameters"
 
 
+class ComplianceResult(BaseUUIDModel, TimeStampedModel):
+    """
+    Materialized comparison of a lab report against one guideline, kept up to
+    date incrementally as lab parameters and guideline limits change.
+    """
+    lab_report = models.ForeignKey(
+        WaterLabReport,
+        on_delete=models.CASCADE,
+        related_name='compliance_results'
+    )
+    guideline = models.ForeignKey(
+        WaterGuideline,
+        on_delete=models.CASCADE,
+        related_name='compliance_results'
+    )
+    passed = models.BooleanField(
+        default=True,
+        help_text="True when no measured parameter falls outside the guideline limits."
+    )
+    violations = models.JSONField(
+        default=list,
+        help_text="Per-parameter rows that fall below the minimum or above the maximum."
+    )
+    summary = models.JSONField(
+        default=dict,
+        help_text="Counts of checked, regulated and violated parameters and the worst exceedance."
+    )
+
+    class Meta:
+        verbose_name = "Compliance Result"
+        verbose_name_plural = "Compliance Results"
+        constraints = [
+            models.UniqueConstraint(fields=['lab_report', 'guideline'], name='unique_compliance_result'),
+        ]
+        indexes = [
+            models.Index(fields=['guideline', 'passed']),
+        ]
+
+    def __str__(self):
+        return f"{self.lab_report_id} vs {self.guideline} ({'pass' if self.passed else 'fail'})"
+
+
 class WaterReportAttachment(BaseUUIDModel, TimeStampedModel):
     """
     Attachments related to water lab reports, such as supporting documents, images, or external files.
@@ -303,3 +413,156 @@ class ManagementAttachment(BaseUUIDModel, TimeStampedModel):
 
     def __str__(self):
         return f"{self.document_type} for {self.content_object} - {self.caption or 'No Caption'}"
+
+
+class PipelineBatch(BaseUUIDModel, TimeStampedModel):
+    """
+    A named run of the AI pipeline over a filtered set of customer requests
+    (`manage.py run_pipeline_batch`). The cursor is the last request, in
+    (created_at, id) order, up to which every request has been processed,
+    so an interrupted batch continues where it stopped.
+    """
+    name = models.SlugField(max_length=100, unique=True)
+    filters = models.JSONField(default=dict, help_text="CustomerRequest filters the batch was started with.")
+    resume = models.BooleanField(default=True, help_text="Reuse checkpointed tool outputs whose inputs are unchanged.")
+    cursor_created_at = models.DateTimeField(null=True, blank=True)
+    cursor_id = models.UUIDField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0, help_text="Requests whose pipeline input could not be built.")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Pipeline Batch"
+        verbose_name_plural = "Pipeline Batches"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Pipeline batch {self.name}"
+
+
+class PipelineJob(BaseUUIDModel, TimeStampedModel):
+    """
+    A queued AI pipeline run for a customer request, executed by the
+    run_pipeline_worker pool instead of inside the API request.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    customer_request = models.ForeignKey(
+        CustomerRequest,
+        on_delete=models.CASCADE,
+        related_name='pipeline_jobs'
+    )
+    batch = models.ForeignKey(
+        PipelineBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    tool_input = models.JSONField(default=dict, help_text="Pipeline input assembled when the job was enqueued.")
+    progress = models.JSONField(default=list, help_text="Execution log entries, appended as each tool finishes.")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    resume = models.BooleanField(default=True, help_text="Reuse checkpointed tool outputs whose inputs are unchanged.")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker currently or last holding the job.")
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Pipeline Job"
+        verbose_name_plural = "Pipeline Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Pipeline job {self.id} ({self.status})"
+
+
+class PipelineCheckpoint(TimeStampedModel):
+    """
+    Output of one successful AI tool run for a customer request, reused on the
+    next run while the tool's inputs hash the same.
+    """
+    customer_request = models.ForeignKey(
+        CustomerRequest,
+        on_delete=models.CASCADE,
+        related_name='pipeline_checkpoints'
+    )
+    tool = models.CharField(max_length=100)
+    input_hash = models.CharField(max_length=64, help_text="SHA-256 of the tool's JSON inputs.")
+    output = models.JSONField(default=dict)
+
+    class Meta:
+        verbose_name = "Pipeline Checkpoint"
+        verbose_name_plural = "Pipeline Checkpoints"
+        constraints = [
+            models.UniqueConstraint(fields=['customer_request', 'tool'], name='unique_pipeline_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.tool} checkpoint for {self.customer_request_id}"
+
+
+class LLMResponse(models.Model):
+    """
+    Cached raw LLM completion, keyed by a hash of (normalized prompt, model,
+    temperature, output schema). See services.llm_cache.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "LLM Response"
+        verbose_name_plural = "LLM Responses"
+
+    def __str__(self):
+        return f"{self.model} response {self.key[:12]} ({self.hits} hits)"
+
+
+class CatalogItem(TimeStampedModel):
+    """
+    Local copy of an ERP item quotations are priced from (see services.pricing).
+    Pricing fields mirror get_product_details and are refreshed by
+    `manage.py sync_catalog`; component and rating are set here and decide
+    which bill-of-materials line the item can fill.
+    """
+    no = models.CharField(max_length=50, primary_key=True, help_text="ERP item number.")
+    description = models.CharField(max_length=255, blank=True)
+    item_category_code = models.CharField(max_length=50, blank=True)
+    product_model = models.CharField(max_length=100, blank=True, db_index=True)
+    specifications = models.TextField(blank=True)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    inventory = models.IntegerField(default=0)
+    warranty = models.CharField(max_length=100, blank=True)
+    component = models.CharField(max_length=50, choices=CatalogComponent.choices, blank=True, db_index=True)
+    rating = models.FloatField(
+        null=True, blank=True,
+        help_text="Size the item is selected by: kW for pumps, litres for tanks, m³/h for filters and dosing, "
+                  "elements for pressure vessels."
+    )
+    active = models.BooleanField(default=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Catalog Item"
+        verbose_name_plural = "Catalog Items"
+        ordering = ['component', 'rating']
+
+    def __str__(self):
+        return f"{self.no} {self.description}"
@@ -70,7 +70,7 @@ from profiles.serializers import UserSerializer  # Assuming you have this
 class WaterGuidelineParameterSerializer(serializers.ModelSerializer):
     class Meta:
         model = WaterGuidelineParameter
-        fields = ['id', 'name', 'unit', 'min_value', 'max_value']
+        fields = ['id', 'name', 'parameter', 'unit', 'min_value', 'max_value']
         read_only_fields = fields
 
 class WaterGuidelineSerializer(serializers.ModelSerializer):
@@ -84,7 +84,17 @@ class WaterGuidelineSerializer(serializers.ModelSerializer):
 class WaterLabParameterSerializer(serializers.ModelSerializer):
     class Meta:
         model = WaterLabParameter
-        fields = ['id', 'name', 'unit', 'value']
+        fields = ['id', 'name', 'parameter', 'unit', 'value']
+        read_only_fields = fields
+
+class ComplianceResultSerializer(serializers.ModelSerializer):
+    guideline_body = serializers.CharField(source='guideline.body', read_only=True)
+    guideline_usage = serializers.CharField(source='guideline.usage', read_only=True)
+
+    class Meta:
+        model = ComplianceResult
+        fields = ['id', 'lab_report', 'guideline', 'guideline_body', 'guideline_usage',
+                  'passed', 'violations', 'summary', 'updated_at']
         read_only_fields = fields
 
 class WaterLabReportSerializer2(serializers.ModelSerializer):
@@ -116,7 +126,7 @@ class CustomerRequestSerializer(serializers.ModelSerializer):
             'id', 'customer', 'handlers',  'water_source', 
             'daily_water_requirement', 'daily_flow_rate',
             'water_usage', 'site_location', 'extras', 
-            'budjet', 'status', 'water_lab_reports', 'report_attachments','created_at'
+            'budjet', 'status', 'severity_score', 'water_lab_reports', 'report_attachments','created_at'
         ]
         read_only_fields = fields
 
@@ -163,4 +173,14 @@ class ManagementAttachmentSerializer(serializers.ModelSerializer):
     
     def get_content_object(self, obj):
         # Generic method to display minimal info about related object
-        return str(obj.content_object) if obj.content_object else None
\ No newline at end of file
+        return str(obj.content_object) if obj.content_object else None
+
+
+class PipelineJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PipelineJob
+        fields = [
+            'id', 'customer_request', 'status', 'progress', 'result', 'error',
+            'attempts', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
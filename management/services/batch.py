@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import close_old_connections
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from ..models import CustomerRequest, PipelineBatch, PipelineJob, normalize_usage
+from .jobs import enqueue, run_job, start
+from .pipeline import PipelineInputError, build_tool_input
+
+logger = logging.getLogger(__name__)
+
+SKIPPED = "skipped"
+
+
+def select_requests(filters: Dict[str, Any]) -> QuerySet:
+    """
+    Customer requests matching a batch's filters, in cursor order. Filters:
+    status, water_usage, since / until (ISO dates, inclusive), ids.
+    """
+    requests = CustomerRequest.objects.all()
+    if filters.get('status'):
+        requests = requests.filter(status=filters['status'])
+    if filters.get('water_usage'):
+        requests = requests.filter(water_usage=normalize_usage(filters['water_usage']))
+    if filters.get('since'):
+        requests = requests.filter(created_at__date__gte=date.fromisoformat(filters['since']))
+    if filters.get('until'):
+        requests = requests.filter(created_at__date__lte=date.fromisoformat(filters['until']))
+    if filters.get('ids'):
+        requests = requests.filter(id__in=filters['ids'])
+    return requests.order_by('created_at', 'id')
+
+
+def enqueue_requests(requests: Iterable[CustomerRequest], resume: bool = True) -> Tuple[List[PipelineJob], Dict[str, str]]:
+    """Queue a pipeline job per request for the worker pool; requests without a valid input are reported, not queued."""
+    jobs, errors = [], {}
+    for request in requests:
+        try:
+            jobs.append(enqueue(request.id, build_tool_input(request.id), resume=resume))
+        except PipelineInputError as e:
+            errors[str(request.id)] = str(e)
+    return jobs, errors
+
+
+def _run_threaded(job: PipelineJob) -> str:
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_batch(batch: PipelineBatch, concurrency: int = 1, per_minute: Optional[float] = None,
+              stop: Optional[threading.Event] = None,
+              on_result: Optional[Callable[[CustomerRequest, str], None]] = None) -> PipelineBatch:
+    """
+    Run the pipeline for every request of the batch after its cursor, with at
+    most ``concurrency`` pipelines in flight and at most ``per_minute`` started
+    per minute. Each run is recorded as a PipelineJob of the batch. Setting
+    ``stop`` lets the runs in flight finish and starts no more.
+    """
+    pending = select_requests(batch.filters)
+    if batch.cursor_id:
+        pending = pending.filter(
+            Q(created_at__gt=batch.cursor_created_at) | Q(created_at=batch.cursor_created_at, id__gt=batch.cursor_id)
+        )
+    worker = f"batch:{batch.name}"
+    interval = 60 / per_minute if per_minute else 0
+    next_start = time.monotonic()
+    # [request, done] in cursor order; the cursor moves over the finished prefix
+    window = []
+
+    def finish(entry, outcome):
+        entry[1] = True
+        batch.processed += 1
+        setattr(batch, outcome, getattr(batch, outcome) + 1)
+        while window and window[0][1]:
+            request, _ = window.pop(0)
+            batch.cursor_created_at, batch.cursor_id = request.created_at, request.id
+        batch.save(update_fields=['processed', outcome, 'cursor_created_at', 'cursor_id', 'updated_at'])
+        if on_result:
+            on_result(entry[0], outcome)
+
+    def collect(futures, return_when=FIRST_COMPLETED):
+        done, _ = wait(futures, return_when=return_when)
+        for future in done:
+            finish(running.pop(future), future.result())
+
+    pool = ThreadPoolExecutor(concurrency, thread_name_prefix="pipeline-batch") if concurrency > 1 else None
+    running = {}
+    try:
+        for request in pending.iterator():
+            if stop is not None and stop.is_set():
+                break
+            delay = next_start - time.monotonic()
+            if delay > 0 and (stop.wait(delay) if stop is not None else time.sleep(delay)):
+                break
+            next_start = max(next_start, time.monotonic()) + interval
+
+            entry = [request, False]
+            window.append(entry)
+            try:
+                tool_input = build_tool_input(request.id)
+            except PipelineInputError as e:
+                logger.warning(f"Batch {batch.name}: skipping customer request {request.id}: {e}")
+                finish(entry, SKIPPED)
+                continue
+
+            job = start(request.id, tool_input, worker, resume=batch.resume, batch=batch)
+            if pool is None:
+                finish(entry, run_job(job))
+                continue
+            running[pool.submit(_run_threaded, job)] = entry
+            if len(running) >= concurrency:
+                collect(list(running))
+        if running:
+            collect(list(running), return_when=ALL_COMPLETED)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    if stop is None or not stop.is_set():
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=['finished_at', 'updated_at'])
+    return batch
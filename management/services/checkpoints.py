@@ -0,0 +1,39 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from ..models import PipelineCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+def input_hash(tool_input: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(tool_input, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Per customer request tool outputs for execute_tool_sequence.
+
+    A tool is skipped when its checkpoint was produced from identical inputs.
+    Upstream outputs are inputs downstream, so a change re-runs exactly the
+    tools that depend on it, and a retry resumes at the first failed tool.
+    """
+
+    def __init__(self, customer_request_id):
+        self.customer_request_id = customer_request_id
+
+    def load(self, tool: str, tool_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return PipelineCheckpoint.objects.filter(
+            customer_request_id=self.customer_request_id, tool=tool, input_hash=input_hash(tool_input)
+        ).values_list('output', flat=True).first()
+
+    def save(self, tool: str, tool_input: Dict[str, Any], output: Dict[str, Any]):
+        PipelineCheckpoint.objects.update_or_create(
+            customer_request_id=self.customer_request_id, tool=tool,
+            defaults={'input_hash': input_hash(tool_input), 'output': json.loads(json.dumps(output, default=str))},
+        )
+
+    def clear(self):
+        PipelineCheckpoint.objects.filter(customer_request_id=self.customer_request_id).delete()
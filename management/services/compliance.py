@@ -0,0 +1,252 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+
+from .units import converter
+
+# Statuses reported per lab parameter
+WITHIN = "within"
+BELOW_MIN = "below_min"
+ABOVE_MAX = "above_max"
+NOT_REGULATED = "not_regulated"
+
+
+class CompiledGuideline:
+    """
+    A guideline's parameter limits held as contiguous NumPy arrays.
+
+    Compile once per guideline and reuse for every report comparison;
+    a missing min or max is stored as NaN so it never triggers a violation.
+    Parameters are matched on canonical parameter ids, not names, and limits
+    are held in each parameter's canonical unit.
+    """
+    __slots__ = ("id", "body", "usage", "parameter_ids", "names", "units", "min_values", "max_values", "index")
+
+    def __init__(self, guideline_id, body, usage, parameter_ids, names, units, min_values, max_values):
+        self.id = str(guideline_id)
+        self.body = body
+        self.usage = usage
+        self.parameter_ids = list(parameter_ids)
+        self.names = list(names)
+        self.units = list(units)
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        self.index = {pk: i for i, pk in enumerate(self.parameter_ids) if pk is not None}
+
+    @classmethod
+    def from_rows(cls, guideline_id, body, usage, rows):
+        """Build from (parameter_id, name, unit, min_value, max_value) rows."""
+        rows = list(rows)
+        parameter_ids = [r[0] for r in rows]
+        factors = converter.factors(parameter_ids, [r[2] for r in rows])
+        return cls(
+            guideline_id,
+            body,
+            usage,
+            parameter_ids,
+            [r[1] for r in rows],
+            [converter.canonical_unit(r[0]) or r[2] for r in rows],
+            np.array([r[3] for r in rows], dtype=np.float64) * factors,
+            np.array([r[4] for r in rows], dtype=np.float64) * factors,
+        )
+
+    @classmethod
+    def from_guideline(cls, guideline):
+        """Build from a WaterGuideline instance (parameters should be prefetched)."""
+        return cls.from_rows(guideline.id, guideline.body, guideline.usage, (
+            (p.parameter_id, p.name, p.unit, p.min_value, p.max_value) for p in guideline.parameters.all()
+        ))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Build from a cached guideline snapshot (see guideline_cache)."""
+        return cls.from_rows(snapshot['id'], snapshot['body'], snapshot['usage'], (
+            (pk, name, unit, min_value, max_value) for _, name, pk, unit, min_value, max_value in snapshot['parameters']
+        ))
+
+    def __len__(self):
+        return len(self.names)
+
+    def evaluate(self, parameter_ids: Sequence[int], values: Sequence[float]) -> Dict[str, np.ndarray]:
+        """
+        Check measured values (already in canonical units) against the guideline
+        in a single vectorized pass.
+
+        Returns arrays aligned with the input order:
+        - status: one of WITHIN / BELOW_MIN / ABOVE_MAX / NOT_REGULATED
+        - exceedance_ratio: max(value / max, min / value); > 1 means out of range
+        - margin: signed distance to the nearest limit; negative means out of range
+        """
+        idx = np.fromiter((self.index.get(pk, -1) for pk in parameter_ids), dtype=np.intp, count=len(parameter_ids))
+        return evaluate_limits(idx, np.asarray(values, dtype=np.float64), self.min_values, self.max_values)
+
+
+def evaluate_limits(idx: np.ndarray, values: np.ndarray, min_values: np.ndarray, max_values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized limit check; ``idx`` holds -1 for parameters the limits do not cover."""
+    regulated = idx >= 0
+    safe_idx = np.where(regulated, idx, 0)
+    if len(min_values):
+        lo = np.where(regulated, min_values[safe_idx], np.nan)
+        hi = np.where(regulated, max_values[safe_idx], np.nan)
+    else:
+        lo = hi = np.full(values.shape, np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        below = values < lo
+        above = values > hi
+        upper_ratio = np.where(hi > 0, values / hi, np.where(above, np.inf, np.nan))
+        lower_ratio = np.where(values > 0, lo / values, np.where(below, np.inf, np.nan))
+        ratio = np.fmax(upper_ratio, lower_ratio)
+        margin = np.fmin(hi - values, values - lo)
+
+    status = np.full(values.shape, WITHIN, dtype=object)
+    status[below] = BELOW_MIN
+    status[above] = ABOVE_MAX
+    status[~regulated] = NOT_REGULATED
+
+    return {
+        "status": status,
+        "exceedance_ratio": ratio,
+        "margin": margin,
+        "guideline_min": lo,
+        "guideline_max": hi,
+    }
+
+
+def _clean(value):
+    """NaN/inf are not valid JSON; surface them as None."""
+    return float(value) if np.isfinite(value) else None
+
+
+def compare_report(compiled: CompiledGuideline, parameters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare a list of {"parameter_id", "name", "value", "unit"} dicts against a compiled guideline.
+    Values are scaled to canonical units before the check.
+    """
+    parameter_ids = [p["parameter_id"] for p in parameters]
+    values = converter.to_canonical(parameter_ids, [p.get("unit", "") for p in parameters],
+                                    [p["value"] for p in parameters])
+    result = compiled.evaluate(parameter_ids, values)
+    canonical_units = converter.canonical_units(parameter_ids)
+
+    rows = []
+    for i, param in enumerate(parameters):
+        rows.append({
+            "name": param["name"],
+            "value": param["value"],
+            "unit": param.get("unit", ""),
+            "canonical_value": _clean(values[i]),
+            "canonical_unit": canonical_units[i],
+            "guideline_min": _clean(result["guideline_min"][i]),
+            "guideline_max": _clean(result["guideline_max"][i]),
+            "status": result["status"][i],
+            "exceedance_ratio": _clean(result["exceedance_ratio"][i]),
+            "margin": _clean(result["margin"][i]),
+        })
+
+    violations = sum(1 for row in rows if row["status"] in (BELOW_MIN, ABOVE_MAX))
+    return {
+        "guideline": compiled.id,
+        "guideline_body": compiled.body,
+        "guideline_usage": compiled.usage,
+        "compliant": violations == 0,
+        "violations": violations,
+        "parameters": rows,
+    }
+
+
+def lab_value_matrix(lab_rows, report_ids=None, n_params=0):
+    """
+    Scatter (report_id, parameter_id, unit, value) rows into a reports x parameters
+    matrix of canonical-unit values, with columns indexed by canonical parameter id.
+    """
+    report_index = {str(r): i for i, r in enumerate(report_ids or [])}
+    cells = []
+    for report_id, parameter_id, unit, value in lab_rows:
+        r = report_index.setdefault(str(report_id), len(report_index))
+        if parameter_id is not None:
+            cells.append((r, parameter_id, unit, value))
+
+    n_params = max([n_params] + [c[1] + 1 for c in cells])
+    values = np.full((len(report_index), n_params), np.nan)
+    if cells:
+        r, pk, unit, v = zip(*cells)
+        values[list(r), list(pk)] = converter.to_canonical(pk, unit, v)
+    return list(report_index), values
+
+
+def limit_matrices(guideline_rows, guideline_ids=None, n_params=0):
+    """
+    Scatter (guideline_id, parameter_id, unit, min_value, max_value) rows into
+    guidelines x parameters min/max matrices in canonical units.
+    """
+    guideline_index = {str(g): i for i, g in enumerate(guideline_ids or [])}
+    cells = []
+    for guideline_id, parameter_id, unit, min_value, max_value in guideline_rows:
+        g = guideline_index.setdefault(str(guideline_id), len(guideline_index))
+        if parameter_id is not None:
+            cells.append((g, parameter_id, unit, min_value, max_value))
+
+    n_params = max([n_params] + [c[1] + 1 for c in cells])
+    lo = np.full((len(guideline_index), n_params), np.nan)
+    hi = np.full((len(guideline_index), n_params), np.nan)
+    if cells:
+        g, pk, unit, mn, mx = zip(*cells)
+        factors = converter.factors(pk, unit)
+        lo[list(g), list(pk)] = np.asarray(mn, dtype=np.float64) * factors
+        hi[list(g), list(pk)] = np.asarray(mx, dtype=np.float64) * factors
+    return list(guideline_index), lo, hi
+
+
+def _pad(matrix, n_params):
+    if matrix.shape[1] >= n_params:
+        return matrix
+    padded = np.full((matrix.shape[0], n_params), np.nan)
+    padded[:, :matrix.shape[1]] = matrix
+    return padded
+
+
+def violation_counts(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """(reports, params) against (guidelines, params) limits -> (reports, guidelines) counts."""
+    n_params = max(values.shape[1], lo.shape[1])
+    values, lo, hi = _pad(values, n_params), _pad(lo, n_params), _pad(hi, n_params)
+    # (reports, 1, params) against (1, guidelines, params); NaN compares False
+    v = values[:, None, :]
+    return ((v < lo[None, :, :]) | (v > hi[None, :, :])).sum(axis=2)
+
+
+def composite_limits(lo: np.ndarray, hi: np.ndarray):
+    """
+    Intersect (guidelines, params) limit rows into the envelope that satisfies
+    all of them: per parameter the max of the mins and the min of the maxes,
+    NaN where no guideline sets one. Also returns a conflict mask (the envelope
+    is empty: min > max) and, per parameter, the row that set each bound (-1 if none).
+    """
+    env_lo = np.fmax.reduce(lo, axis=0)
+    env_hi = np.fmin.reduce(hi, axis=0)
+    min_source = np.where(np.isnan(env_lo), -1, np.argmax(np.where(np.isnan(lo), -np.inf, lo), axis=0))
+    max_source = np.where(np.isnan(env_hi), -1, np.argmin(np.where(np.isnan(hi), np.inf, hi), axis=0))
+    return env_lo, env_hi, env_lo > env_hi, min_source, max_source
+
+
+def screen_result(report_ids, guideline_ids, violations: np.ndarray) -> Dict[str, Any]:
+    return {
+        "reports": list(report_ids),
+        "guidelines": list(guideline_ids),
+        "violations": violations.tolist(),
+        "passed": (violations == 0).tolist(),
+    }
+
+
+def screen_matrix(lab_rows, guideline_rows, report_ids=None, guideline_ids=None) -> Dict[str, Any]:
+    """
+    Screen many reports against many guidelines as one broadcast array operation.
+
+    ``lab_rows`` are (report_id, parameter_id, unit, value) and ``guideline_rows``
+    are (guideline_id, parameter_id, unit, min_value, max_value) tuples, i.e. the
+    flat output of two ``values_list`` queries. Both sides are scaled to canonical
+    units first. Returns a reports x guidelines violation-count matrix and the
+    matching pass/fail matrix.
+    """
+    report_ids, values = lab_value_matrix(lab_rows, report_ids)
+    guideline_ids, lo, hi = limit_matrices(guideline_rows, guideline_ids)
+    return screen_result(report_ids, guideline_ids, violation_counts(values, lo, hi))
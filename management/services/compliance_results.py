@@ -0,0 +1,121 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..models import ComplianceResult, CustomerRequest, WaterGuideline, WaterLabParameter, WaterLabReport
+from .compliance import ABOVE_MAX, BELOW_MIN, NOT_REGULATED, compare_report
+from .guideline_cache import get_compiled_guideline
+from .guideline_store import active_guidelines_for_usage
+from .triage import refresh_severity
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ['passed', 'violations', 'summary', 'updated_at']
+
+
+def _lab_parameters(report_ids) -> Dict[str, List[Dict]]:
+    parameters = defaultdict(list)
+    rows = WaterLabParameter.objects.filter(lab_report_id__in=report_ids).values_list(
+        'lab_report_id', 'parameter_id', 'name', 'value', 'unit'
+    )
+    for report_id, parameter_id, name, value, unit in rows:
+        parameters[str(report_id)].append({"parameter_id": parameter_id, "name": name, "value": value, "unit": unit})
+    return parameters
+
+
+def build_result(report_id, guideline_id, parameters: List[Dict]) -> ComplianceResult:
+    comparison = compare_report(get_compiled_guideline(guideline_id), parameters)
+    rows = comparison["parameters"]
+    violations = [row for row in rows if row["status"] in (BELOW_MIN, ABOVE_MAX)]
+    worst = max(violations, key=lambda row: row["exceedance_ratio"] or 0, default=None)
+    return ComplianceResult(
+        lab_report_id=report_id,
+        guideline_id=guideline_id,
+        passed=not violations,
+        violations=violations,
+        summary={
+            "checked": len(rows),
+            "regulated": sum(1 for row in rows if row["status"] != NOT_REGULATED),
+            "violations": len(violations),
+            "worst_parameter": worst["name"] if worst else None,
+            "worst_exceedance_ratio": worst["exceedance_ratio"] if worst else None,
+        },
+    )
+
+
+def recompute(pairs: Iterable[Tuple]) -> int:
+    """
+    Recompute and upsert the results for (report id, guideline id) pairs, and
+    the severity scores of the customer requests they belong to.
+    """
+    pairs = {(str(r), str(g)) for r, g in pairs}
+    if not pairs:
+        return 0
+    parameters = _lab_parameters({r for r, _ in pairs})
+    results = [build_result(r, g, parameters.get(r, [])) for r, g in pairs]
+    ComplianceResult.objects.bulk_create(
+        results, update_conflicts=True, unique_fields=['lab_report', 'guideline'], update_fields=UPDATE_FIELDS
+    )
+    refresh_severity(WaterLabReport.objects.filter(id__in={r for r, _ in pairs})
+                     .values_list('customer_request_id', flat=True).distinct())
+    logger.debug(f"Recomputed {len(results)} compliance results")
+    return len(results)
+
+
+def refresh_reports(report_ids) -> int:
+    """
+    Bring every result of the given reports up to date: one row per active
+    guideline for the report's water usage, dropping rows that no longer apply.
+    """
+    pairs = []
+    usages = WaterLabReport.objects.filter(id__in=report_ids).values_list('id', 'customer_request__water_usage')
+    for report_id, usage in usages:
+        guideline_ids = active_guidelines_for_usage(usage)
+        ComplianceResult.objects.filter(lab_report_id=report_id).exclude(guideline_id__in=guideline_ids).delete()
+        pairs.extend((report_id, guideline_id) for guideline_id in guideline_ids)
+    return recompute(pairs)
+
+
+def refresh_guideline(guideline_id, parameter_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute a guideline's results after it changed. With ``parameter_ids``
+    (a limit edit) only reports that measure one of those parameters are
+    touched; without, every report for the guideline's usage is.
+    """
+    guideline = WaterGuideline.objects.filter(id=guideline_id).values_list('usage', 'status').first()
+    if guideline is None or guideline[1] != 'active':
+        ComplianceResult.objects.filter(guideline_id=guideline_id).delete()
+        if guideline is not None:
+            # Another guideline may now be the one its usage is scored against
+            refresh_severity(CustomerRequest.objects.filter(water_usage=guideline[0]).values_list('id', flat=True))
+        return 0
+    reports = WaterLabReport.objects.filter(customer_request__water_usage=guideline[0])
+    if parameter_ids is None:
+        ComplianceResult.objects.filter(guideline_id=guideline_id).exclude(lab_report__in=reports).delete()
+    else:
+        parameter_ids = [pk for pk in parameter_ids if pk is not None]
+        reports = reports.filter(parameters__parameter_id__in=parameter_ids)
+    report_ids = reports.values_list('id', flat=True).distinct()
+    return recompute((report_id, guideline_id) for report_id in report_ids)
+
+
+def stored_violations(report_ids, guideline_id) -> Optional[List[Dict]]:
+    """
+    Precomputed violations for reports against a guideline, in analyse_lab_report's
+    shape; None unless every report has its result materialized.
+    """
+    violations = []
+    report_ids = {str(r) for r in report_ids}
+    results = ComplianceResult.objects.filter(lab_report_id__in=report_ids, guideline_id=guideline_id)
+    rows = list(results.values_list('lab_report_id', 'violations'))
+    if {str(r) for r, _ in rows} != report_ids:
+        return None
+    for _, violation_rows in rows:
+        for row in violation_rows:
+            violations.append({
+                "parameter": row["name"],
+                "value": row["value"],
+                "violation": "below minimum" if row["status"] == BELOW_MIN else "above maximum",
+                "guideline_range": f"{row['guideline_min']} - {row['guideline_max']} {row['canonical_unit'] or ''}".strip(),
+            })
+    return violations
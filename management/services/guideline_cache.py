@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+from uuid import UUID
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from ..models import WaterGuideline, WaterGuidelineParameter
+from .compliance import CompiledGuideline, composite_limits, limit_matrices
+from .guideline_store import StoredGuideline, guideline_store
+from .parameters import registry
+
+# Snapshots are only ever replaced by bumping the version, so they can live long
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# Column order of the compact parameter tuples in a snapshot
+PARAMETER_FIELDS = ('id', 'name', 'parameter', 'unit', 'min_value', 'max_value')
+
+
+def _canonical_id(guideline_id) -> str:
+    """One cache key per guideline however the id is spelled; raises ValueError if malformed."""
+    return str(UUID(str(guideline_id)))
+
+
+def _version_key(guideline_id) -> str:
+    return f"guideline:{_canonical_id(guideline_id)}:version"
+
+
+def _snapshot_key(guideline_id, version) -> str:
+    return f"guideline:{_canonical_id(guideline_id)}:v{version}"
+
+
+def get_guideline_version(guideline_id) -> int:
+    version = cache.get(_version_key(guideline_id))
+    if version is None:
+        # A fresh, never-reused version so an evicted counter can't resurrect stale snapshots
+        cache.add(_version_key(guideline_id), time.time_ns(), None)
+        version = cache.get(_version_key(guideline_id))
+    return version
+
+
+def bump_guideline_version(guideline_id):
+    """Invalidate every worker's snapshot of a guideline."""
+    try:
+        cache.incr(_version_key(guideline_id))
+    except ValueError:
+        cache.set(_version_key(guideline_id), time.time_ns(), None)
+
+
+def build_guideline_snapshot(guideline_id) -> Dict[str, Any]:
+    """Load a guideline and its parameters into a compact, JSON-safe dict."""
+    guideline = WaterGuideline.objects.prefetch_related(
+        Prefetch('parameters', queryset=WaterGuidelineParameter.objects.only(
+            'id', 'guideline', 'name', 'parameter', 'unit', 'min_value', 'max_value'
+        ))
+    ).get(id=guideline_id)
+    return {
+        'id': str(guideline.id),
+        'body': guideline.body,
+        'usage': guideline.usage,
+        'status': guideline.status,
+        'description': guideline.description,
+        'parameters': [
+            (p.id, p.name, p.parameter_id, p.unit, p.min_value, p.max_value)
+            for p in guideline.parameters.all()
+        ],
+    }
+
+
+def get_guideline_snapshot(guideline_id) -> Dict[str, Any]:
+    """
+    Serve a guideline snapshot from the shared cache, loading it on a miss.
+
+    Raises WaterGuideline.DoesNotExist (or ValueError for a malformed id).
+    """
+    version = get_guideline_version(guideline_id)
+    key = _snapshot_key(guideline_id, version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_guideline_snapshot(guideline_id)
+        snapshot['version'] = version
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def guideline_representation(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand a snapshot into the WaterGuidelineSerializer response shape."""
+    return {
+        'id': snapshot['id'],
+        'body': snapshot['body'],
+        'usage': snapshot['usage'],
+        'description': snapshot['description'],
+        'parameters': [dict(zip(PARAMETER_FIELDS, row)) for row in snapshot['parameters']],
+    }
+
+
+class _CompiledGuidelines:
+    """Per-process LRU memo of compiled arrays, keyed by guideline id(s) and version(s)."""
+
+    def __init__(self, maxsize=256):
+        self._items = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            compiled = self._items.get(key)
+            if compiled is not None:
+                self._items.move_to_end(key)
+                return compiled
+        compiled = build()
+        with self._lock:
+            self._items[key] = compiled
+            if len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+        return compiled
+
+    def get(self, guideline_id) -> CompiledGuideline:
+        # Only the version is read from the shared cache while the memo is warm
+        key = (_canonical_id(guideline_id), get_guideline_version(guideline_id))
+        return self.get_or_build(key, lambda: CompiledGuideline.from_snapshot(get_guideline_snapshot(guideline_id)))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+compiled_guidelines = _CompiledGuidelines()
+composite_guidelines = _CompiledGuidelines(maxsize=64)
+# Canonical ids and units are baked into the arrays
+registry.on_invalidate(compiled_guidelines.clear)
+registry.on_invalidate(composite_guidelines.clear)
+
+
+def get_compiled_guideline(guideline_id):
+    """
+    Compiled limits for the current version of a guideline: a row of the shared
+    memory-mapped set for active guidelines, otherwise compiled from its snapshot.
+    """
+    store = guideline_store.current()
+    if store is not None:
+        stored = store.guideline(_canonical_id(guideline_id))
+        if stored is not None:
+            return stored
+    return compiled_guidelines.get(guideline_id)
+
+
+class CompositeGuideline(StoredGuideline):
+    """
+    The strictest envelope of several guidelines (e.g. KEBS + WHO), with dense
+    limit columns indexed by canonical parameter id. Evaluates like one guideline.
+    """
+    __slots__ = ("guideline_ids", "bodies", "conflicts", "min_sources", "max_sources")
+
+    def __init__(self, guideline_ids, bodies, usages, lo, hi):
+        min_values, max_values, conflicts, min_sources, max_sources = composite_limits(lo, hi)
+        usage = usages[0] if len(set(usages)) == 1 else "+".join(sorted(set(usages)))
+        super().__init__("+".join(guideline_ids), " + ".join(bodies), usage, min_values, max_values)
+        self.guideline_ids = list(guideline_ids)
+        self.bodies = list(bodies)
+        self.conflicts = conflicts
+        self.min_sources = min_sources
+        self.max_sources = max_sources
+
+    def envelope(self) -> List[Dict[str, Any]]:
+        """Per-parameter bounds, which guideline set each, and whether they conflict."""
+        rows = []
+        regulated = ~(np.isnan(self.min_values) & np.isnan(self.max_values))
+        for pk in np.flatnonzero(regulated).tolist():
+            lo, hi = self.min_values[pk], self.max_values[pk]
+            rows.append({
+                "parameter_id": pk,
+                "name": registry.name(pk),
+                "unit": registry.unit(pk),
+                "min_value": None if np.isnan(lo) else float(lo),
+                "max_value": None if np.isnan(hi) else float(hi),
+                "min_source": self.guideline_ids[self.min_sources[pk]] if self.min_sources[pk] >= 0 else None,
+                "max_source": self.guideline_ids[self.max_sources[pk]] if self.max_sources[pk] >= 0 else None,
+                "conflict": bool(self.conflicts[pk]),
+            })
+        return rows
+
+
+def _build_composite(guideline_ids) -> CompositeGuideline:
+    n_params = max(registry.units(), default=-1) + 1
+    store = guideline_store.current()
+    if store is not None and all(g in store for g in guideline_ids):
+        rows = store.rows(guideline_ids)
+        bodies = [store.bodies[r] for r in rows]
+        usages = [store.usages[r] for r in rows]
+        lo, hi = store.min_values[rows], store.max_values[rows]
+    else:
+        snapshots = [get_guideline_snapshot(g) for g in guideline_ids]
+        bodies = [s['body'] for s in snapshots]
+        usages = [s['usage'] for s in snapshots]
+        _, lo, hi = limit_matrices((
+            (s['id'], pk, unit, min_value, max_value)
+            for s in snapshots for _, _, pk, unit, min_value, max_value in s['parameters']
+        ), guideline_ids, n_params)
+    return CompositeGuideline(guideline_ids, bodies, usages, lo, hi)
+
+
+def get_composite_guideline(guideline_ids) -> CompositeGuideline:
+    """
+    Strictest envelope of several guidelines, memoized by the sorted id set and
+    their versions, so checking against it costs the same as a single guideline.
+
+    Raises WaterGuideline.DoesNotExist (or ValueError for a malformed or empty id list).
+    """
+    guideline_ids = sorted({_canonical_id(g) for g in guideline_ids})
+    if not guideline_ids:
+        raise ValueError("No guideline ids")
+    key = tuple((g, get_guideline_version(g)) for g in guideline_ids)
+    return composite_guidelines.get_or_build(key, lambda: _build_composite(guideline_ids))
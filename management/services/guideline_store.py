@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import WaterGuideline, WaterGuidelineParameter, normalize_usage
+from .compliance import evaluate_limits, limit_matrices
+from .locks import lock_cache
+from .parameters import registry
+
+logger = logging.getLogger(__name__)
+
+EPOCH_KEY = "guideline_store:epoch"
+LOCK_KEY = "guideline_store:lock"
+LOCK_TIMEOUT = 60
+POINTER_NAME = "CURRENT"
+KEEP_VERSIONS = 2
+# Order of guidelines within a usage; the first one is auto-selected for requests
+USAGE_ORDERING = ('created_at', 'id')
+
+
+def get_store_epoch() -> int:
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        cache.add(EPOCH_KEY, time.time_ns(), None)
+        epoch = cache.get(EPOCH_KEY)
+    return epoch
+
+
+def bump_store_epoch():
+    """Mark the compiled set stale; the next reader rebuilds it."""
+    try:
+        cache.incr(EPOCH_KEY)
+    except ValueError:
+        cache.set(EPOCH_KEY, time.time_ns(), None)
+
+
+class StoredGuideline:
+    """A guideline backed by one row of the mapped arrays (columns are canonical ids)."""
+    __slots__ = ("id", "body", "usage", "min_values", "max_values")
+
+    def __init__(self, guideline_id, body, usage, min_values, max_values):
+        self.id = guideline_id
+        self.body = body
+        self.usage = usage
+        self.min_values = min_values
+        self.max_values = max_values
+
+    def evaluate(self, parameter_ids: Sequence[Optional[int]], values: Sequence[float]):
+        n = len(self.min_values)
+        idx = np.fromiter(
+            (pk if pk is not None and 0 <= pk < n else -1 for pk in parameter_ids),
+            dtype=np.intp, count=len(parameter_ids)
+        )
+        covered = idx >= 0
+        if n:
+            safe = np.where(covered, idx, 0)
+            covered &= ~(np.isnan(self.min_values[safe]) & np.isnan(self.max_values[safe]))
+        return evaluate_limits(np.where(covered, idx, -1), np.asarray(values, dtype=np.float64),
+                               self.min_values, self.max_values)
+
+
+class CompiledGuidelineSet:
+    """Read-only view of one on-disk version of the compiled set."""
+
+    def __init__(self, meta: Dict, limits: np.ndarray):
+        self.epoch = meta["epoch"]
+        self.version = meta["version"]
+        self.ids: List[str] = meta["ids"]
+        self.bodies: List[str] = meta["bodies"]
+        self.usages: List[str] = meta["usages"]
+        self.index = {gid: i for i, gid in enumerate(self.ids)}
+        self.by_usage: Dict[str, List[str]] = {}
+        for gid, usage in zip(self.ids, self.usages):
+            self.by_usage.setdefault(usage, []).append(gid)
+        self.limits = limits  # (2, guidelines, parameters), memory-mapped
+
+    @property
+    def min_values(self) -> np.ndarray:
+        return self.limits[0]
+
+    @property
+    def max_values(self) -> np.ndarray:
+        return self.limits[1]
+
+    def __contains__(self, guideline_id) -> bool:
+        return str(guideline_id) in self.index
+
+    def rows(self, guideline_ids: Sequence) -> List[int]:
+        return [self.index[str(gid)] for gid in guideline_ids]
+
+    def guideline(self, guideline_id) -> Optional[StoredGuideline]:
+        row = self.index.get(str(guideline_id))
+        if row is None:
+            return None
+        return StoredGuideline(self.ids[row], self.bodies[row], self.usages[row],
+                               self.limits[0, row], self.limits[1, row])
+
+
+class GuidelineStore:
+    """
+    All active guidelines compiled into contiguous min/max arrays indexed by
+    canonical parameter id, written to a file every worker maps read-only.
+
+    Builds are written under a new version name and published by atomically
+    replacing a pointer file, so readers never see a half-written set. Any
+    guideline change bumps a shared epoch and the next reader rebuilds.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._mapped: Optional[CompiledGuidelineSet] = None
+        self._pointer_stat = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        return Path(self._directory or settings.GUIDELINE_STORE_DIR)
+
+    def _write_atomic(self, path: Path, write):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                write(fh)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def build(self) -> CompiledGuidelineSet:
+        """Compile active guidelines from the database and publish a new version."""
+        epoch = get_store_epoch()  # read first, so a change during the build leaves it stale
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+
+        guidelines = list(WaterGuideline.objects.filter(status='active').order_by(*USAGE_ORDERING).values_list('id', 'body', 'usage'))
+        rows = WaterGuidelineParameter.objects.filter(guideline__status='active').values_list(
+            'guideline_id', 'parameter_id', 'unit', 'min_value', 'max_value'
+        )
+        n_params = max(registry.units(), default=-1) + 1
+        ids, lo, hi = limit_matrices(rows, [g[0] for g in guidelines], n_params=n_params)
+        limits = np.ascontiguousarray(np.stack([lo, hi]))
+
+        version = f"{time.time_ns()}-{os.getpid()}"
+        meta = {
+            "epoch": epoch,
+            "version": version,
+            "ids": ids,
+            "bodies": [g[1] for g in guidelines],
+            "usages": [g[2] for g in guidelines],
+            "shape": list(limits.shape),
+        }
+        self._write_atomic(directory / f"guidelines-{version}.npy", lambda fh: np.save(fh, limits))
+        self._write_atomic(directory / f"guidelines-{version}.json", lambda fh: fh.write(json.dumps(meta).encode()))
+        self._write_atomic(directory / POINTER_NAME, lambda fh: fh.write(version.encode()))
+        self._prune(version)
+        logger.info(f"Compiled guideline set {version}: {limits.shape[1]} guidelines x {limits.shape[2]} parameters")
+        return self._map()
+
+    def _prune(self, current: str):
+        # Unlinking a file another worker still has mapped is safe on POSIX
+        versions = sorted(
+            (p for p in self.directory.glob("guidelines-*.json")),
+            key=lambda p: p.stat().st_mtime_ns, reverse=True,
+        )
+        for meta_path in versions[KEEP_VERSIONS:]:
+            if current in meta_path.name:
+                continue
+            for path in (meta_path, meta_path.with_suffix(".npy")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _map(self) -> Optional[CompiledGuidelineSet]:
+        pointer = self.directory / POINTER_NAME
+        try:
+            stat = pointer.stat()
+            version = pointer.read_text().strip()
+            with open(self.directory / f"guidelines-{version}.json") as fh:
+                meta = json.load(fh)
+            limits = np.load(self.directory / f"guidelines-{version}.npy", mmap_mode="r")
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug(f"No compiled guideline set available: {e}")
+            return None
+        with self._lock:
+            self._mapped = CompiledGuidelineSet(meta, limits)
+            self._pointer_stat = (stat.st_ino, stat.st_mtime_ns)
+        return self._mapped
+
+    def _pointer_changed(self) -> bool:
+        try:
+            stat = (self.directory / POINTER_NAME).stat()
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._pointer_stat
+
+    def current(self) -> Optional[CompiledGuidelineSet]:
+        """
+        The up-to-date compiled set, rebuilding it if guidelines changed.
+        Returns None when it is stale and another worker is rebuilding;
+        callers then fall back to the database.
+        """
+        epoch = get_store_epoch()
+        mapped = self._mapped
+        if mapped is not None and mapped.epoch == epoch:
+            return mapped
+        if self._pointer_changed():
+            mapped = self._map()
+            if mapped is not None and mapped.epoch == epoch:
+                return mapped
+        if not lock_cache.add(LOCK_KEY, os.getpid(), LOCK_TIMEOUT):
+            return None
+        try:
+            mapped = self.build()
+        finally:
+            lock_cache.delete(LOCK_KEY)
+        return mapped if mapped is not None and mapped.epoch == get_store_epoch() else None
+
+
+guideline_store = GuidelineStore()
+# Columns are canonical parameter ids and limits are in canonical units
+registry.on_invalidate(bump_store_epoch)
+
+
+def active_guidelines_for_usage(usage) -> List[str]:
+    """
+    Ids of active guidelines for a water usage, oldest first. An O(1) lookup in
+    the compiled set; falls back to the (usage, status) index while it rebuilds.
+    """
+    usage = normalize_usage(usage)
+    store = guideline_store.current()
+    if store is not None:
+        return list(store.by_usage.get(usage, ()))
+    return [str(pk) for pk in WaterGuideline.objects.filter(usage=usage, status='active')
+            .order_by(*USAGE_ORDERING).values_list('id', flat=True)]
@@ -0,0 +1,139 @@
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import PipelineJob
+
+logger = logging.getLogger(__name__)
+
+# Queued jobs inspected per claim attempt; losing a race moves on to the next one
+CLAIM_WINDOW = 10
+
+
+def enqueue(customer_request_id, tool_input: Dict, resume: bool = True) -> PipelineJob:
+    return PipelineJob.objects.create(customer_request_id=customer_request_id, tool_input=tool_input, resume=resume)
+
+
+def start(customer_request_id, tool_input: Dict, worker: str, resume: bool = True, batch=None) -> PipelineJob:
+    """A job claimed by ``worker`` from the start, for callers that run it themselves (see run_job)."""
+    now = timezone.now()
+    return PipelineJob.objects.create(
+        customer_request_id=customer_request_id, tool_input=tool_input, resume=resume, batch=batch,
+        status=PipelineJob.Status.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=1,
+    )
+
+
+def claim(worker: str) -> Optional[PipelineJob]:
+    """
+    Take the oldest queued job. The conditional UPDATE makes the claim atomic
+    on every database backend, so workers need nothing beyond the database.
+    """
+    queued = PipelineJob.objects.filter(status=PipelineJob.Status.QUEUED).order_by('created_at')
+    for pk in queued.values_list('id', flat=True)[:CLAIM_WINDOW]:
+        now = timezone.now()
+        claimed = PipelineJob.objects.filter(pk=pk, status=PipelineJob.Status.QUEUED).update(
+            status=PipelineJob.Status.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return PipelineJob.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale() -> int:
+    """Return orphaned running jobs (their worker died) to the queue, or fail them after too many attempts."""
+    now = timezone.now()
+    stale = PipelineJob.objects.filter(
+        status=PipelineJob.Status.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.PIPELINE_JOB_STALE_SECONDS),
+    )
+    stale.filter(attempts__gte=settings.PIPELINE_JOB_MAX_ATTEMPTS).update(
+        status=PipelineJob.Status.FAILED, error="Worker stopped responding", finished_at=now,
+    )
+    requeued = stale.update(status=PipelineJob.Status.QUEUED, worker='')
+    if requeued:
+        logger.warning(f"Re-queued {requeued} stale pipeline jobs")
+    return requeued
+
+
+def _json_safe(data):
+    return json.loads(json.dumps(data, default=str))
+
+
+def _heartbeat(owned, stop: threading.Event):
+    """Keep a running job's heartbeat fresh until ``stop`` is set, so a slow tool doesn't look like a dead worker."""
+    try:
+        while not stop.wait(settings.PIPELINE_JOB_HEARTBEAT_SECONDS):
+            owned.update(heartbeat_at=timezone.now())
+    except Exception:
+        logger.exception("Pipeline job heartbeat failed")
+    finally:
+        close_old_connections()
+
+
+def run_job(job: PipelineJob, runner: Optional[Callable] = None) -> str:
+    """Execute a claimed job, recording each finished tool as progress; returns its final status."""
+    if runner is None:
+        from .pipeline import run_pipeline
+        runner = run_pipeline
+    progress = []
+    owned = PipelineJob.objects.filter(pk=job.pk, worker=job.worker, status=PipelineJob.Status.RUNNING)
+
+    def on_progress(entry):
+        progress.append(_json_safe({k: v for k, v in entry.items() if k != 'context_snapshot'}))
+        owned.update(progress=progress, heartbeat_at=timezone.now())
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(owned, stop_heartbeat),
+                                 name=f"heartbeat-{job.pk}", daemon=True)
+    heartbeat.start()
+    try:
+        result = _json_safe(runner(job.tool_input, on_progress=on_progress,
+                                   customer_request_id=job.customer_request_id, resume=job.resume))
+    except Exception as e:
+        logger.exception(f"Pipeline job {job.pk} crashed")
+        owned.update(status=PipelineJob.Status.FAILED, error=str(e), finished_at=timezone.now())
+        return PipelineJob.Status.FAILED
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+    final_status = PipelineJob.Status.SUCCEEDED if result.get('success') else PipelineJob.Status.FAILED
+    owned.update(
+        status=final_status,
+        result=result,
+        error="; ".join(result.get('errors', [])),
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Pipeline job {job.pk} finished")
+    return final_status
+
+
+def work(worker: str, stop: threading.Event, poll_seconds: float, drain: bool = False):
+    """
+    One worker thread: claim and run jobs until ``stop`` is set (or the queue
+    is empty, with ``drain``). Stale jobs are swept back to the queue about once
+    per PIPELINE_JOB_STALE_SECONDS, so a dead worker's jobs don't wait for a restart.
+    """
+    swept_at = None
+    while not stop.is_set():
+        close_old_connections()
+        if swept_at is None or time.monotonic() - swept_at >= settings.PIPELINE_JOB_STALE_SECONDS:
+            requeue_stale()
+            swept_at = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if drain:
+                break
+            stop.wait(poll_seconds)
+            continue
+        logger.info(f"{worker} running pipeline job {job.pk}")
+        run_job(job)
+    close_old_connections()
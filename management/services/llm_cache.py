@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = "llm_cache:hits"
+MISSES_KEY = "llm_cache:misses"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace, so re-indented f-string prompts share an entry."""
+    return " ".join(prompt.split())
+
+
+def model_name(client) -> str:
+    return getattr(client, "model_name", None) or getattr(client, "model", None) or type(client).__name__
+
+
+def schema_name(schema) -> str:
+    if hasattr(schema, "model_json_schema"):
+        return json.dumps(schema.model_json_schema(), sort_keys=True)
+    return getattr(schema, "__name__", repr(schema))
+
+
+def cache_key(prompt: str, client, schema) -> str:
+    payload = json.dumps([
+        normalize_prompt(prompt), model_name(client), getattr(client, "temperature", None), schema_name(schema)
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _count(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get(*keys: str) -> Optional[str]:
+    """The cached raw response for the first of ``keys`` present and not expired (counted as one hit or miss)."""
+    now = timezone.now()
+    entries = dict(LLMResponse.objects.filter(key__in=keys, expires_at__gt=now).values_list('key', 'response'))
+    key = next((k for k in keys if k in entries), None)
+    if key is None:
+        _count(MISSES_KEY)
+        return None
+    _count(HITS_KEY)
+    LLMResponse.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=now)
+    return entries[key]
+
+
+def put(key: str, client, response: str):
+    now = timezone.now()
+    LLMResponse.objects.update_or_create(key=key, defaults={
+        'model': model_name(client),
+        'response': response,
+        'last_used_at': now,
+        'expires_at': now + timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS),
+    })
+    evict()
+
+
+def evict() -> int:
+    """Drop expired entries, then the least recently used beyond LLM_CACHE_MAX_ENTRIES."""
+    deleted, _ = LLMResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+    overflow = LLMResponse.objects.count() - settings.LLM_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest = LLMResponse.objects.order_by('last_used_at').values_list('key', flat=True)[:overflow]
+        deleted += LLMResponse.objects.filter(key__in=list(oldest)).delete()[0]
+    return deleted
+
+
+def clear() -> int:
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+    return LLMResponse.objects.all().delete()[0]
+
+
+def stats() -> Dict[str, Any]:
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "entries": LLMResponse.objects.count(),
+        "max_entries": settings.LLM_CACHE_MAX_ENTRIES,
+        "ttl_seconds": settings.LLM_CACHE_TTL_SECONDS,
+    }
@@ -0,0 +1,72 @@
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+from django.core.cache import cache
+
+# Recent successful call latencies kept per model
+LATENCY_WINDOW = 100
+# Percentiles are only trusted once this many samples exist
+MIN_SAMPLES = 20
+
+
+def _latency_key(model: str) -> str:
+    return f"llm:latency:{model}"
+
+
+def record_latency(model: str, seconds: float):
+    """Append to the model's rolling latency window (shared by all workers; a lost sample is harmless)."""
+    key = _latency_key(model)
+    samples = cache.get(key) or []
+    samples.append(round(seconds, 3))
+    cache.set(key, samples[-LATENCY_WINDOW:], None)
+
+
+def _outcome_key(model: str) -> str:
+    return f"llm:outcomes:{model}"
+
+
+def record_outcome(model: str, outcome: str):
+    """Append ``ok``, ``error`` or ``rate_limited`` to the model's rolling outcome window."""
+    key = _outcome_key(model)
+    outcomes = cache.get(key) or []
+    outcomes.append(outcome)
+    cache.set(key, outcomes[-LATENCY_WINDOW:], None)
+
+
+def outcome_rates(model: str) -> Dict[str, Any]:
+    outcomes = cache.get(_outcome_key(model)) or []
+    total = len(outcomes)
+    return {
+        "calls": total,
+        "error_rate": round(sum(o != "ok" for o in outcomes) / total, 4) if total else None,
+        "rate_limited": outcomes.count("rate_limited"),
+    }
+
+
+def latency_percentile(model: str, q: float = 95, default: Optional[float] = None) -> Optional[float]:
+    samples = cache.get(_latency_key(model)) or []
+    if len(samples) < MIN_SAMPLES:
+        return default
+    return float(np.percentile(samples, q))
+
+
+def incr(counter: str):
+    key = f"llm:count:{counter}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def counters(names: Iterable[str]) -> Dict[str, int]:
+    values = cache.get_many([f"llm:count:{name}" for name in names])
+    return {name: values.get(f"llm:count:{name}", 0) for name in names}
+
+
+def hedge_stats(models: Iterable[str]) -> Dict[str, Any]:
+    models = list(models)
+    counts = counters(["hedge:fired"] + [f"hedge:won:{model}" for model in models])
+    return {
+        "fired": counts["hedge:fired"],
+        "wins": {model: counts[f"hedge:won:{model}"] for model in models},
+    }
@@ -0,0 +1,5 @@
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+# Locks and counters every worker contends on (settings.CACHES["locks"]); its add() must be atomic
+lock_cache = ConnectionProxy(caches, "locks")
@@ -0,0 +1,150 @@
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import CanonicalParameter, ParameterAlias
+
+logger = logging.getLogger(__name__)
+
+# Bumped on every change to canonical parameters or aliases, in any process
+VERSION_KEY = "parameters:registry:version"
+
+
+def normalize_parameter_name(name: str) -> str:
+    """'Total Dissolved Solids (TDS)' -> 'total dissolved solids tds', 'PH' -> 'ph'"""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", (name or "").casefold()).split())
+
+
+def _candidates(name: str) -> Iterable[str]:
+    """Full name first, then the text outside and inside any parentheses."""
+    yield normalize_parameter_name(name)
+    outside = re.sub(r"\(.*?\)", " ", name or "")
+    yield normalize_parameter_name(outside)
+    for inside in re.findall(r"\((.*?)\)", name or ""):
+        yield normalize_parameter_name(inside)
+
+
+class ParameterRegistry:
+    """
+    In-memory map of normalized parameter names/symbols/aliases to canonical ids.
+
+    Compiled from the database on first use and rebuilt after any
+    CanonicalParameter or ParameterAlias change (see signals). Changes bump a
+    version in the shared cache, so every worker process rebuilds too (within
+    PARAMETER_REGISTRY_CHECK_SECONDS).
+    """
+
+    def __init__(self):
+        self._ids: Optional[Dict[str, int]] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._names: Dict[int, str] = {}
+        self._units: Dict[int, str] = {}
+        self._weights: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def _load(self):
+        ids, names, units, weights = {}, {}, {}, {}
+        rows = CanonicalParameter.objects.values_list('id', 'name', 'symbol', 'unit', 'health_weight')
+        for pk, name, symbol, unit, weight in rows:
+            names[pk] = name
+            units[pk] = unit
+            weights[pk] = weight
+            for key in (name, symbol):
+                if key:
+                    ids.setdefault(normalize_parameter_name(key), pk)
+        for alias, pk in ParameterAlias.objects.values_list('alias', 'parameter_id'):
+            ids.setdefault(normalize_parameter_name(alias), pk)
+        self._names = names
+        self._units = units
+        self._weights = weights
+        self._ids = ids
+
+    @staticmethod
+    def _shared_version() -> int:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # A fresh, never-reused version so an evicted counter can't pass for the one we loaded
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _map(self) -> Dict[str, int]:
+        now = time.monotonic()
+        if self._ids is not None and now - self._checked_at >= settings.PARAMETER_REGISTRY_CHECK_SECONDS:
+            # Hot paths call in per row: another process's change is picked up within the interval
+            self._checked_at = now
+            if self._version != self._shared_version():
+                self._drop()
+        if self._ids is None:
+            version = self._shared_version()
+            with self._lock:
+                if self._ids is None:
+                    self._load()
+                    self._version = version
+                    self._checked_at = time.monotonic()
+        return self._ids
+
+    def _drop(self):
+        with self._lock:
+            self._ids = None
+        for callback in self._listeners:
+            callback()
+
+    def invalidate(self):
+        """Drop the registry (and caches derived from it) in every process."""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), None)
+        self._drop()
+
+    def on_invalidate(self, callback):
+        """Register a cache derived from the registry to be dropped with it."""
+        self._listeners.append(callback)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Resolve a free-text name to a canonical id, or None if unknown."""
+        ids = self._map()
+        for key in _candidates(name):
+            if key and key in ids:
+                return ids[key]
+        return None
+
+    def intern(self, name: str) -> Optional[int]:
+        """
+        Resolve a name being stored. Unknown names stay unresolved (None) and
+        are logged, rather than invented as canonical parameters: a typo or a
+        new spelling should become an alias, not a parameter of its own.
+        """
+        pk = self.lookup(name)
+        if pk is None and normalize_parameter_name(name):
+            logger.warning(f"No canonical parameter for {name!r}; add it or an alias, then run resolve_parameters")
+        return pk
+
+    def name(self, pk: int) -> Optional[str]:
+        self._map()
+        return self._names.get(pk)
+
+    def unit(self, pk: int) -> Optional[str]:
+        """Canonical unit for a parameter ('' when unitless or unset)."""
+        self._map()
+        return self._units.get(pk)
+
+    def units(self) -> Dict[int, str]:
+        self._map()
+        return self._units
+
+    def weights(self) -> Dict[int, float]:
+        """Health weight per parameter id, scaling its exceedances in severity scores."""
+        self._map()
+        return self._weights
+
+
+registry = ParameterRegistry()
@@ -0,0 +1,145 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from ..models import CustomerRequest, WaterGuideline
+from .checkpoints import CheckpointStore
+from .compliance import CompiledGuideline, compare_report
+from .compliance_results import stored_violations
+from .guideline_cache import get_guideline_snapshot
+from .guideline_store import active_guidelines_for_usage
+
+
+class PipelineInputError(Exception):
+    """A customer request that can't be turned into pipeline input; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400, **extra):
+        super().__init__(message)
+        self.status_code = status_code
+        self.extra = extra
+
+    def as_response_data(self) -> Dict[str, Any]:
+        return {"error": str(self), **self.extra}
+
+
+def annotate_parameters(guideline: Dict[str, Any], water_params: List[Dict[str, Any]]):
+    """Add status and exceedance_ratio (see CompiledGuideline.evaluate) to each registered parameter."""
+    registered = [param for param in water_params if param["parameter_id"] is not None]
+    if not registered:
+        return
+    rows = compare_report(CompiledGuideline.from_snapshot(guideline), registered)["parameters"]
+    for param, row in zip(registered, rows):
+        param["status"] = row["status"]
+        param["exceedance_ratio"] = row["exceedance_ratio"]
+
+
+def build_tool_input(customer_request_id, guideline_id=None, override_usage_check=False,
+                     ai_settings: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Assemble the AI pipeline input for a customer request: its lab values, the
+    guideline limits (the first active guideline for its usage by default) and
+    the stored violations. Raises PipelineInputError.
+    """
+    try:
+        request_id = UUID(str(customer_request_id))
+    except ValueError:
+        raise PipelineInputError("Invalid customer_request_id format")
+
+    # Fetch customer request with optimized query
+    try:
+        request_obj = CustomerRequest.objects.select_related(
+            'customer'
+        ).prefetch_related(
+            'water_lab_reports__parameters',
+            'handlers'
+        ).get(id=request_id)
+    except CustomerRequest.DoesNotExist:
+        raise PipelineInputError("Customer request not found.", 404)
+
+    # Without a guideline, auto-select the first active one for the request's usage
+    if not guideline_id:
+        guideline_ids = active_guidelines_for_usage(request_obj.water_usage)
+        guideline_id = guideline_ids[0] if guideline_ids else None
+
+    # Fetch guideline if provided
+    guideline = None
+    if guideline_id:
+        try:
+            guideline = get_guideline_snapshot(guideline_id)
+        except (WaterGuideline.DoesNotExist, ValueError):
+            raise PipelineInputError("Guideline not found", 404)
+        # Both usages are normalized on write
+        if not override_usage_check and guideline['usage'] != request_obj.water_usage:
+            raise PipelineInputError(
+                f"Guideline usage mismatch ({guideline['usage']} vs {request_obj.water_usage})",
+                solution="Set override_usage_check=True to bypass"
+            )
+
+    # Prepare clean water parameters
+    water_params = [
+        {
+            "name": param.name,
+            "parameter_id": param.parameter_id,
+            "value": param.value,
+            "unit": param.unit
+        }
+        for report in request_obj.water_lab_reports.all()
+        for param in report.parameters.all()
+    ]
+
+    # Mark each value's standing against the guideline, so prompts can leave out the passing ones
+    if guideline:
+        annotate_parameters(guideline, water_params)
+
+    # Prepare guideline parameters if exists
+    guideline_params = None
+    if guideline:
+        guideline_params = {
+            name: {
+                "parameter_id": parameter_id,
+                "unit": unit,
+                "min_value": min_value,
+                "max_value": max_value
+            }
+            for _, name, parameter_id, unit, min_value, max_value in guideline['parameters']
+        }
+
+    tool_input = {
+        "customer_request": {
+            "location": request_obj.site_location.get('name') if isinstance(request_obj.site_location, dict)
+                        else request_obj.site_location.name,
+            "water_source": request_obj.water_source,
+            "water_usage": request_obj.water_usage,
+            "daily_flow_rate": request_obj.daily_flow_rate,
+            # "daily_water_requirement": request_obj.daily_water_requirement,
+            "budget": request_obj.budjet,
+            "water_parameters": water_params,
+            "notes": request_obj.extras.get("notes", "No additional notes provided."),
+        },
+        "guideline": guideline_params,
+        "ai_settings": ai_settings or {}
+    }
+    # Violations are materialized as lab values and limits change; analyse_lab_report reads them as-is
+    violations = guideline and stored_violations(
+        [report.id for report in request_obj.water_lab_reports.all()], guideline['id']
+    )
+    if violations is not None:
+        tool_input["parameter_violations"] = violations
+    return tool_input
+
+
+def run_pipeline(tool_input: Dict[str, Any], on_progress=None, customer_request_id=None, resume=True,
+                 stream=None) -> Dict[str, Any]:
+    """
+    Run the full AI tool graph on a prepared input. With a customer request,
+    each successful tool is checkpointed; with ``resume``, tools whose inputs
+    are unchanged since their checkpoint are restored instead of re-run.
+    """
+    # Imported here: the AI stack builds its LLM clients on import
+    from ..AI.mainai import execute_tool_sequence
+    checkpoints = None
+    if customer_request_id is not None:
+        checkpoints = CheckpointStore(customer_request_id)
+        if not resume:
+            checkpoints.clear()
+    return execute_tool_sequence(initial_data=tool_input, full_sequence=True, on_progress=on_progress,
+                                 checkpoints=checkpoints, stream=stream)
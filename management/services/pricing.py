@@ -0,0 +1,242 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from ..models import CatalogComponent, CatalogItem
+from .ro_sizing import pump_duty
+from .treatment_rules import REVERSE_OSMOSIS, treatment_rules
+
+# Pretreatment step (as worded in info.json / VIOLATION_TRIGGERS) -> catalog component, first match wins
+STEP_COMPONENTS = (
+    ("softener", CatalogComponent.SOFTENER),
+    ("iron removal", CatalogComponent.IRON_FILTER),
+    ("sediment", CatalogComponent.SEDIMENT_FILTER),
+    ("cartridge", CatalogComponent.SEDIMENT_FILTER),
+    ("media filtration", CatalogComponent.MULTIMEDIA_FILTER),
+    ("activated carbon", CatalogComponent.CARBON_FILTER),
+    ("disinfection", CatalogComponent.UV_STERILIZER),
+    ("uv", CatalogComponent.UV_STERILIZER),
+    ("ph ", CatalogComponent.CHEMICAL_DOSING),
+)
+
+
+class Line:
+    """A bill-of-materials line: a component, how many, and the size each must reach."""
+    __slots__ = ("component", "quantity", "rating", "product_model", "label")
+
+    def __init__(self, component: str, quantity: int = 1, rating: Optional[float] = None,
+                 product_model: Optional[str] = None, label: Optional[str] = None):
+        self.component = str(component)
+        self.quantity = quantity
+        self.rating = rating
+        self.product_model = product_model
+        self.label = label or CatalogComponent(component).label
+
+
+def step_component(step: str) -> Optional[str]:
+    key = f"{step.casefold()} "
+    return next((component for keyword, component in STEP_COMPONENTS if keyword in key), None)
+
+
+def bill_of_materials(sizing: Dict[str, Any], steps: List[str]) -> Tuple[List[Line], List[str]]:
+    """
+    BOM lines for a sized RO train (services.ro_sizing.size_ro) and its
+    pretreatment steps; returns (lines, steps with no catalog component).
+    """
+    recommended, pump = sizing["recommended"], sizing["pump"]
+    element_format = recommended["model"].rsplit("-", 1)[-1]
+    lines = [
+        Line(CatalogComponent.MEMBRANE, recommended["elements"], product_model=recommended["model"]),
+        Line(CatalogComponent.PRESSURE_VESSEL, recommended["vessels"], recommended["elements_per_vessel"],
+             product_model=element_format),
+        Line(CatalogComponent.HIGH_PRESSURE_PUMP, 1, pump["power_kw"]),
+        Line(CatalogComponent.PRODUCT_TANK, 1, sizing["tank_capacity_l"]),
+        Line(CatalogComponent.ANTISCALANT_DOSING, 1, pump["flow_m3_h"]),
+        Line(CatalogComponent.CONTROL_PANEL, 1),
+    ]
+    unmapped, seen = [], set()
+    for step in steps:
+        if step == REVERSE_OSMOSIS:
+            continue
+        component = step_component(step)
+        if component is None:
+            unmapped.append(step)
+        elif component not in seen:
+            seen.add(component)
+            # Pretreatment sees the full feed flow
+            lines.append(Line(component, 1, pump["flow_m3_h"], label=step))
+    return lines, unmapped
+
+
+class PriceTable:
+    """Active catalog items as column arrays, for picking every BOM line's item in one pass."""
+
+    def __init__(self, items):
+        rows = list(items)
+        self.nos = [r[0] for r in rows]
+        self.descriptions = [r[1] for r in rows]
+        self.warranties = [r[5] for r in rows]
+        self.components = np.array([r[2] for r in rows], dtype=object)
+        self.models = np.array([(r[3] or "").casefold() for r in rows], dtype=object)
+        self.ratings = np.array([np.nan if r[4] is None else r[4] for r in rows], dtype=np.float64)
+        self.prices = np.array([float(r[6]) for r in rows], dtype=np.float64)
+        self.inventory = np.array([r[7] for r in rows], dtype=np.int64)
+
+    @classmethod
+    def load(cls) -> "PriceTable":
+        return cls(CatalogItem.objects.filter(active=True).exclude(component="").values_list(
+            "no", "description", "component", "product_model", "rating", "warranty", "unit_price", "inventory"
+        ))
+
+    def __len__(self):
+        return len(self.nos)
+
+    def carries(self, component: str, product_model: str) -> bool:
+        return bool(np.any((self.components == str(component)) & (self.models == product_model.casefold())))
+
+    def pick(self, line: Line) -> Tuple[Optional[int], int]:
+        """
+        (catalog row, units) for a line: the smallest item rated for it (cheapest
+        among equals), else as many of the largest as it takes. (None, 0) if the
+        catalog has no such component.
+        """
+        mask = self.components == line.component
+        if line.product_model:
+            mask &= self.models == line.product_model.casefold()
+        candidates = np.flatnonzero(mask)
+        if not candidates.size:
+            return None, 0
+        # Unrated (or zero-rated) items can't be sized against the line
+        rated = candidates[self.ratings[candidates] > 0]
+        if line.rating is None or not rated.size:
+            return int(candidates[np.argmin(self.prices[candidates])]), line.quantity
+        fits = rated[self.ratings[rated] >= line.rating]
+        if fits.size:
+            best = fits[np.lexsort((self.prices[fits], self.ratings[fits]))[0]]
+            return int(best), line.quantity
+        largest = rated[np.argmax(self.ratings[rated])]
+        return int(largest), line.quantity * math.ceil(line.rating / self.ratings[largest])
+
+
+def price(lines: List[Line], table: Optional[PriceTable] = None) -> Dict[str, Any]:
+    """
+    Price BOM lines from the catalog. Line totals, installation
+    (QUOTE_INSTALLATION_RATE of equipment) and VAT (QUOTE_VAT_RATE) are
+    computed over the whole bill at once.
+    """
+    table = table if table is not None else PriceTable.load()
+    rows, units, priced, missing = [], [], [], []
+    for line in lines:
+        row, quantity = table.pick(line)
+        if row is None:
+            missing.append({"component": line.component, "label": line.label})
+        else:
+            rows.append(row)
+            units.append(quantity)
+            priced.append(line)
+
+    rows = np.array(rows, dtype=np.int64)
+    units = np.array(units, dtype=np.int64)
+    unit_prices = table.prices[rows]
+    line_totals = np.round(unit_prices * units, 2)
+    in_stock = table.inventory[rows] >= units
+
+    equipment = round(float(line_totals.sum()), 2)
+    installation = round(equipment * settings.QUOTE_INSTALLATION_RATE, 2)
+    subtotal = round(equipment + installation, 2)
+    vat = round(subtotal * settings.QUOTE_VAT_RATE, 2)
+    return {
+        "currency": settings.QUOTE_CURRENCY,
+        "lines": [
+            {
+                "no": table.nos[row],
+                "description": table.descriptions[row],
+                "component": line.component,
+                "label": line.label,
+                "quantity": int(units[i]),
+                "unit_price": float(unit_prices[i]),
+                "line_total": float(line_totals[i]),
+                "warranty": table.warranties[row],
+                "in_stock": bool(in_stock[i]),
+            }
+            for i, (row, line) in enumerate(zip(rows.tolist(), priced))
+        ],
+        "equipment": equipment,
+        "installation": installation,
+        "subtotal": subtotal,
+        "vat_rate": settings.QUOTE_VAT_RATE,
+        "vat": vat,
+        "total": round(subtotal + vat, 2),
+        "unpriced": missing,
+    }
+
+
+def catalog_option(sizing: Dict[str, Any], table: PriceTable) -> Dict[str, Any]:
+    """
+    The sized option to quote: the recommended one if the catalog carries its
+    membrane, else the best-ranked feasible option whose membrane it does, else
+    the recommended one (its membranes then go unpriced).
+    """
+    recommended = sizing["recommended"]
+    if table.carries(CatalogComponent.MEMBRANE, recommended["model"]):
+        return recommended
+    return next(
+        (option for option in sizing["options"]
+         if option["feasible"] and table.carries(CatalogComponent.MEMBRANE, option["model"])),
+        recommended,
+    )
+
+
+def quote(customer_request: Dict[str, Any], sizing: Dict[str, Any],
+          table: Optional[PriceTable] = None) -> Optional[Dict[str, Any]]:
+    """
+    Quotation for a sized system and the request's pretreatment (the rules
+    recommendation, else the source's knowledge base train). None when the
+    catalog is empty. If the catalog lacks the recommended membrane the
+    quote is for the next feasible option it has, noted in "substitution".
+    """
+    table = table if table is not None else PriceTable.load()
+    if not len(table):
+        return None
+    recommendation = treatment_rules.recommend(customer_request)
+    steps = recommendation.steps if recommendation else treatment_rules.source_steps(
+        customer_request.get("water_source", "")
+    )
+    option, substitution = catalog_option(sizing, table), None
+    if option is not sizing["recommended"]:
+        substitution = {"recommended": sizing["recommended"]["model"], "quoted": option["model"]}
+        sizing = {**sizing, "recommended": option, "pump": pump_duty(option)}
+    lines, unmapped = bill_of_materials(sizing, steps)
+    result = price(lines, table)
+    result["unpriced"] += [{"component": None, "label": step} for step in unmapped]
+    result["substitution"] = substitution
+    return result
+
+
+def markdown(quotation: Dict[str, Any]) -> str:
+    currency = quotation["currency"]
+    lines = [
+        "## Quotation",
+        "| Item | Description | Qty | Unit Price | Total | Warranty |",
+        "|---|---|---:|---:|---:|---|",
+        *(
+            f"| {line['no']} | {line['description'] or line['label']}{'' if line['in_stock'] else ' (on order)'} "
+            f"| {line['quantity']} | {line['unit_price']:,.2f} | {line['line_total']:,.2f} | {line['warranty'] or '-'} |"
+            for line in quotation["lines"]
+        ),
+        "",
+        f"- **Equipment**: {currency} {quotation['equipment']:,.2f}",
+        f"- **Installation**: {currency} {quotation['installation']:,.2f}",
+        f"- **VAT ({quotation['vat_rate']:.0%})**: {currency} {quotation['vat']:,.2f}",
+        f"- **Total**: {currency} {quotation['total']:,.2f}",
+    ]
+    if quotation.get("substitution"):
+        substitution = quotation["substitution"]
+        lines += ["", f"_Quoted with {substitution['quoted']} membranes; the recommended "
+                      f"{substitution['recommended']} is not in the catalog._"]
+    if quotation["unpriced"]:
+        lines += ["", "_Not in the catalog, quoted separately: "
+                  + ", ".join(item["label"] for item in quotation["unpriced"]) + "_"]
+    return "\n".join(lines)
@@ -0,0 +1,221 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+from .parameters import registry
+from .treatment_rules import normalize_source
+from .units import converter
+
+# Spiral-wound elements: (model, type, active area m², rated permeate m³/day at test conditions,
+# test pressure bar, test NaCl mg/L, nominal salt rejection, max feed pressure bar, max feed TDS mg/L, elements per vessel)
+MEMBRANE_MODELS = (
+    ("LE-4040", "low energy brackish", 7.6, 9.8, 10.3, 2000, 0.990, 41.0, 3000, 3),
+    ("BW-4040", "brackish", 7.2, 9.1, 15.5, 2000, 0.995, 41.0, 10000, 3),
+    ("LE-8040", "low energy brackish", 37.0, 44.0, 10.3, 2000, 0.990, 41.0, 3000, 6),
+    ("BW-8040", "brackish", 37.0, 40.0, 15.5, 2000, 0.995, 41.0, 10000, 6),
+    ("SW-4040", "seawater", 7.4, 7.4, 55.2, 32000, 0.994, 82.7, 50000, 3),
+    ("SW-8040", "seawater", 37.0, 28.0, 55.2, 32000, 0.997, 82.7, 50000, 6),
+)
+
+# Design flux (L/m²/h) by water source: the dirtier the feed, the lower the flux
+DESIGN_FLUX = {"borehole": 20.0, "municipal": 20.0, "rain": 20.0, "shallow well": 18.0, "surface": 15.0, "sea": 14.0}
+DEFAULT_FLUX = 17.0
+
+# Target recovery by water source, capped by the feed's salinity (see _recovery)
+DESIGN_RECOVERY = {"borehole": 0.75, "municipal": 0.75, "rain": 0.75, "shallow well": 0.75, "surface": 0.70, "sea": 0.45}
+DEFAULT_RECOVERY = 0.70
+
+# Feed TDS (mg/L) assumed by water source when the lab report has neither TDS nor conductivity
+TYPICAL_FEED_TDS = {"borehole": 1000.0, "shallow well": 500.0, "municipal": 300.0, "surface": 300.0, "rain": 50.0, "sea": 35000.0}
+DEFAULT_FEED_TDS = 1000.0
+DEFAULT_TEMPERATURE = 25.0
+
+OSMOTIC_BAR_PER_MG_L = 0.00077  # NaCl-equivalent osmotic pressure at 25 °C
+CONCENTRATION_POLARIZATION = 1.1
+FOULING_FACTOR = 0.85  # permeability of aged membranes relative to new ones
+PRESSURE_DROP_PER_ELEMENT = 0.2  # bar
+PUMP_EFFICIENCY = 0.75
+
+
+def _catalog(models: Sequence[tuple]) -> Dict[str, np.ndarray]:
+    columns = list(zip(*models))
+    names = ("model", "type", "area", "rated_flow", "test_pressure", "test_tds", "rejection",
+             "max_pressure", "max_feed_tds", "per_vessel")
+    return {name: np.array(column) for name, column in zip(names, columns)}
+
+
+CATALOG = _catalog(MEMBRANE_MODELS)
+
+
+def osmotic_pressure(tds, temperature: float = 25.0):
+    """Osmotic pressure (bar) of a NaCl-equivalent solution, scaled with absolute temperature."""
+    return OSMOTIC_BAR_PER_MG_L * np.asarray(tds, dtype=np.float64) * (temperature + 273.15) / 298.15
+
+
+def temperature_correction(temperature: float) -> float:
+    """Membrane permeability at ``temperature`` relative to 25 °C."""
+    return math.exp(2640 * (1 / 298.15 - 1 / (temperature + 273.15)))
+
+
+def _recovery(source: str, feed_tds: float) -> float:
+    recovery = DESIGN_RECOVERY.get(source, DEFAULT_RECOVERY)
+    # Scaling and osmotic pressure limit recovery as salinity rises
+    if feed_tds > 10000:
+        return min(recovery, 0.45)
+    if feed_tds > 3000:
+        return min(recovery, 0.65)
+    return recovery
+
+
+def _stages(recovery: float) -> int:
+    """Pressure-vessel stages in series; each recovers roughly half of its feed."""
+    return 1 if recovery <= 0.5 else 2 if recovery <= 0.75 else 3
+
+
+def _stage_array(vessels: int, stages: int) -> List[int]:
+    """Split vessels into a tapered array (e.g. 6 -> [4, 2]), halving each stage."""
+    weights = [2 ** (stages - i - 1) for i in range(stages)]
+    counts = [max(1, round(vessels * w / sum(weights))) for w in weights]
+    counts[0] += vessels - sum(counts)
+    return counts
+
+
+def feed_conditions(customer_request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Feed TDS (mg/L) and temperature (°C) from a customer request's lab values:
+    TDS, else conductivity converted to TDS, else the source's typical TDS.
+    """
+    tds, ec, temperature = registry.lookup("TDS"), registry.lookup("EC"), registry.lookup("Temperature")
+    found = {}
+    for param in customer_request.get("water_parameters") or []:
+        parameter_id, value = param.get("parameter_id"), param.get("value")
+        if parameter_id in (tds, ec, temperature) and isinstance(value, (int, float)):
+            found.setdefault(parameter_id, (float(value), param.get("unit") or ""))
+
+    source = normalize_source(customer_request.get("water_source", ""))
+    reading = found.get(tds) or found.get(ec)
+    if reading is not None:
+        value, unit = reading
+        feed_tds, assumed = value * converter.factor(tds, unit, "mg/L"), False
+    else:
+        feed_tds, assumed = TYPICAL_FEED_TDS.get(source, DEFAULT_FEED_TDS), True
+    return {
+        "source": source,
+        "feed_tds_mg_l": feed_tds,
+        "feed_tds_assumed": assumed,
+        "temperature_c": found[temperature][0] if temperature in found else DEFAULT_TEMPERATURE,
+    }
+
+
+def size_options(permeate_m3_day: float, feed_tds: float, temperature: float = DEFAULT_TEMPERATURE,
+                 source: str = "", catalog: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, Any]]:
+    """
+    Size an RO train on every membrane model at once for the required permeate
+    flow. Options come back feasible first (feed pressure and salinity within
+    the element's limits), then by pressure vessel count and pump power.
+    """
+    c = catalog if catalog is not None else CATALOG
+    permeate_l_h = permeate_m3_day * 1000 / 24
+    flux = DESIGN_FLUX.get(source, DEFAULT_FLUX)
+    recovery = _recovery(source, feed_tds)
+    stages = _stages(recovery)
+
+    # Elements at the design flux, rounded up to whole vessels of equal length
+    elements = np.ceil(permeate_l_h / (flux * c["area"]))
+    vessels = np.maximum(np.ceil(elements / c["per_vessel"]), stages)
+    per_vessel = np.ceil(elements / vessels)
+    elements = vessels * per_vessel
+    actual_flux = permeate_l_h / (elements * c["area"])
+
+    # Net driving pressure from each element's water permeability (from its rated test point)
+    rated_flux = c["rated_flow"] * 1000 / 24 / c["area"]
+    permeability = rated_flux / (c["test_pressure"] - osmotic_pressure(c["test_tds"]))
+    tcf = temperature_correction(temperature)
+    net_driving = actual_flux / (permeability * tcf * FOULING_FACTOR)
+
+    # Log-mean feed/concentrate salinity along the train, assuming near-total rejection
+    mean_tds = feed_tds * math.log(1 / (1 - recovery)) / recovery * CONCENTRATION_POLARIZATION
+    pressure_drop = PRESSURE_DROP_PER_ELEMENT * per_vessel * stages
+    feed_pressure = net_driving + osmotic_pressure(mean_tds, temperature) + pressure_drop / 2
+
+    permeate_tds = mean_tds * (1 - c["rejection"]) * tcf * (rated_flux / actual_flux)
+    feed_m3_h = permeate_l_h / 1000 / recovery
+    power_kw = feed_m3_h / 3600 * feed_pressure * 1e5 / PUMP_EFFICIENCY / 1000
+    feasible = (feed_pressure <= c["max_pressure"]) & (feed_tds <= c["max_feed_tds"])
+
+    order = np.lexsort((power_kw, vessels, ~feasible))
+    return [
+        {
+            "model": str(c["model"][i]),
+            "membrane_type": str(c["type"][i]),
+            "feasible": bool(feasible[i]),
+            "elements": int(elements[i]),
+            "vessels": int(vessels[i]),
+            "elements_per_vessel": int(per_vessel[i]),
+            "stages": _stage_array(int(vessels[i]), stages),
+            "recovery": recovery,
+            "flux_lmh": round(float(actual_flux[i]), 1),
+            "feed_pressure_bar": round(float(feed_pressure[i]), 1),
+            "feed_flow_m3_h": round(feed_m3_h, 2),
+            "concentrate_flow_m3_h": round(feed_m3_h - permeate_l_h / 1000, 2),
+            "permeate_tds_mg_l": round(float(permeate_tds[i]), 1),
+            "pump_power_kw": round(float(power_kw[i]), 2),
+            "specific_energy_kwh_m3": round(float(power_kw[i] / (permeate_l_h / 1000)), 2),
+        }
+        for i in order
+    ]
+
+
+def pump_duty(option: Dict[str, Any]) -> Dict[str, Any]:
+    """High-pressure pump duty for a sized option (a size_options entry)."""
+    return {
+        "type": "multistage centrifugal" if option["feed_pressure_bar"] < 30 else "high-pressure positive displacement",
+        "flow_m3_h": option["feed_flow_m3_h"],
+        "head_bar": option["feed_pressure_bar"],
+        "power_kw": option["pump_power_kw"],
+    }
+
+
+def size_ro(customer_request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Deterministic RO sizing for a customer request's daily flow rate (m³/day of
+    permeate) and feed water. Returns None without a positive flow rate.
+    """
+    try:
+        permeate_m3_day = float(customer_request.get("daily_flow_rate") or 0)
+    except (TypeError, ValueError):
+        return None
+    if permeate_m3_day <= 0:
+        return None
+    feed = feed_conditions(customer_request)
+    options = size_options(permeate_m3_day, feed["feed_tds_mg_l"], feed["temperature_c"], feed["source"])
+    recommended = options[0]
+    return {
+        "inputs": {"permeate_m3_day": permeate_m3_day, **feed},
+        "recommended": recommended,
+        "pump": pump_duty(recommended),
+        "tank_capacity_l": math.ceil(permeate_m3_day * 1000 / 24 * settings.RO_TANK_BUFFER_HOURS / 100) * 100,
+        "options": options,
+    }
+
+
+def markdown(sizing: Dict[str, Any]) -> str:
+    recommended, pump, feed = sizing["recommended"], sizing["pump"], sizing["inputs"]
+    lines = [
+        "## RO Sizing",
+        f"- **Membranes Required**: {recommended['elements']} x {recommended['model']} "
+        f"({recommended['vessels']} vessels of {recommended['elements_per_vessel']}, "
+        f"array {':'.join(map(str, recommended['stages']))})",
+        f"- **Recovery**: {recommended['recovery']:.0%} at {recommended['flux_lmh']} LMH",
+        f"- **Feed Pressure**: {recommended['feed_pressure_bar']} bar",
+        f"- **Tank Capacity**: {sizing['tank_capacity_l']} Liters",
+        f"- **Pump Specs**: Type: {pump['type']}, Duty: {pump['flow_m3_h']} m³/h at {pump['head_bar']} bar, "
+        f"Power: {pump['power_kw']} kW",
+        f"- **Expected Permeate TDS**: {recommended['permeate_tds_mg_l']} mg/L",
+        "",
+        f"_Sized for {feed['permeate_m3_day']:g} m³/day from {feed['feed_tds_mg_l']:.0f} mg/L TDS"
+        f"{' (typical for the source, not measured)' if feed['feed_tds_assumed'] else ''} at {feed['temperature_c']:g} °C._",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,80 @@
+import json
+import logging
+import queue
+import threading
+from typing import Any, Dict, Iterator
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Idle seconds between keep-alive comments, so proxies don't drop a quiet stream
+KEEPALIVE_SECONDS = 15
+_DONE = object()
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class PipelineStream:
+    """
+    Collects a pipeline run's events on a queue for one SSE response:
+    tool_start, token (markdown tools only), tool_end, then done or error.
+    Tools run on worker threads; the response generator drains the queue.
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def tool_started(self, tool: str):
+        self.events.put(("tool_start", {"tool": tool}))
+
+    def token(self, tool: str, text: str):
+        self.events.put(("token", {"tool": tool, "text": text}))
+
+    def tool_finished(self, entry: Dict[str, Any]):
+        self.events.put(("tool_end", {k: v for k, v in entry.items() if k != 'context_snapshot'}))
+
+    def close(self, event: str, data: Any):
+        self.events.put((event, data))
+        self.events.put(_DONE)
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                item = self.events.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if item is _DONE:
+                return
+            yield sse(*item)
+
+
+def stream_pipeline(tool_input: Dict[str, Any], customer_request_id=None, resume=True) -> Iterator[str]:
+    """
+    Run the AI pipeline on a background thread and yield its events as SSE.
+    A client that disconnects stops the stream, not the run: finished tools
+    are still checkpointed, so a later run resumes from them.
+    """
+    from .pipeline import run_pipeline
+    stream = PipelineStream()
+
+    def run():
+        try:
+            result = run_pipeline(tool_input, on_progress=stream.tool_finished,
+                                  customer_request_id=customer_request_id, resume=resume, stream=stream)
+            stream.close("done", {
+                "success": result.get("success"),
+                "final_output": result.get("final_output"),
+                "errors": result.get("errors", []),
+            })
+        except Exception as e:
+            logger.exception("Streaming pipeline run crashed")
+            stream.close("error", {"error": str(e)})
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, name="pipeline-stream", daemon=True).start()
+    return iter(stream)
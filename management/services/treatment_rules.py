@@ -0,0 +1,160 @@
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .compliance import ABOVE_MAX, BELOW_MIN
+from .parameters import registry
+
+KNOWLEDGE_BASE = Path(__file__).resolve().parent.parent / "info.json"
+
+REVERSE_OSMOSIS = "Reverse Osmosis"
+DISINFECTION = "Disinfection (UV or Chlorination)"
+IRON_REMOVAL = "Iron removal (DMI Filter / Oxidation + Filtration)"
+
+# Treatment step for a canonical parameter outside its limit, per direction.
+# A violation without an entry here is not a textbook case and goes to the LLM.
+VIOLATION_TRIGGERS = {
+    "Iron": {ABOVE_MAX: IRON_REMOVAL},
+    "Manganese": {ABOVE_MAX: IRON_REMOVAL},
+    "Hardness": {ABOVE_MAX: "Softener"},
+    "Calcium": {ABOVE_MAX: "Softener"},
+    "Magnesium": {ABOVE_MAX: "Softener"},
+    "Turbidity": {ABOVE_MAX: "Sediment Filtration"},
+    "Total Suspended Solids": {ABOVE_MAX: "Sediment Filtration"},
+    "Colour": {ABOVE_MAX: "Activated Carbon"},
+    "Chlorine": {ABOVE_MAX: "Activated Carbon"},
+    "pH": {BELOW_MIN: "pH adjustment (Soda Ash)", ABOVE_MAX: "pH correction (acid dosing)"},
+    "E. coli": {ABOVE_MAX: DISINFECTION},
+    "Total Coliforms": {ABOVE_MAX: DISINFECTION},
+    **{name: {ABOVE_MAX: REVERSE_OSMOSIS} for name in (
+        "Total Dissolved Solids", "Electrical Conductivity", "Salinity", "Chloride", "Sodium", "Sulphate",
+        "Nitrate", "Nitrite", "Fluoride", "Lead", "Arsenic",
+    )},
+}
+
+# Free-text water sources that mean a knowledge base source
+SOURCE_ALIASES = {
+    "borehole": "borehole", "deep well": "borehole",
+    "shallow well": "shallow well", "well": "shallow well",
+    "municipal": "municipal", "city": "municipal", "tap": "municipal", "mains": "municipal",
+    "surface": "surface", "river": "surface", "lake": "surface", "dam": "surface",
+    "rain": "rain", "rainwater": "rain",
+    "sea": "sea", "seawater": "sea",
+}
+
+
+def normalize_source(source: str) -> str:
+    """'Borehole Water' -> 'borehole', 'Tap water' -> 'municipal'"""
+    key = " ".join(re.sub(r"[^a-z ]+", " ", (source or "").casefold()).replace("water", " ").split())
+    return SOURCE_ALIASES.get(key, key)
+
+
+@dataclass
+class Recommendation:
+    source: str
+    steps: List[str]
+    triggers: List[Dict[str, Any]] = field(default_factory=list)
+    notes: str = ""
+    ro_type: str = "BWRO (brackish water membranes)"
+    daily_flow_rate: Any = None
+
+    def markdown(self) -> str:
+        lines = [
+            "## RO System",
+            f"- **Type**: {self.ro_type}",
+            f"- **Capacity**: {self.daily_flow_rate} (requested daily flow rate)",
+            "- **Components**: high-pressure pump, membrane housings, antiscalant dosing, product and reject lines",
+            "",
+            "## Pretreatment",
+            *(f"- {step}" for step in self.steps if step != REVERSE_OSMOSIS),
+        ]
+        if self.triggers:
+            lines += ["", "## Triggered By"]
+            lines += [f"- {t['parameter']} {t['value']} {t['unit']}: {t['status'].replace('_', ' ')} → {t['step']}"
+                      for t in self.triggers]
+        if self.notes:
+            lines += ["", f"_Note: {self.notes}_"]
+        return "\n".join(lines)
+
+
+class TreatmentRules:
+    """
+    info.json sources and VIOLATION_TRIGGERS compiled into lookup tables keyed
+    by normalized source and (canonical parameter id, violation direction).
+
+    recommend() answers textbook cases (a known source, every violation
+    covered by a trigger) without an LLM; anything else returns None. The
+    table is dropped together with the parameter registry.
+    """
+
+    def __init__(self, path: Path = KNOWLEDGE_BASE):
+        self.path = path
+        self._sources: Optional[Dict[str, Dict[str, Any]]] = None
+        self._triggers: Dict[Tuple[int, str], str] = {}
+        self._lock = threading.Lock()
+        registry.on_invalidate(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._sources = None
+
+    def _compile(self):
+        with open(self.path, encoding="utf-8") as f:
+            entries = json.load(f)
+        triggers = {}
+        for name, steps in VIOLATION_TRIGGERS.items():
+            parameter_id = registry.lookup(name)
+            if parameter_id is not None:
+                for status, step in steps.items():
+                    triggers[(parameter_id, status)] = step
+        self._triggers = triggers
+        self._sources = {normalize_source(entry["source"]): entry for entry in entries}
+
+    def _tables(self):
+        if self._sources is None:
+            with self._lock:
+                if self._sources is None:
+                    self._compile()
+        return self._sources, self._triggers
+
+    def source_steps(self, water_source: str) -> List[str]:
+        """The knowledge base's treatment train for a water source; empty for unknown sources."""
+        entry = self._tables()[0].get(normalize_source(water_source))
+        return list(entry["recommended_treatment"]) if entry else []
+
+    def recommend(self, customer_request: Dict[str, Any]) -> Optional[Recommendation]:
+        sources, triggers = self._tables()
+        entry = sources.get(normalize_source(customer_request.get("water_source", "")))
+        parameters = customer_request.get("water_parameters") or []
+        # No statuses means no guideline to judge the values by; unregistered parameters carry none either
+        if entry is None or (parameters and not any("status" in p for p in parameters)):
+            return None
+
+        steps = list(entry["recommended_treatment"])
+        fired = []
+        for param in parameters:
+            if param.get("status") not in (ABOVE_MAX, BELOW_MIN):
+                continue
+            step = triggers.get((param.get("parameter_id"), param["status"]))
+            if step is None:
+                return None
+            fired.append({"parameter": param["name"], "value": param["value"], "unit": param.get("unit", ""),
+                          "status": param["status"], "step": step})
+            if not any(step.split(" (")[0].casefold() in s.casefold() for s in steps):
+                steps.append(step)
+
+        sea = normalize_source(entry["source"]) == "sea"
+        return Recommendation(
+            source=entry["source"],
+            steps=steps,
+            triggers=fired,
+            notes=entry.get("notes", ""),
+            ro_type="SWRO (seawater membranes)" if sea else "BWRO (brackish water membranes)",
+            daily_flow_rate=customer_request.get("daily_flow_rate"),
+        )
+
+
+treatment_rules = TreatmentRules()
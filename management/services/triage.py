@@ -0,0 +1,111 @@
+import logging
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from ..models import CustomerRequest, WaterGuidelineParameter, WaterLabParameter, WaterLabReport
+from .compliance import _pad, lab_value_matrix, limit_matrices
+from .guideline_store import active_guidelines_for_usage, guideline_store
+from .parameters import registry
+
+logger = logging.getLogger(__name__)
+
+# Cap on one parameter's excess, so a zero limit (e.g. E. coli) can't make a score infinite
+MAX_EXCESS = 100.0
+BATCH_SIZE = 1000
+
+
+def severity_scores(values: np.ndarray, lo: np.ndarray, hi: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Row-wise weighted sum of how far values exceed their limits, for aligned
+    (rows, params) values and limits: a value at twice its maximum adds 1 x weight,
+    a value within limits (or unregulated, NaN) adds nothing.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.fmax(values / hi, lo / values)
+    excess = np.clip(np.nan_to_num(ratio - 1.0, nan=0.0, posinf=MAX_EXCESS), 0.0, MAX_EXCESS)
+    return excess @ weights
+
+
+def _weights(n_params: int) -> np.ndarray:
+    weights = np.ones(n_params)
+    for pk, weight in registry.weights().items():
+        if pk < n_params:
+            weights[pk] = weight
+    return weights
+
+
+def _limits(guideline_ids, n_params):
+    """Limit rows for the given guidelines, from the compiled set when it has them all."""
+    store = guideline_store.current()
+    if store is not None and all(g in store for g in guideline_ids):
+        rows = store.rows(guideline_ids)
+        return store.min_values[rows], store.max_values[rows]
+    rows = WaterGuidelineParameter.objects.filter(guideline_id__in=guideline_ids).values_list(
+        'guideline_id', 'parameter_id', 'unit', 'min_value', 'max_value'
+    )
+    _, lo, hi = limit_matrices(rows, guideline_ids, n_params)
+    return lo, hi
+
+
+def score_requests(request_ids: Sequence) -> Dict[str, float]:
+    """
+    Severity of each customer request: the score of its worst lab report against
+    the first active guideline for its water usage. Every report of the batch is
+    scored in one vectorized pass.
+    """
+    scores = {str(pk): 0.0 for pk in request_ids}
+    reports = list(WaterLabReport.objects.filter(customer_request_id__in=request_ids).values_list(
+        'id', 'customer_request_id', 'customer_request__water_usage'
+    ))
+    guideline_for_usage = {}
+    for _, _, usage in reports:
+        if usage not in guideline_for_usage:
+            guideline_ids = active_guidelines_for_usage(usage)
+            guideline_for_usage[usage] = guideline_ids[0] if guideline_ids else None
+    guideline_ids = sorted({g for g in guideline_for_usage.values() if g is not None})
+    if not guideline_ids:
+        return scores
+
+    lab_rows = WaterLabParameter.objects.filter(lab_report_id__in=[r[0] for r in reports]).values_list(
+        'lab_report_id', 'parameter_id', 'unit', 'value'
+    )
+    _, values = lab_value_matrix(lab_rows, [r[0] for r in reports])
+    lo, hi = _limits(guideline_ids, values.shape[1])
+    n_params = max(values.shape[1], lo.shape[1])
+    values, lo, hi = _pad(values, n_params), _pad(lo, n_params), _pad(hi, n_params)
+
+    # Align one limit row to each report; reports without a guideline get NaN limits
+    guideline_index = {g: i for i, g in enumerate(guideline_ids)}
+    rows = np.array([guideline_index.get(guideline_for_usage[usage], -1) for _, _, usage in reports])
+    covered = rows >= 0
+    report_lo = np.where(covered[:, None], lo[np.where(covered, rows, 0)], np.nan)
+    report_hi = np.where(covered[:, None], hi[np.where(covered, rows, 0)], np.nan)
+    report_scores = severity_scores(values, report_lo, report_hi, _weights(n_params))
+
+    request_index = {pk: i for i, pk in enumerate(scores)}
+    worst = np.zeros(len(request_index))
+    np.maximum.at(worst, [request_index[str(r[1])] for r in reports], report_scores)
+    return dict(zip(scores, worst.round(4).tolist()))
+
+
+def refresh_severity(request_ids: Optional[Sequence] = None) -> int:
+    """
+    Recompute and store severity scores for the given customer requests (all
+    when None). Only changed scores are written. Returns the number updated.
+    """
+    if request_ids is None:
+        request_ids = CustomerRequest.objects.values_list('id', flat=True)
+    request_ids = list(request_ids)
+    updated = 0
+    for start in range(0, len(request_ids), BATCH_SIZE):
+        batch = request_ids[start:start + BATCH_SIZE]
+        scores = score_requests(batch)
+        changed = []
+        for pk, current in CustomerRequest.objects.filter(id__in=batch).values_list('id', 'severity_score'):
+            if scores[str(pk)] != current:
+                changed.append(CustomerRequest(id=pk, severity_score=scores[str(pk)]))
+        CustomerRequest.objects.bulk_update(changed, ['severity_score'])
+        updated += len(changed)
+    logger.debug(f"Updated severity of {updated} customer requests")
+    return updated
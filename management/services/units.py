@@ -0,0 +1,138 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .parameters import registry
+
+# Unit families: unit code -> factor to the family's base unit
+CONCENTRATION = {"mg/l": 1.0, "ppm": 1.0, "ug/l": 1e-3, "ppb": 1e-3, "ng/l": 1e-6, "g/l": 1e3, "ppt": 1e3}
+CONDUCTIVITY = {"us/cm": 1.0, "ms/cm": 1e3, "ms/m": 10.0, "s/m": 1e4}
+UNIT_FAMILIES = (CONCENTRATION, CONDUCTIVITY)
+
+# Typical TDS (mg/L) per µS/cm of electrical conductivity for natural waters (0.55 - 0.7)
+EC_TO_TDS_FACTOR = 0.64
+
+_ALIASES = {
+    "mg/litre": "mg/l", "mg/liter": "mg/l", "mgl": "mg/l", "mg l": "mg/l",
+    "ug/litre": "ug/l", "ug/liter": "ug/l", "mcg/l": "ug/l",
+    "us/cm at 25c": "us/cm", "umho/cm": "us/cm", "umhos/cm": "us/cm", "mmho/cm": "ms/cm",
+    "parts per million": "ppm", "parts per billion": "ppb", "g/litre": "g/l",
+}
+
+
+@lru_cache(maxsize=512)
+def normalize_unit(unit: Optional[str]) -> str:
+    """'µS/cm', 'μS/cm', 'uS/CM' -> 'us/cm'; 'mg/L' -> 'mg/l'"""
+    code = (unit or "").strip().casefold().replace("µ", "u").replace("μ", "u")
+    code = re.sub(r"\s*/\s*", "/", code)
+    code = re.sub(r"\s+", " ", code)
+    return _ALIASES.get(code, code)
+
+
+def _family_factor(from_code: str, to_code: str) -> Optional[float]:
+    for family in UNIT_FAMILIES:
+        if from_code in family and to_code in family:
+            return family[from_code] / family[to_code]
+    return None
+
+
+class UnitConverter:
+    """
+    Precomputed conversion factors keyed by (parameter id, from-unit, to-unit).
+
+    The table is compiled from the parameter registry's canonical units and is
+    dropped together with the registry. Conversions are applied as a single
+    vectorized multiply over whole batches of values.
+    """
+
+    def __init__(self):
+        self._table: Optional[Dict[Tuple[int, str, str], float]] = None
+        self._canonical: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        registry.on_invalidate(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+
+    def _compile(self):
+        table, canonical = {}, {}
+        tds = registry.lookup("TDS")
+        ec = registry.lookup("EC")
+        for pk, unit in registry.units().items():
+            to_code = normalize_unit(unit)
+            canonical[pk] = to_code
+            for family in UNIT_FAMILIES:
+                if to_code in family:
+                    for from_code in family:
+                        table[(pk, from_code, to_code)] = family[from_code] / family[to_code]
+            # Conductivity reported where TDS is expected (and vice versa)
+            if pk == tds and to_code in CONCENTRATION:
+                for from_code, factor in CONDUCTIVITY.items():
+                    table[(pk, from_code, to_code)] = factor * EC_TO_TDS_FACTOR / CONCENTRATION[to_code]
+            if pk == ec and to_code in CONDUCTIVITY:
+                for from_code, factor in CONCENTRATION.items():
+                    table[(pk, from_code, to_code)] = factor / EC_TO_TDS_FACTOR / CONDUCTIVITY[to_code]
+        self._canonical = canonical
+        self._table = table
+
+    def _ensure(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._compile()
+        return self._table
+
+    def factor(self, parameter_id: Optional[int], from_unit: str, to_unit: Optional[str] = None) -> float:
+        """
+        Factor that converts a value of ``parameter_id`` from ``from_unit`` to
+        ``to_unit`` (the canonical unit by default). Unknown or incompatible
+        units convert as-is (factor 1.0).
+        """
+        table = self._ensure()
+        from_code = normalize_unit(from_unit)
+        if to_unit is not None:
+            to_code = normalize_unit(to_unit)
+        else:
+            to_code = self._canonical.get(parameter_id) or self._family_base(from_code)
+        if from_code == to_code:
+            return 1.0
+        factor = table.get((parameter_id, from_code, to_code))
+        if factor is None:
+            factor = _family_factor(from_code, to_code)
+        return 1.0 if factor is None else factor
+
+    @staticmethod
+    def _family_base(code: str) -> str:
+        """Parameters without a canonical unit fall back to their unit family's base."""
+        for family in UNIT_FAMILIES:
+            if code in family:
+                return next(iter(family))
+        return code
+
+    def factors(self, parameter_ids: Sequence[Optional[int]], units: Sequence[str]) -> np.ndarray:
+        """Vector of factors converting each (parameter, unit) pair to its canonical unit."""
+        # Batches repeat a handful of (parameter, unit) pairs; resolve each pair once
+        seen = {}
+        return np.fromiter(
+            (seen[key] if key in seen else seen.setdefault(key, self.factor(*key)) for key in zip(parameter_ids, units)),
+            dtype=np.float64, count=len(parameter_ids)
+        )
+
+    def to_canonical(self, parameter_ids: Sequence[Optional[int]], units: Sequence[str], values) -> np.ndarray:
+        """Scale a batch of values into each parameter's canonical unit."""
+        return np.asarray(values, dtype=np.float64) * self.factors(parameter_ids, units)
+
+    def canonical_unit(self, parameter_id: Optional[int]) -> Optional[str]:
+        return registry.unit(parameter_id)
+
+    def canonical_units(self, parameter_ids: Sequence[Optional[int]]) -> List[Optional[str]]:
+        """Canonical unit per parameter, from a single registry read."""
+        units = registry.units()
+        return [units.get(pk) for pk in parameter_ids]
+
+
+converter = UnitConverter()
@@ -0,0 +1,181 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    CanonicalParameter, CustomerRequest, ParameterAlias, WaterGuideline, WaterGuidelineParameter, WaterLabParameter,
+    WaterLabReport, normalize_usage,
+)
+from .services.parameters import registry
+from .services.guideline_cache import bump_guideline_version
+from .services.guideline_store import bump_store_epoch
+from .services import compliance_results, triage
+
+
+# Parameter registry -----------------------------------------------------------
+
+@receiver(pre_save, sender=WaterLabParameter)
+@receiver(pre_save, sender=WaterGuidelineParameter)
+def resolve_canonical_parameter(sender, instance, **kwargs):
+    """
+    Resolves the free-text parameter name to its canonical id once on write,
+    so comparisons can match on integers.
+    """
+    instance.parameter_id = registry.intern(instance.name)
+
+
+@receiver(post_save, sender=CanonicalParameter)
+@receiver(post_delete, sender=CanonicalParameter)
+@receiver(post_save, sender=ParameterAlias)
+@receiver(post_delete, sender=ParameterAlias)
+def invalidate_parameter_registry(sender, **kwargs):
+    registry.invalidate()
+
+
+# Usage normalization ----------------------------------------------------------
+
+@receiver(pre_save, sender=WaterGuideline)
+def normalize_guideline_usage(sender, instance, **kwargs):
+    """Stores usage in canonical form so lookups are exact and can use the (usage, status) index."""
+    instance.usage = normalize_usage(instance.usage)
+
+
+@receiver(pre_save, sender=CustomerRequest)
+def normalize_request_usage(sender, instance, **kwargs):
+    instance.water_usage = normalize_usage(instance.water_usage)
+
+
+# Guideline cache --------------------------------------------------------------
+
+def _bump_guideline(guideline_id):
+    # Bump now for this transaction, and again on commit so no worker keeps a
+    # snapshot it read before the change became visible
+    bump_guideline_version(guideline_id)
+    bump_store_epoch()
+    transaction.on_commit(lambda: (bump_guideline_version(guideline_id), bump_store_epoch()))
+
+
+@receiver(post_save, sender=WaterGuideline)
+@receiver(post_delete, sender=WaterGuideline)
+def invalidate_guideline_cache(sender, instance, **kwargs):
+    _bump_guideline(instance.pk)
+
+
+@receiver(post_save, sender=WaterGuidelineParameter)
+@receiver(post_delete, sender=WaterGuidelineParameter)
+def invalidate_guideline_parameter_cache(sender, instance, **kwargs):
+    _bump_guideline(instance.guideline_id)
+
+
+# Compliance results -----------------------------------------------------------
+# Recomputed after commit, so they are built from what other workers will read
+
+# Reports whose lab values changed in this thread's open transaction
+_pending = threading.local()
+
+
+def _flush_report_compliance():
+    # The first callback after a commit refreshes every pending report; the rest find nothing left.
+    # Ids left over from a rolled-back transaction ride along with the next commit (a harmless extra refresh)
+    report_ids = getattr(_pending, 'report_ids', None)
+    if report_ids:
+        _pending.report_ids = set()
+        compliance_results.refresh_reports(list(report_ids))
+
+
+@receiver(post_save, sender=WaterLabParameter)
+@receiver(post_delete, sender=WaterLabParameter)
+def refresh_report_compliance(sender, instance, **kwargs):
+    # A report saved with N values is recomputed once, not N times
+    if getattr(_pending, 'report_ids', None) is None:
+        _pending.report_ids = set()
+    _pending.report_ids.add(instance.lab_report_id)
+    transaction.on_commit(_flush_report_compliance)
+
+
+# Fields whose change alters compliance results; other edits (e.g. a description) leave them as they are
+GUIDELINE_PARAMETER_LIMIT_FIELDS = ('guideline_id', 'parameter_id', 'unit', 'min_value', 'max_value')
+GUIDELINE_SCOPE_FIELDS = ('usage', 'status')
+
+
+def _snapshot(sender, instance, fields):
+    """The stored values of ``fields`` for an instance about to be saved (None when it is new)."""
+    if instance._state.adding:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=WaterGuidelineParameter)
+def remember_guideline_parameter(sender, instance, **kwargs):
+    # A renamed limit stops applying to reports of the parameter it used to name
+    instance._previous_limits = _snapshot(sender, instance, GUIDELINE_PARAMETER_LIMIT_FIELDS)
+
+
+@receiver(post_save, sender=WaterGuidelineParameter)
+@receiver(post_delete, sender=WaterGuidelineParameter)
+def refresh_guideline_parameter_compliance(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_limits', None)
+    if kwargs.get('signal') is post_save and previous == tuple(
+        getattr(instance, field) for field in GUIDELINE_PARAMETER_LIMIT_FIELDS
+    ):
+        return
+    parameter_ids = {instance.parameter_id, previous[1] if previous else None}
+    guideline_ids = {instance.guideline_id, previous[0] if previous else None} - {None}
+    transaction.on_commit(lambda: [
+        compliance_results.refresh_guideline(guideline_id, parameter_ids) for guideline_id in guideline_ids
+    ])
+
+
+@receiver(pre_save, sender=WaterGuideline)
+def remember_guideline_scope(sender, instance, **kwargs):
+    instance._previous_scope = _snapshot(sender, instance, GUIDELINE_SCOPE_FIELDS)
+
+
+@receiver(post_save, sender=WaterGuideline)
+def refresh_guideline_compliance(sender, instance, created, **kwargs):
+    # Status or usage decide which reports the guideline applies to
+    if not created and instance._previous_scope == (instance.usage, instance.status):
+        return
+    guideline_id = instance.pk
+    transaction.on_commit(lambda: compliance_results.refresh_guideline(guideline_id))
+    previous_usage = instance._previous_scope[0] if instance._previous_scope else None
+    if previous_usage not in (None, instance.usage):
+        # Requests of the usage it left may now be scored against another guideline
+        _refresh_usage_severity(previous_usage)
+
+
+@receiver(post_delete, sender=WaterGuideline)
+def refresh_deleted_guideline_severity(sender, instance, **kwargs):
+    # Its results went with it (cascade); requests of its usage are rescored without them
+    _refresh_usage_severity(instance.usage)
+
+
+def _refresh_usage_severity(usage):
+    transaction.on_commit(lambda: triage.refresh_severity(
+        CustomerRequest.objects.filter(water_usage=usage).values_list('id', flat=True)
+    ))
+
+
+@receiver(pre_save, sender=CustomerRequest)
+def remember_request_usage(sender, instance, **kwargs):
+    instance._previous_water_usage = (
+        sender.objects.filter(pk=instance.pk).values_list('water_usage', flat=True).first()
+        if not instance._state.adding else None
+    )
+
+
+@receiver(post_save, sender=CustomerRequest)
+def refresh_request_compliance(sender, instance, created, **kwargs):
+    if created or instance._previous_water_usage == instance.water_usage:
+        return
+    report_ids = list(instance.water_lab_reports.values_list('id', flat=True))
+    transaction.on_commit(lambda: compliance_results.refresh_reports(report_ids))
+
+
+@receiver(post_delete, sender=WaterLabReport)
+def refresh_request_severity(sender, instance, **kwargs):
+    # Its results went with it (cascade); the request's worst report may have changed
+    request_id = instance.customer_request_id
+    transaction.on_commit(lambda: triage.refresh_severity([request_id]))
@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from langchain_core.messages import AIMessageChunk
+from pydantic import BaseModel
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from .models import *
+from .services.compliance import CompiledGuideline, ABOVE_MAX, BELOW_MIN, WITHIN, NOT_REGULATED
+from .services.parameters import VERSION_KEY, registry
+from .services.units import converter, normalize_unit
+from .services.guideline_cache import get_compiled_guideline, get_composite_guideline, get_guideline_snapshot
+from .services.guideline_store import guideline_store, StoredGuideline, active_guidelines_for_usage
+from .services import compliance_results
+from .services.compliance_results import refresh_reports
+from .services.triage import score_requests, severity_scores
+from .services.jobs import claim, requeue_stale, run_job, start, work
+from .services import llm_cache, llm_stats
+from .services.checkpoints import CheckpointStore
+from .services.streaming import PipelineStream
+from .services.batch import enqueue_requests, run_batch
+from .services.pipeline import build_tool_input
+from .services.treatment_rules import normalize_source, treatment_rules
+from .services import pricing, ro_sizing
+from .services.locks import lock_cache
+from .AI import mainai, tools as ai_tools
+from .AI.router import ProviderRouter
+from .AI import prompts, providers, structured
+from .AI.ratelimit import RateLimitExceeded, TokenBucketLimiter
+from .checks import check_lock_cache
+from .AI.tools import analyse_lab_report
+
+
+def create_customer_request(**kwargs):
+    user = get_user_model().objects.create_user(
+        email=kwargs.pop('email', 'customer@example.com'),
+        username=kwargs.pop('username', 'customer'),
+        password='testpass123',
+    )
+    defaults = {
+        'customer': user,
+        'water_source': 'Borehole Water',
+        'daily_water_requirement': 10000,
+        'daily_flow_rate': 10,
+        'water_usage': 'drinking',
+        'status': 'pending',
+    }
+    defaults.update(kwargs)
+    return CustomerRequest.objects.create(**defaults)
+
+
+def create_guideline(params, **kwargs):
+    defaults = {'body': 'WHO', 'usage': 'drinking', 'status': 'active'}
+    defaults.update(kwargs)
+    guideline = WaterGuideline.objects.create(**defaults)
+    for name, unit, min_value, max_value in params:
+        WaterGuidelineParameter.objects.create(
+            guideline=guideline, name=name, unit=unit, min_value=min_value, max_value=max_value
+        )
+    return guideline
+
+
+def create_lab_report(customer_request, params):
+    report = WaterLabReport.objects.create(
+        customer_request=customer_request, report_source='Internal', test_type='General'
+    )
+    for name, unit, value in params:
+        WaterLabParameter.objects.create(lab_report=report, name=name, unit=unit, value=value)
+    return report
+
+
+class ManagementTestCase(TestCase):
+    """Test DB rows roll back between tests, so the in-memory registry and shared caches must too."""
+    def setUp(self):
+        cache.clear()
+        lock_cache.clear()
+        registry.invalidate()
+
+
+class ManagementTransactionTestCase(TransactionTestCase):
+    """For tests whose database work happens on other threads; restores the migration-seeded rows after each flush."""
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        lock_cache.clear()
+        registry.invalidate()
+
+
+class ParameterRegistryTest(ManagementTestCase):
+    def test_aliases_resolve_to_one_id(self):
+        tds = registry.lookup('TDS')
+        self.assertIsNotNone(tds)
+        self.assertEqual(registry.lookup('Total Dissolved Solids (TDS)'), tds)
+        self.assertEqual(registry.lookup('total dissolved solids'), tds)
+        self.assertEqual(registry.lookup('PH'), registry.lookup('pH'))
+        self.assertEqual(registry.lookup('Iron (Fe)'), registry.lookup('Iron'))
+        self.assertIsNone(registry.lookup('Unobtainium'))
+
+    def test_names_resolved_on_write(self):
+        guideline = create_guideline([('Total Dissolved Solids (TDS)', 'mg/L', None, 1000), ('Unobtainium', 'mg/L', None, 1)])
+        names = dict(guideline.parameters.values_list('name', 'parameter_id'))
+        self.assertEqual(names['Total Dissolved Solids (TDS)'], registry.lookup('TDS'))
+        # Unknown names are left unresolved, not invented as canonical parameters
+        self.assertIsNone(names['Unobtainium'])
+        self.assertFalse(CanonicalParameter.objects.filter(name='Unobtainium').exists())
+        out = StringIO()
+        call_command('resolve_parameters', stdout=out)
+        self.assertIn("Unobtainium", out.getvalue())
+
+    def test_resolving_new_parameters_refreshes_cached_guidelines(self):
+        guideline = create_guideline([('Boron', 'mg/L', None, 2.4)])
+        report = create_lab_report(create_customer_request(), [('Boron', 'mg/L', 5.0)])
+        self.assertIsNone(get_guideline_snapshot(guideline.id)['parameters'][0][2])
+
+        boron = CanonicalParameter.objects.create(name='Boron', unit='mg/L')
+        call_command('resolve_parameters', stdout=StringIO())
+        self.assertEqual(get_guideline_snapshot(guideline.id)['parameters'][0][2], boron.id)
+        self.assertEqual(get_compiled_guideline(guideline.id).evaluate([boron.id], [5.0])['status'][0], ABOVE_MAX)
+        self.assertFalse(ComplianceResult.objects.get(lab_report=report, guideline=guideline).passed)
+
+    @override_settings(PARAMETER_REGISTRY_CHECK_SECONDS=0)
+    def test_invalidation_reaches_other_processes(self):
+        tds = registry.lookup('TDS')
+        # Another worker adds an alias: only the shared version tells this one
+        ParameterAlias.objects.bulk_create([ParameterAlias(alias='Brackishness', parameter_id=tds)])
+        self.assertIsNone(registry.lookup('Brackishness'))
+        cache.incr(VERSION_KEY)
+        self.assertEqual(registry.lookup('Brackishness'), tds)
+
+    def test_shared_version_is_checked_once_per_interval(self):
+        registry.lookup('TDS')
+        with mock.patch.object(cache, "get", wraps=cache.get) as get:
+            for _ in range(100):
+                registry.unit(registry.lookup('TDS'))
+        get.assert_not_called()
+
+    def test_analyse_lab_report_matches_aliases(self):
+        result = analyse_lab_report.invoke({
+            'customer_request': {'water_parameters': [{'name': 'TDS', 'value': 1500, 'unit': 'mg/L'}]},
+            'guideline': {'Total Dissolved Solids (TDS)': {'unit': 'mg/L', 'min_value': None, 'max_value': 1000}},
+        })
+        self.assertEqual(len(result['parameter_violations']), 1)
+
+
+class UnitConverterTest(ManagementTestCase):
+    def test_normalize_unit(self):
+        self.assertEqual(normalize_unit('µS/cm'), 'us/cm')
+        self.assertEqual(normalize_unit('μS / CM'), 'us/cm')
+        self.assertEqual(normalize_unit('mg/L'), 'mg/l')
+
+    def test_factors_to_canonical_units(self):
+        lead, tds, ec = registry.lookup('Lead'), registry.lookup('TDS'), registry.lookup('EC')
+        values = converter.to_canonical([lead, lead, tds, ec, lead], ['µg/L', 'ppm', 'µS/cm', 'mS/cm', 'NTU'], [15, 2, 1000, 1.5, 3])
+        self.assertEqual(list(values), [0.015, 2, 640, 1500, 3])
+
+    def test_compare_reconciles_units(self):
+        guideline = create_guideline([('Lead', 'mg/L', None, 0.01), ('TDS', 'mg/L', None, 1000)])
+        report = create_lab_report(create_customer_request(), [('Lead (Pb)', 'ppb', 15), ('Total Dissolved Solids', 'µS/cm', 1200)])
+
+        response = APIClient().get(f'/api/management/waterlabreports/{report.id}/compare/', {'guideline_id': str(guideline.id)})
+
+        rows = {row['name']: row for row in response.data['parameters']}
+        self.assertEqual(rows['Lead (Pb)']['status'], ABOVE_MAX)
+        self.assertAlmostEqual(rows['Lead (Pb)']['canonical_value'], 0.015)
+        self.assertEqual(rows['Total Dissolved Solids']['status'], WITHIN)
+
+
+class CompiledGuidelineTest(TestCase):
+    def test_evaluate_statuses_ratios_and_margins(self):
+        compiled = CompiledGuideline(
+            'g1', 'WHO', 'drinking',
+            parameter_ids=[1, 2, 3],
+            names=['pH', 'Iron', 'Chlorine'],
+            units=['', 'mg/L', 'mg/L'],
+            min_values=[6.5, float('nan'), 0.2],
+            max_values=[8.5, 0.3, 5],
+        )
+        result = compiled.evaluate([1, 2, 3, 4], [9.35, 0.15, 0.1, 3])
+
+        self.assertEqual(list(result['status']), [ABOVE_MAX, WITHIN, BELOW_MIN, NOT_REGULATED])
+        self.assertAlmostEqual(result['exceedance_ratio'][0], 1.1)
+        self.assertAlmostEqual(result['exceedance_ratio'][1], 0.5)
+        self.assertAlmostEqual(result['exceedance_ratio'][2], 2.0)
+        self.assertAlmostEqual(result['margin'][0], -0.85)
+        self.assertAlmostEqual(result['margin'][1], 0.15)
+
+
+class WaterLabReportCompareTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.customer_request = create_customer_request()
+        self.guideline = create_guideline([
+            ('pH', '', 6.5, 8.5),
+            ('Iron', 'mg/L', None, 0.3),
+        ])
+        self.report = create_lab_report(self.customer_request, [
+            ('PH', '', 7.2),
+            ('Iron (Fe)', 'mg/L', 0.9),
+        ])
+
+    def test_compare_against_usage_guideline(self):
+        response = self.client.get(f'/api/management/waterlabreports/{self.report.id}/compare/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['guideline'], str(self.guideline.id))
+        self.assertEqual(response.data['violations'], 1)
+        statuses = {row['name']: row['status'] for row in response.data['parameters']}
+        self.assertEqual(statuses, {'PH': WITHIN, 'Iron (Fe)': ABOVE_MAX})
+
+    def test_compare_unknown_guideline(self):
+        response = self.client.get(
+            f'/api/management/waterlabreports/{self.report.id}/compare/',
+            {'guideline_id': 'not-a-uuid'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class WaterLabReportScreenTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        customer_request = create_customer_request()
+        self.strict = create_guideline([('Iron', 'mg/L', None, 0.3), ('pH', '', 6.5, 8.5)], body='KEBS')
+        self.lenient = create_guideline([('Iron', 'mg/L', None, 1.0)], body='EPA')
+        self.clean = create_lab_report(customer_request, [('Iron', 'mg/L', 0.1), ('pH', '', 7.0)])
+        self.dirty = create_lab_report(customer_request, [('Iron', 'mg/L', 0.5), ('pH', '', 9.0)])
+
+    def test_screen_matrix(self):
+        response = self.client.post('/api/management/waterlabreports/screen/', {
+            'report_ids': [str(self.clean.id), str(self.dirty.id)],
+            'guideline_ids': [str(self.strict.id), str(self.lenient.id)],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['violations'], [[0, 0], [2, 0]])
+        self.assertEqual(response.data['passed'], [[True, True], [False, True]])
+
+    def test_screen_requires_report_selection(self):
+        response = self.client.post('/api/management/waterlabreports/screen/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class GuidelineCacheTest(ManagementTestCase):
+    def test_warm_cache_has_no_db_hits_and_invalidates_on_edit(self):
+        # Not active, so served from its snapshot rather than the compiled store
+        guideline = create_guideline([('Iron', 'mg/L', None, 0.3)], status='pending')
+        get_compiled_guideline(guideline.id)
+        with self.assertNumQueries(0):
+            compiled = get_compiled_guideline(str(guideline.id))
+        self.assertEqual(list(compiled.max_values), [0.3])
+
+        guideline.parameters.update(max_value=1.0)  # queryset update sends no signals
+        self.assertEqual(list(get_compiled_guideline(guideline.id).max_values), [0.3])
+
+        param = guideline.parameters.get()
+        param.save()
+        self.assertEqual(list(get_compiled_guideline(guideline.id).max_values), [1.0])
+
+    def test_retrieve_from_snapshot(self):
+        guideline = create_guideline([('Iron', 'mg/L', None, 0.3)])
+        response = APIClient().get(f'/api/management/waterguidelines/{guideline.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['parameters'][0]['name'], 'Iron')
+        self.assertEqual(APIClient().get('/api/management/waterguidelines/nope/').status_code, 404)
+
+
+class GuidelineStoreTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.iron = registry.lookup('Iron')
+        self.guideline = create_guideline([('Iron', 'mg/L', None, 0.3), ('Lead', 'µg/L', None, 10)])
+        create_guideline([('Iron', 'mg/L', None, 9)], status='inactive')
+
+    def test_builds_active_guidelines_indexed_by_parameter_id(self):
+        store = guideline_store.current()
+        self.assertEqual(store.ids, [str(self.guideline.id)])
+        self.assertEqual(store.max_values[0, self.iron], 0.3)
+        self.assertAlmostEqual(store.max_values[0, registry.lookup('Lead')], 0.01)
+        self.assertIsInstance(get_compiled_guideline(self.guideline.id), StoredGuideline)
+
+    def test_rebuilds_after_guideline_change(self):
+        version = guideline_store.current().version
+        self.assertIs(guideline_store.current().version, version)
+
+        param = self.guideline.parameters.get(name='Iron')
+        param.max_value = 0.5
+        param.save()
+
+        store = guideline_store.current()
+        self.assertNotEqual(store.version, version)
+        self.assertEqual(store.max_values[0, self.iron], 0.5)
+
+    def test_screen_uses_store(self):
+        report = create_lab_report(create_customer_request(), [('Iron', 'mg/L', 0.4)])
+        guideline_store.current()
+        with self.assertNumQueries(1):
+            response = APIClient().post('/api/management/waterlabreports/screen/', {
+                'report_ids': [str(report.id)],
+            }, format='json')
+        self.assertEqual(response.data['guidelines'], [str(self.guideline.id)])
+        self.assertEqual(response.data['violations'], [[1]])
+
+
+class GuidelineUsageLookupTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guideline = create_guideline([('Iron', 'mg/L', None, 0.3)], usage='Fire Protection')
+        create_guideline([('Iron', 'mg/L', None, 1)], usage='fire-protection', status='inactive')
+
+    def test_usage_is_normalized_on_save(self):
+        self.guideline.refresh_from_db()
+        self.assertEqual(self.guideline.usage, 'fire_protection')
+        self.assertEqual(create_customer_request(water_usage=' Fire protection ').water_usage, 'fire_protection')
+
+    def test_active_guidelines_for_usage(self):
+        self.assertEqual(active_guidelines_for_usage('FIRE PROTECTION'), [str(self.guideline.id)])
+        self.assertEqual(active_guidelines_for_usage('drinking'), [])
+
+    def test_by_usage_endpoint(self):
+        client = APIClient()
+        response = client.get('/api/management/waterguidelines/by_usage/', {'usage': 'Fire Protection'})
+        self.assertEqual([g['id'] for g in response.data], [str(self.guideline.id)])
+
+        response = client.get('/api/management/waterguidelines/by_usage/',
+                              {'usage': 'fire_protection', 'include_inactive': 'true'})
+        self.assertEqual(len(response.data), 2)
+
+
+class ComplianceResultTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guideline = create_guideline([('Iron', 'mg/L', None, 0.3), ('Lead', 'mg/L', None, 0.01)])
+        self.iron_report = create_lab_report(create_customer_request(), [('Iron', 'mg/L', 0.4)])
+        self.lead_report = create_lab_report(
+            create_customer_request(email='other@example.com', username='other'), [('Lead', 'mg/L', 0.005)]
+        )
+        refresh_reports([self.iron_report.id, self.lead_report.id])
+
+    def result(self, report):
+        return ComplianceResult.objects.get(lab_report=report, guideline=self.guideline)
+
+    def test_results_are_materialized(self):
+        result = self.result(self.iron_report)
+        self.assertFalse(result.passed)
+        self.assertEqual(result.summary['violations'], 1)
+        self.assertEqual(result.violations[0]['name'], 'Iron')
+        self.assertTrue(self.result(self.lead_report).passed)
+
+    def test_limit_edit_only_touches_reports_measuring_the_parameter(self):
+        lead_updated = self.result(self.lead_report).updated_at
+        param = self.guideline.parameters.get(name='Iron')
+        param.max_value = 0.5
+        with self.captureOnCommitCallbacks(execute=True):
+            param.save()
+        self.assertTrue(self.result(self.iron_report).passed)
+        self.assertEqual(self.result(self.lead_report).updated_at, lead_updated)
+
+    def test_lab_parameter_change_recomputes_report(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WaterLabParameter.objects.create(lab_report=self.lead_report, name='Lead (Pb)', unit='µg/L', value=50)
+        self.assertFalse(self.result(self.lead_report).passed)
+
+    def test_edits_that_leave_limits_alone_do_not_recompute(self):
+        param = self.guideline.parameters.get(name='Iron')
+        with mock.patch.object(compliance_results, "refresh_guideline") as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.guideline.description = "Revised wording"
+            self.guideline.save()
+            param.save()
+        refresh.assert_not_called()
+
+    def test_report_is_recomputed_once_per_transaction(self):
+        with mock.patch.object(compliance_results, "refresh_reports") as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            report = create_lab_report(self.iron_report.customer_request,
+                                       [('Iron', 'mg/L', 0.1), ('Lead', 'mg/L', 0.1), ('pH', '', 7)])
+        refresh.assert_called_once()
+        self.assertIn(report.id, refresh.call_args.args[0])
+
+    def test_deactivated_guideline_drops_results(self):
+        self.guideline.status = 'inactive'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guideline.save()
+        self.assertFalse(ComplianceResult.objects.filter(guideline=self.guideline).exists())
+
+    def test_pipeline_reads_stored_violations(self):
+        tool_input = build_tool_input(self.iron_report.customer_request_id)
+        self.assertEqual([v['parameter'] for v in tool_input['parameter_violations']], ['Iron'])
+        with mock.patch.object(ai_tools, "compare_lab_values") as compare:
+            result = analyse_lab_report.invoke({k: tool_input[k] for k in ('customer_request', 'guideline', 'parameter_violations')})
+        compare.assert_not_called()
+        self.assertEqual(result['treatment_specs']['violated_parameters'], ['Iron'])
+
+        # Until a report's results are materialized, the tool compares the values itself
+        ComplianceResult.objects.filter(lab_report=self.iron_report).delete()
+        self.assertNotIn('parameter_violations', build_tool_input(self.iron_report.customer_request_id))
+
+    def test_compliance_endpoint(self):
+        response = APIClient().get(f'/api/management/waterlabreports/{self.iron_report.id}/compliance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['guideline'], self.guideline.id)
+        self.assertFalse(response.data[0]['passed'])
+
+
+class SeedCommandTest(ManagementTestCase):
+    def test_seeded_lab_values_are_resolved_and_scored(self):
+        User = get_user_model()
+        User.objects.create_user(email='c@example.com', username='c', password='x', role='customer')
+        for i in range(5):
+            User.objects.create_user(email=f's{i}@example.com', username=f's{i}', password='x', role='support')
+        guidelines = {usage: create_guideline([('Iron', 'mg/L', None, 0.1)], usage=usage)
+                      for usage in WaterUsageChoices.values}
+        call_command('customer_requests', stdout=StringIO())
+
+        self.assertFalse(WaterLabParameter.objects.filter(name='Iron', parameter__isnull=True).exists())
+        for report in WaterLabReport.objects.select_related('customer_request'):
+            guideline = guidelines[report.customer_request.water_usage]
+            self.assertTrue(ComplianceResult.objects.filter(lab_report=report, guideline=guideline).exists())
+        # Seeded values run up to three times the 0.1 mg/L Iron limit
+        self.assertTrue(CustomerRequest.objects.filter(severity_score__gt=0).exists())
+
+
+class TriageTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        create_guideline([('Iron', 'mg/L', None, 0.3), ('Lead', 'mg/L', None, 0.01), ('pH', '', 6.5, 8.5)])
+        self.iron = create_customer_request()
+        self.lead = create_customer_request(email='lead@example.com', username='lead')
+        self.clean = create_customer_request(email='clean@example.com', username='clean')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_lab_report(self.iron, [('Iron', 'mg/L', 0.6)])
+            create_lab_report(self.lead, [('Lead', 'ug/L', 20), ('pH', '', 7)])
+            create_lab_report(self.clean, [('pH', '', 7)])
+
+    def test_scores_weight_health_critical_parameters(self):
+        scores = score_requests([self.iron.id, self.lead.id, self.clean.id])
+        self.assertAlmostEqual(scores[str(self.iron.id)], 1.0)  # twice the limit, weight 1
+        self.assertAlmostEqual(scores[str(self.lead.id)], 10.0)  # twice the limit, weight 10
+        self.assertEqual(scores[str(self.clean.id)], 0.0)
+
+    def test_severity_scores_caps_zero_limits(self):
+        values = np.array([[5.0, np.nan]])
+        scores = severity_scores(values, np.full((1, 2), np.nan), np.array([[0.0, 1.0]]), np.ones(2))
+        self.assertEqual(scores.tolist(), [100.0])
+
+    def test_triage_ranks_pending_requests(self):
+        response = APIClient().get('/api/management/customerrequests/triage/')
+        ids = [row['id'] for row in response.data['results']]
+        self.assertEqual(ids, [str(self.lead.id), str(self.iron.id), str(self.clean.id)])
+
+    def test_deleted_guideline_rescores_requests(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WaterGuideline.objects.get().delete()
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.severity_score, 0.0)
+
+    def test_score_updates_as_reports_arrive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_lab_report(self.clean, [('Iron', 'mg/L', 3.0)])
+        self.clean.refresh_from_db()
+        self.assertAlmostEqual(self.clean.severity_score, 9.0)
+
+
+class CompositeGuidelineTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.who = create_guideline([('pH', '', 6.5, 8.5), ('Iron', 'mg/L', None, 0.3)])
+        self.kebs = create_guideline([('pH', '', 6.5, 8.0), ('Lead', 'µg/L', None, 10)], body='KEBS', status='pending')
+
+    def test_envelope_takes_strictest_bounds(self):
+        composite = get_composite_guideline([self.kebs.id, self.who.id])
+        ph, iron, lead = registry.lookup('pH'), registry.lookup('Iron'), registry.lookup('Lead')
+        self.assertEqual((composite.min_values[ph], composite.max_values[ph]), (6.5, 8.0))
+        self.assertEqual(composite.max_values[iron], 0.3)
+        self.assertAlmostEqual(composite.max_values[lead], 0.01)
+        self.assertFalse(composite.conflicts.any())
+        self.assertIs(get_composite_guideline([str(self.who.id), self.kebs.id]), composite)
+
+    def test_conflicts_are_flagged(self):
+        strict = create_guideline([('pH', '', 8.6, 9.0)], body='Boiler', status='pending')
+        response = APIClient().get('/api/management/waterguidelines/composite/',
+                                   {'ids': f'{self.who.id},{strict.id}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['conflicts'], ['pH'])
+        row = next(r for r in response.data['parameters'] if r['name'] == 'pH')
+        self.assertEqual((row['min_source'], row['max_source']), (str(strict.id), str(self.who.id)))
+
+    def test_compare_against_several_guidelines(self):
+        report = create_lab_report(create_customer_request(), [('pH', '', 8.2), ('Iron', 'mg/L', 0.1)])
+        response = APIClient().get(f'/api/management/waterlabreports/{report.id}/compare/',
+                                   {'guideline_id': f'{self.who.id},{self.kebs.id}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['violations'], 1)
+        self.assertCountEqual(response.data['guideline_body'].split(' + '), ['WHO', 'KEBS'])
+
+
+class _FakeTool:
+    def __init__(self, output, delay=0.0):
+        self.output = output
+        self.delay = delay
+
+    def invoke(self, tool_input):
+        time.sleep(self.delay)
+        if isinstance(self.output, Exception):
+            raise self.output
+        return self.output
+
+
+class ToolSchedulerTest(TestCase):
+    GRAPH = {
+        "sizing": {"requires": ["customer_request"], "provides": ["sizing_details"]},
+        "pretreatment": {"requires": ["customer_request"], "provides": ["pretreatment_plan"]},
+        "proposal": {"requires": ["sizing_details", "pretreatment_plan"], "provides": ["final_proposal"]},
+    }
+
+    def run_graph(self, tools, **kwargs):
+        with mock.patch.dict(mainai.TOOL_DEPENDENCY_MAP, self.GRAPH, clear=True), \
+                mock.patch.dict(mainai.tools_by_name, dict(tools), clear=True):
+            return mainai.execute_tool_sequence({"customer_request": {}}, **kwargs)
+
+    def test_independent_tools_overlap(self):
+        started = time.perf_counter()
+        result = self.run_graph({
+            "sizing": _FakeTool({"sizing_details": 1}, delay=0.3),
+            "pretreatment": _FakeTool({"pretreatment_plan": 2}, delay=0.3),
+            "proposal": _FakeTool({"final_proposal": 3}),
+        }, full_sequence=True)
+        self.assertLess(time.perf_counter() - started, 0.55)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["execution_sequence"][-1]["tool"], "proposal")
+        self.assertEqual(result["final_output"], {"final_proposal": 3})
+        self.assertIn("duration_ms", result["execution_sequence"][0])
+
+    def test_failure_skips_dependents(self):
+        result = self.run_graph({
+            "sizing": _FakeTool(RuntimeError("boom")),
+            "pretreatment": _FakeTool({"pretreatment_plan": 2}),
+            "proposal": _FakeTool({"final_proposal": 3}),
+        }, target_tool="proposal")
+        statuses = {e["tool"]: e["status"] for e in result["execution_sequence"]}
+        self.assertEqual(statuses, {"sizing": "failed", "pretreatment": "success", "proposal": "skipped"})
+        self.assertFalse(result["success"])
+
+
+    def test_retry_resumes_from_failed_tool(self):
+        checkpoints = CheckpointStore(create_customer_request().id)
+        sizing = _FakeTool({"sizing_details": 1})
+        pretreatment = _FakeTool({"pretreatment_plan": 2})
+        tools = {"sizing": sizing, "pretreatment": pretreatment, "proposal": _FakeTool(RuntimeError("timeout"))}
+        self.assertFalse(self.run_graph(tools, full_sequence=True, checkpoints=checkpoints)["success"])
+
+        tools["proposal"] = _FakeTool({"final_proposal": 3})
+        sizing.invoke = pretreatment.invoke = mock.Mock(side_effect=AssertionError("re-run"))
+        result = self.run_graph(tools, full_sequence=True, checkpoints=checkpoints)
+        statuses = {e["tool"]: e["status"] for e in result["execution_sequence"]}
+        self.assertEqual(statuses, {"sizing": "restored", "pretreatment": "restored", "proposal": "success"})
+        self.assertEqual(result["final_output"], {"final_proposal": 3})
+
+    def test_changed_output_invalidates_downstream_only(self):
+        checkpoints = CheckpointStore(create_customer_request().id)
+        tools = {
+            "sizing": _FakeTool({"sizing_details": 1}),
+            "pretreatment": _FakeTool({"pretreatment_plan": 2}),
+            "proposal": _FakeTool({"final_proposal": 3}),
+        }
+        self.run_graph(tools, full_sequence=True, checkpoints=checkpoints)
+        # A new pretreatment plan (e.g. after its checkpoint was dropped) re-runs the proposal, not the sizing
+        PipelineCheckpoint.objects.filter(tool="pretreatment").delete()
+        tools["pretreatment"] = _FakeTool({"pretreatment_plan": 5})
+        result = self.run_graph(tools, full_sequence=True, checkpoints=checkpoints)
+        statuses = {e["tool"]: e["status"] for e in result["execution_sequence"]}
+        self.assertEqual(statuses, {"sizing": "restored", "pretreatment": "success", "proposal": "success"})
+
+
+class PipelineJobTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.customer_request = create_customer_request(site_location={'name': 'Nairobi'})
+        create_guideline([('Iron', 'mg/L', None, 0.3)])
+        create_lab_report(self.customer_request, [('Iron', 'mg/L', 0.9)])
+
+    def enqueue(self, **data):
+        return self.client.post('/api/management/agent/process-customer-request',
+                                {'customer_request_id': str(self.customer_request.id), **data}, format='json')
+
+    def test_post_queues_job(self):
+        response = self.enqueue()
+        self.assertEqual(response.status_code, 202)
+        job = PipelineJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.status, PipelineJob.Status.QUEUED)
+        self.assertEqual(job.tool_input['customer_request']['water_parameters'][0]['name'], 'Iron')
+        self.assertEqual(job.tool_input['customer_request']['water_parameters'][0]['status'], ABOVE_MAX)
+
+        status_response = self.client.get(f'/api/management/agent/jobs/{job.id}')
+        self.assertEqual(status_response.data['status'], 'queued')
+
+    def test_post_rejects_usage_mismatch(self):
+        guideline = create_guideline([], usage='irrigation')
+        response = self.enqueue(guideline_id=str(guideline.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PipelineJob.objects.exists())
+
+    def test_worker_runs_job_and_records_progress(self):
+        job = PipelineJob.objects.get(id=self.enqueue().data['job_id'])
+
+        def runner(tool_input, on_progress, **kwargs):
+            on_progress({"tool": "analyse_lab_report", "status": "success", "context_snapshot": {}})
+            return {"success": True, "errors": [], "final_output": {"done": True}}
+
+        claimed = claim('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim('worker-2'))
+        run_job(claimed, runner=runner)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, PipelineJob.Status.SUCCEEDED)
+        self.assertEqual(job.progress, [{"tool": "analyse_lab_report", "status": "success"}])
+        self.assertEqual(job.result['final_output'], {"done": True})
+
+    def test_stale_jobs_are_requeued(self):
+        job = PipelineJob.objects.get(id=self.enqueue().data['job_id'])
+        claim('worker-1')
+        PipelineJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (PipelineJob.Status.QUEUED, 1))
+
+    @override_settings(PIPELINE_JOB_STALE_SECONDS=10)
+    def test_idle_worker_requeues_stale_jobs_periodically(self):
+        clock = mock.Mock(monotonic=mock.Mock(return_value=0.0))
+        stop = threading.Event()
+
+        def wait(seconds):
+            clock.monotonic.return_value += seconds
+            if clock.monotonic.return_value >= 25:
+                stop.set()
+            return stop.is_set()
+
+        with mock.patch("management.services.jobs.time", clock), \
+                mock.patch("management.services.jobs.requeue_stale", return_value=0) as sweep, \
+                mock.patch.object(stop, "wait", side_effect=wait):
+            work('worker-1', stop, poll_seconds=2)
+        # At startup, then every 10 seconds of polling
+        self.assertEqual(sweep.call_count, 3)
+
+
+class JobHeartbeatTest(ManagementTransactionTestCase):
+    """The heartbeat is written from its own thread, which a TestCase transaction would lock out."""
+
+    @override_settings(PIPELINE_JOB_HEARTBEAT_SECONDS=0.05)
+    def test_slow_tool_keeps_job_alive(self):
+        customer_request = create_customer_request(site_location={'name': 'Nairobi'})
+        job = start(customer_request.id, {}, 'worker-1')
+        PipelineJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        def runner(tool_input, on_progress, **kwargs):
+            # A single long tool call: no progress is reported while it runs
+            stale = PipelineJob.objects.filter(pk=job.pk, heartbeat_at__lt=timezone.now() - timedelta(minutes=1))
+            deadline = time.monotonic() + 5
+            while stale.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(requeue_stale(), 0)
+            return {"success": True, "errors": []}
+
+        self.assertEqual(run_job(job, runner=runner), PipelineJob.Status.SUCCEEDED)
+
+
+class _FakeLLM:
+    _llm_type = "fake"
+
+    def __init__(self, model, response, delay=0.0):
+        self.model = model
+        self.temperature = 0.0
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+        self.kwargs = None
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        self.kwargs = kwargs
+        if isinstance(self.response, Exception):
+            raise self.response
+        return mock.Mock(content=self.response)
+
+    def stream(self, prompt):
+        self.calls += 1
+        if isinstance(self.response, Exception):
+            raise self.response
+        for word in self.response.split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.calls += 1
+        self.kwargs = kwargs
+        if isinstance(self.response, Exception):
+            raise self.response
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return mock.Mock(content=self.response)
+
+
+def patch_providers(primary, secondary):
+    return mock.patch.dict(providers.registry._clients, {"gemini": primary, "nvidia": secondary})
+
+
+class _Answer(BaseModel):
+    answer: int
+
+
+class LLMResponseCacheTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.primary = _FakeLLM("primary", '{"answer": 42}')
+        self.secondary = _FakeLLM("secondary", '{"answer": 7}')
+        patcher = patch_providers(self.primary, self.secondary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_prompt_is_served_from_cache(self):
+        self.assertEqual(ai_tools.llm_fallback("What   is\n  the answer?", _Answer), {"answer": 42})
+        self.assertEqual(ai_tools.llm_fallback("What is the answer?", _Answer), {"answer": 42})
+        self.assertEqual(self.primary.calls, 1)
+        self.assertEqual(llm_cache.stats()["hits"], 1)
+        self.assertEqual(llm_cache.stats()["misses"], 1)
+
+    def test_bypass_flag(self):
+        ai_tools.llm_fallback("What is the answer?", _Answer)
+        ai_tools.llm_fallback("What is the answer?", _Answer, use_cache=False)
+        self.assertEqual(self.primary.calls, 2)
+
+    def test_invalid_responses_are_not_cached(self):
+        self.primary.response = "not json"
+        self.assertEqual(ai_tools.llm_fallback("What is the answer?", _Answer), {"answer": 7})
+        self.assertEqual(list(LLMResponse.objects.values_list('model', flat=True)), ["secondary"])
+
+    def test_lru_eviction_and_ttl(self):
+        with self.settings(LLM_CACHE_MAX_ENTRIES=2):
+            for prompt in ("a", "b", "c"):
+                ai_tools.llm_fallback(prompt, _Answer)
+            self.assertEqual(LLMResponse.objects.count(), 2)
+        LLMResponse.objects.update(expires_at=timezone.now())
+        ai_tools.llm_fallback("c", _Answer)
+        self.assertEqual(self.primary.calls, 4)
+
+
+@override_settings(LLM_CACHE_ENABLED=False, LLM_HEDGE_DEFAULT_SECONDS=0.05, LLM_HEDGE_MIN_SECONDS=0.01)
+class HedgedRequestTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.primary = _FakeLLM("primary", '{"answer": 42}')
+        self.secondary = _FakeLLM("secondary", '{"answer": 7}')
+        patcher = patch_providers(self.primary, self.secondary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_primary_is_not_hedged(self):
+        self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 42})
+        self.assertEqual(self.secondary.calls, 0)
+        self.assertEqual(llm_stats.hedge_stats(["primary", "secondary"])["fired"], 0)
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        self.primary.delay = 5
+        self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+        self.assertTrue(self.primary.cancelled)
+        self.assertEqual(llm_stats.hedge_stats(["primary", "secondary"]),
+                         {"fired": 1, "wins": {"primary": 0, "secondary": 1}})
+
+    def test_invalid_hedge_response_does_not_win(self):
+        self.primary.delay = 0.2
+        self.secondary.response = "not json"
+        self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 42})
+        self.assertEqual(llm_stats.hedge_stats(["primary", "secondary"])["wins"]["primary"], 1)
+
+    def test_threshold_follows_observed_p95(self):
+        for _ in range(llm_stats.MIN_SAMPLES):
+            llm_stats.record_latency("primary", 2.0)
+        self.assertAlmostEqual(ai_tools._hedge_delay(self.primary), 2.0)
+
+    def test_all_failures_raise(self):
+        self.primary.response = self.secondary.response = "not json"
+        with self.assertRaises(ValueError):
+            ai_tools.llm_fallback("q", _Answer)
+
+    def test_calls_share_one_event_loop(self):
+        loops, ainvoke = [], self.primary.ainvoke
+
+        async def recording(prompt, **kwargs):
+            loops.append(asyncio.get_running_loop())
+            return await ainvoke(prompt, **kwargs)
+
+        self.primary.ainvoke = recording
+        ai_tools.llm_fallback("q1", _Answer)
+        ai_tools.llm_fallback("q2", _Answer)
+        self.assertIs(loops[0], loops[1])
+        self.assertTrue(loops[0].is_running())
+
+    @override_settings(LLM_HEDGE_DEFAULT_SECONDS=0.05)
+    def test_attempt_cancelled_while_acquiring_is_settled(self):
+        def acquire(router, client, prompt):
+            if client is self.primary:
+                time.sleep(0.3)  # queued behind the rate limiter while the hedge wins
+            return 500
+
+        settled = threading.Event()
+        with mock.patch.object(ProviderRouter, "acquire", autospec=True, side_effect=acquire), \
+                mock.patch.object(ProviderRouter, "settle", autospec=True,
+                                  side_effect=lambda router, client, *args: client is self.primary and settled.set()) as settle:
+            self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+            self.assertTrue(settled.wait(2))
+        self.assertEqual(self.primary.calls, 0)
+        self.assertIn(mock.call(mock.ANY, self.primary, 500, None), settle.call_args_list)
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+@override_settings(LLM_CACHE_ENABLED=False, LLM_BREAKER_FAILURES=2)
+class ProviderRouterTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.primary = _FakeLLM("primary", '{"answer": 42}')
+        self.secondary = _FakeLLM("secondary", '{"answer": 7}')
+        self.router = ProviderRouter([self.primary, self.secondary])
+        patcher = patch_providers(self.primary, self.secondary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fastest_provider_first(self):
+        for _ in range(llm_stats.MIN_SAMPLES):
+            self.router.record_success(self.primary, 3.0)
+            self.router.record_success(self.secondary, 1.0)
+        self.assertEqual(self.router.order(), [self.secondary, self.primary])
+
+    def test_failing_provider_is_skipped_until_cooldown(self):
+        self.primary.response = "not json"
+        ai_tools.llm_fallback("q", _Answer)
+        ai_tools.llm_fallback("q", _Answer)
+        self.assertEqual(self.router.snapshot()["primary"]["circuit"], "open")
+        self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+        self.assertEqual(self.primary.calls, 2)
+
+        self.primary.response = '{"answer": 42}'
+        with mock.patch("management.AI.router.time.time", return_value=time.time() + 3600):
+            self.assertEqual(self.router.order(), [self.primary, self.secondary])
+            # Only one caller probes a half-open provider
+            self.assertEqual(self.router.order(), [self.secondary])
+            self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+        cache.delete("llm:probe:primary")
+        with mock.patch("management.AI.router.time.time", return_value=time.time() + 3600):
+            self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 42})
+        self.assertEqual(self.router.snapshot()["primary"]["circuit"], "closed")
+
+    def test_rate_limit_opens_circuit_immediately(self):
+        self.primary.response = _RateLimitError("quota exceeded")
+        self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+        self.assertEqual(self.router.snapshot()["primary"]["rate_limited"], 1)
+        self.assertEqual(self.router.order(), [self.secondary])
+
+    def test_all_circuits_open_still_tries(self):
+        for client in (self.primary, self.secondary):
+            self.router.record_failure(client, _RateLimitError())
+        self.assertEqual(self.router.order(), [self.primary, self.secondary])
+
+
+class _StreamingTool(_FakeTool):
+    def invoke(self, tool_input):
+        ai_tools.token_listener.get()("## Plan")
+        return super().invoke(tool_input)
+
+
+@override_settings(LLM_CACHE_ENABLED=False)
+class TokenStreamingTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.primary = _FakeLLM("primary", "## RO Sizing")
+        self.secondary = _FakeLLM("secondary", "## Fallback")
+        patcher = patch_providers(self.primary, self.secondary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_are_relayed_as_they_arrive(self):
+        tokens = []
+        self.assertEqual(ai_tools.llm_stream("size it", tokens.append), "## RO Sizing ")
+        self.assertEqual(tokens, ["## ", "RO ", "Sizing "])
+        self.assertEqual(self.secondary.calls, 0)
+
+    def test_failure_before_first_token_falls_back(self):
+        self.primary.response = RuntimeError("503")
+        tokens = []
+        self.assertEqual(ai_tools.llm_stream("size it", tokens.append), "## Fallback ")
+        self.assertEqual(tokens, ["## ", "Fallback "])
+
+    def test_token_reservations_are_settled(self):
+        self.primary.stream = lambda prompt: iter([
+            AIMessageChunk(content="## Plan", usage_metadata={"input_tokens": 10, "output_tokens": 20, "total_tokens": 30}),
+            AIMessageChunk(content=" ready", usage_metadata={"input_tokens": 0, "output_tokens": 5, "total_tokens": 5}),
+        ])
+        with mock.patch.object(ProviderRouter, "acquire", return_value=500), \
+                mock.patch.object(ProviderRouter, "settle") as settle:
+            ai_tools.llm_stream("size it", lambda token: None)
+            self.assertEqual(settle.call_args.args[:2], (self.primary, 500))
+            self.assertEqual(settle.call_args.args[2].usage_metadata["total_tokens"], 35)
+
+            # A failed stream is settled too, giving its reservation back
+            self.primary.stream = mock.Mock(side_effect=RuntimeError("503"))
+            ai_tools.llm_stream("size it", lambda token: None)
+            self.assertEqual(settle.call_args_list[1].args, (self.primary, 500, None))
+
+    def test_structured_tools_stream_raw_json(self):
+        self.primary.response = _PipelineLLM.REPLIES[1][1]
+        tokens = []
+        listening = ai_tools.token_listener.set(tokens.append)
+        try:
+            with mock.patch.object(prompts, "_encoding", return_value=None):
+                result = ai_tools.proposal_generator.invoke({
+                    'ro_system_specs': '## Plan', 'customer_request': {}, 'cost_estimate': {'total_cost': 1.0},
+                })
+        finally:
+            ai_tools.token_listener.reset(listening)
+        self.assertEqual("".join(tokens).strip(), self.primary.response)
+        self.assertEqual(result['final_proposal']['cost_breakdown']['installation'], 3000.0)
+
+        # A streamed reply that doesn't validate is asked for again without streaming
+        self.primary.response = '{"system_overview": "cut off'
+        listening = ai_tools.token_listener.set(tokens.append)
+        try:
+            with mock.patch.object(ai_tools, "llm_fallback", return_value={"answer": 1}) as fallback:
+                self.assertEqual(ai_tools.llm_structured("q", _Answer), {"answer": 1})
+        finally:
+            ai_tools.token_listener.reset(listening)
+        fallback.assert_called_once_with("q", _Answer)
+
+    def test_tool_boundaries_and_tokens_reach_the_stream(self):
+        stream = PipelineStream()
+        with mock.patch.dict(mainai.TOOL_DEPENDENCY_MAP, ToolSchedulerTest.GRAPH, clear=True), \
+                mock.patch.dict(mainai.tools_by_name, {
+                    "sizing": _StreamingTool({"sizing_details": 1}),
+                    "pretreatment": _FakeTool({"pretreatment_plan": 2}),
+                    "proposal": _FakeTool({"final_proposal": 3}),
+                }, clear=True):
+            mainai.execute_tool_sequence({"customer_request": {}}, full_sequence=True,
+                                         on_progress=stream.tool_finished, stream=stream)
+        stream.close("done", {})
+        events = [event.split("\n")[0] for event in stream]
+        self.assertEqual(events.count("event: tool_start"), 3)
+        self.assertEqual(events.count("event: tool_end"), 3)
+        self.assertEqual(events.count("event: token"), 1)
+        self.assertEqual(events[-1], "event: done")
+
+    def test_endpoint_streams_server_sent_events(self):
+        customer_request = create_customer_request(site_location={'name': 'Nairobi'})
+
+        def fake_run(tool_input, on_progress=None, stream=None, **kwargs):
+            stream.tool_started("ro_sizing")
+            stream.token("ro_sizing", "## RO")
+            on_progress({"tool": "ro_sizing", "status": "success", "context_snapshot": {}})
+            return {"success": True, "final_output": {"ro_sizing": "## RO"}, "errors": []}
+
+        with mock.patch("management.services.pipeline.run_pipeline", fake_run):
+            response = APIClient().post('/api/management/agent/process-customer-request/stream',
+                                        {'customer_request_id': str(customer_request.id)}, format='json')
+            body = b"".join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: token\ndata: {"tool": "ro_sizing", "text": "## RO"}', body)
+        self.assertNotIn("context_snapshot", body)
+        self.assertTrue(body.rstrip().split("\n\n")[-1].startswith("event: done"))
+
+
+class PromptBuilderTest(TestCase):
+    INPUT = {
+        "ro_system_specs": "## RO\n" + "Spiral wound membranes. " * 200,
+        "guideline": {"Iron": {"max_value": 0.3}},
+        "customer_request": {
+            "water_usage": "drinking",
+            "notes": "Call before visiting. " * 50,
+            "water_parameters": [
+                {"name": "Iron", "parameter_id": 1, "value": 0.9, "status": "above_max", "exceedance_ratio": 3.0},
+                {"name": "Zinc", "parameter_id": 2, "value": 2.7, "status": "within", "exceedance_ratio": 0.9},
+                {"name": "pH", "parameter_id": 3, "value": 7.1, "status": "within", "exceedance_ratio": 0.2},
+                {"name": "Odour", "value": 1},
+            ],
+        },
+    }
+
+    def setUp(self):
+        # Count tokens the offline way; the tiktoken BPE file may not be downloadable here
+        patcher = mock.patch.object(prompts, "_encoding", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_context_is_required_keys_and_relevant_parameters(self):
+        context = prompts.tool_context("ro_sizing", self.INPUT)
+        self.assertEqual(set(context), {"ro_system_specs", "customer_request"})
+        self.assertEqual([p["name"] for p in context["customer_request"]["water_parameters"]], ["Iron", "Zinc", "Odour"])
+        self.assertNotIn("parameter_id", context["customer_request"]["water_parameters"][0])
+
+    def test_prompt_is_compact(self):
+        prompt = prompts.build_prompt("ro_sizing", "Size it.", {"customer_request": {"water_usage": "drinking"}})
+        self.assertEqual(prompt, 'Size it.\n\nInput (JSON):\n{"customer_request":{"water_usage":"drinking"}}')
+
+    def test_budget_drops_notes_then_truncates(self):
+        with mock.patch.dict(prompts.TOOL_DEPENDENCY_MAP["ro_sizing"], {"token_budget": 600}):
+            prompt = prompts.build_prompt("ro_sizing", "Size it.", self.INPUT)
+        self.assertLessEqual(prompts.count_tokens(prompt), 600)
+        self.assertNotIn("Call before visiting", prompt)
+        self.assertIn(prompts.TRUNCATION_MARK, prompt)
+        self.assertIn('"name":"Iron"', prompt)
+
+
+class TreatmentRulesTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        create_guideline([('Iron', 'mg/L', None, 0.3), ('pH', '', 6.5, 8.5), ('Ammonia', 'mg/L', None, 0.5)])
+
+    def customer_request(self, params, **kwargs):
+        customer_request = create_customer_request(site_location={'name': 'Nairobi'}, **kwargs)
+        create_lab_report(customer_request, params)
+        return build_tool_input(customer_request.id)["customer_request"]
+
+    def test_sources_normalize_to_knowledge_base(self):
+        self.assertEqual(normalize_source('Borehole Water'), 'borehole')
+        self.assertEqual(normalize_source(' tap-water '), 'municipal')
+        self.assertEqual(normalize_source('Seawater'), 'sea')
+
+    def test_covered_violations_are_answered_by_rules(self):
+        request = self.customer_request([('Iron', 'mg/L', 0.9), ('pH', '', 6.0), ('Odour', '', 1)])
+        recommendation = treatment_rules.recommend(request)
+        self.assertEqual(recommendation.source, 'Borehole Water')
+        self.assertIn('pH adjustment (Soda Ash)', recommendation.steps)
+        # Iron removal is already part of the borehole treatment train
+        self.assertEqual(sum('Iron removal' in step for step in recommendation.steps), 1)
+        self.assertEqual([t['parameter'] for t in recommendation.triggers], ['Iron', 'pH'])
+        self.assertIn('BWRO', recommendation.markdown())
+
+    def test_uncovered_violation_or_source_is_left_to_the_llm(self):
+        self.assertIsNone(treatment_rules.recommend(self.customer_request([('Ammonia', 'mg/L', 2.0)])))
+        self.assertIsNone(treatment_rules.recommend(
+            self.customer_request([('Iron', 'mg/L', 0.9)], water_source='Spring', username='spring', email='s@example.com')
+        ))
+
+    def test_tool_skips_llm_on_rules_hit(self):
+        request = self.customer_request([('Iron', 'mg/L', 0.9)])
+        llm = _FakeLLM("primary", "## From the LLM")
+        with patch_providers(llm, _FakeLLM("secondary", "unused")):
+            result = ai_tools.treatment_recommendation.invoke({"treatment_specs": {}, "customer_request": request})
+            self.assertEqual((result["recommendation_source"], llm.calls), ("rules", 0))
+            with override_settings(AI_RULES_FAST_PATH=False), mock.patch.object(prompts, "_encoding", return_value=None):
+                result = ai_tools.treatment_recommendation.invoke({"treatment_specs": {}, "customer_request": request})
+        self.assertEqual(result["recommendation_source"], "llm")
+        self.assertIn("From the LLM", result["ro_system_specs"])
+
+
+class RoSizingTest(ManagementTestCase):
+    def test_every_membrane_model_is_sized(self):
+        options = ro_sizing.size_options(500, 300, source='municipal')
+        self.assertEqual(len(options), len(ro_sizing.MEMBRANE_MODELS))
+        best = options[0]
+        self.assertEqual(best['model'], 'LE-8040')
+        self.assertEqual((best['elements'], best['vessels'], best['stages']), (30, 5, [3, 2]))
+        self.assertEqual(best['recovery'], 0.75)
+        self.assertLessEqual(best['flux_lmh'], ro_sizing.DESIGN_FLUX['municipal'])
+        self.assertEqual(ro_sizing.size_options(500, 300, source='municipal'), options)
+
+    def test_seawater_rules_out_brackish_elements(self):
+        options = ro_sizing.size_options(100, 35000, source='sea')
+        self.assertEqual({o['membrane_type'] for o in options if o['feasible']}, {'seawater'})
+        self.assertEqual(options[0]['recovery'], 0.45)
+        self.assertGreater(options[0]['feed_pressure_bar'], 45)
+
+    def test_request_is_sized_from_conductivity_and_temperature(self):
+        customer_request = create_customer_request(site_location={'name': 'Nairobi'}, daily_flow_rate=24)
+        create_lab_report(customer_request, [('Conductivity', 'mS/cm', 2.0), ('Temp', '', 15)])
+        sizing = ro_sizing.size_ro(build_tool_input(customer_request.id)['customer_request'])
+        self.assertAlmostEqual(sizing['inputs']['feed_tds_mg_l'], 2000 * 0.64)
+        self.assertEqual(sizing['inputs']['temperature_c'], 15)
+        self.assertEqual(sizing['tank_capacity_l'], 4000)
+        # Cold water is less permeable: more pressure for the same flux
+        warm = ro_sizing.size_options(24, 1280, 25, 'borehole')[0]
+        self.assertGreater(sizing['recommended']['feed_pressure_bar'], warm['feed_pressure_bar'])
+
+    def test_tool_uses_engine_and_falls_back_without_flow_rate(self):
+        llm = _FakeLLM("primary", "## Sized by the LLM")
+        request = {"water_source": "Borehole Water", "daily_flow_rate": 10, "water_parameters": []}
+        with patch_providers(llm, _FakeLLM("secondary", "unused")):
+            result = ai_tools.ro_sizing.invoke({"ro_system_specs": "## RO", "customer_request": request})
+            self.assertIn("## RO Sizing", result["ro_sizing"])
+            self.assertTrue(result["sizing_details"]["inputs"]["feed_tds_assumed"])
+            self.assertEqual(llm.calls, 0)
+            with mock.patch.object(prompts, "_encoding", return_value=None):
+                result = ai_tools.ro_sizing.invoke({
+                    "ro_system_specs": "## RO", "customer_request": {**request, "daily_flow_rate": 0}
+                })
+        self.assertIn("Sized by the LLM", result["ro_sizing"])
+        self.assertEqual(result["sizing_details"], {"summary": result["ro_sizing"]})
+
+
+class PricingTest(ManagementTestCase):
+    ITEMS = [
+        ('M1', 'membrane', 'LE-8040', None, 45000),
+        ('V1', 'pressure_vessel', '8040', 1, 30000),
+        ('P1', 'high_pressure_pump', '', 0.37, 40000),
+        ('P2', 'high_pressure_pump', '', 1.1, 65000),
+        ('T1', 'product_tank', '', 1000, 15000),
+        ('D1', 'antiscalant_dosing', '', 2, 12000),
+        ('C1', 'control_panel', '', None, 20000),
+        ('S1', 'softener', '', 1, 55000),
+        ('I1', 'iron_filter', '', 2, 60000),
+        ('F1', 'sediment_filter', '', 2, 18000),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        for no, component, product_model, rating, unit_price in self.ITEMS:
+            CatalogItem.objects.create(no=no, description=no, component=component, product_model=product_model,
+                                       rating=rating, unit_price=unit_price, inventory=3, warranty='1 year')
+        self.request = {"water_source": "Borehole Water", "daily_flow_rate": 10, "water_parameters": []}
+        self.sizing = ro_sizing.size_ro(self.request)
+
+    def test_bill_is_priced_from_catalog(self):
+        quotation = pricing.quote(self.request, self.sizing)
+        lines = {line['no']: line for line in quotation['lines']}
+        self.assertEqual(lines['M1']['quantity'], self.sizing['recommended']['elements'])
+        self.assertIn('P1', lines)  # the smallest pump rated for the duty
+        # A 1,700 L tank takes two of the 1,000 L tanks
+        self.assertEqual(lines['T1']['quantity'], 2)
+        self.assertEqual({item['label'] for item in quotation['unpriced']}, {'Activated Carbon (optional for odor)'})
+        self.assertIsNone(quotation['substitution'])
+
+        equipment = sum(line['line_total'] for line in quotation['lines'])
+        self.assertEqual(quotation['equipment'], equipment)
+        self.assertEqual(quotation['installation'], round(equipment * 0.10, 2))
+        self.assertEqual(quotation['total'], round(quotation['subtotal'] * 1.16, 2))
+        self.assertEqual(lines['V1']['in_stock'], lines['V1']['quantity'] <= 3)
+        self.assertEqual(pricing.quote(self.request, self.sizing), quotation)
+
+    def test_missing_recommended_membrane_is_substituted(self):
+        CatalogItem.objects.filter(no='M1').update(product_model='LE-4040')
+        CatalogItem.objects.create(no='V2', component='pressure_vessel', product_model='4040', rating=2, unit_price=25000)
+        quotation = pricing.quote(self.request, self.sizing)
+        lines = {line['no']: line for line in quotation['lines']}
+        self.assertEqual(quotation['substitution'], {'recommended': 'LE-8040', 'quoted': 'LE-4040'})
+        option = next(option for option in self.sizing['options'] if option['model'] == 'LE-4040')
+        self.assertEqual(lines['M1']['quantity'], option['elements'])
+        self.assertEqual(lines['V2']['quantity'], option['vessels'])
+        self.assertNotIn('membrane', {item['component'] for item in quotation['unpriced']})
+        self.assertIn("Quoted with LE-4040 membranes", pricing.markdown(quotation))
+
+    def test_knowledge_base_filtration_steps_are_mapped(self):
+        self.assertEqual(pricing.step_component("Cartridge Filter (5 micron)"), 'sediment_filter')
+        self.assertEqual(pricing.step_component("Cartridge Filtration (5 micron)"), 'sediment_filter')
+        self.assertEqual(pricing.step_component("Multi-media filtration"), 'multimedia_filter')
+        self.assertEqual(pricing.step_component("Media Filtration"), 'multimedia_filter')
+
+    def test_tool_prices_without_llm_and_falls_back_on_empty_catalog(self):
+        llm = _FakeLLM("primary", "unused")
+        with patch_providers(llm, _FakeLLM("secondary", "unused")):
+            result = ai_tools.quotation_generator.invoke({"customer_request": self.request, "sizing_details": self.sizing})
+            self.assertIn("| M1 |", result["quotation_generator"])
+            self.assertEqual(result["cost_estimate"]["currency"], "KES")
+            self.assertEqual(llm.calls, 0)
+        CatalogItem.objects.all().delete()
+        estimate = '{"base_price": 100, "components": [{"name": "RO unit", "cost": 100}], "total_cost": 116}'
+        with patch_providers(_FakeLLM("primary", estimate), _FakeLLM("secondary", "unused")), \
+                mock.patch.object(prompts, "_encoding", return_value=None):
+            result = ai_tools.quotation_generator.invoke({"customer_request": self.request, "sizing_details": {}})
+        self.assertEqual(result["cost_estimate"]["total_cost"], 116)
+
+    def test_zero_rated_items_are_not_sized_against(self):
+        CatalogItem.objects.create(no='T0', component='product_tank', rating=0, unit_price=1)
+        quotation = pricing.quote(self.request, self.sizing)
+        tank = next(line for line in quotation['lines'] if line['component'] == 'product_tank')
+        self.assertEqual((tank['no'], tank['quantity']), ('T1', 2))
+
+    def test_sync_catalog_refreshes_erp_fields(self):
+        details = {'no': 'P1', 'inventory': 9, 'unit_price': 42000.0, 'description': 'DDP 60', 'item_category_code': 'PUMPS',
+                   'product_model': 'DDP60', 'specifications': '', 'warranty': '2 years'}
+        out = StringIO()
+        with mock.patch("management.AI.tools.get_product_details", side_effect=lambda no: details if no == 'P1' else {}):
+            call_command('sync_catalog', stdout=out)
+        item = CatalogItem.objects.get(no='P1')
+        self.assertEqual((item.unit_price, item.inventory, item.warranty), (42000, 9, '2 years'))
+        self.assertEqual((item.component, item.rating), ('high_pressure_pump', 0.37))
+        self.assertIsNotNone(item.synced_at)
+        self.assertIn("Synced 1 catalog items", out.getvalue())
+
+
+@override_settings(LLM_CACHE_ENABLED=False)
+class StructuredOutputTest(ManagementTestCase):
+    def test_reply_is_extracted_and_repaired(self):
+        reply = "<think>The answer is {obviously} 42</think>\nHere it is:\n```json\n{answer: 42, // final\n}\n```"
+        self.assertEqual(structured.parse_response(reply, _Answer), {"answer": 42})
+        self.assertEqual(json.loads(structured.repair_json('{"a": [1, 2,], "b": \'it\\\'s\', "c": None, "d": "cut')),
+                         {"a": [1, 2], "b": "it's", "c": None, "d": "cut"})
+        self.assertEqual(structured.parse_response("<think>draft</think>\n## Plan", str), "## Plan")
+
+    def test_malformed_reply_does_not_cost_a_second_provider(self):
+        primary = _FakeLLM("primary", "Sure! {'answer': 42,}")
+        secondary = _FakeLLM("secondary", '{"answer": 7}')
+        for hedging in (True, False):
+            with self.subTest(hedging=hedging), override_settings(LLM_HEDGING_ENABLED=hedging), \
+                    patch_providers(primary, secondary):
+                self.assertEqual(ai_tools.llm_fallback("What is the answer?", _Answer), {"answer": 42})
+        self.assertEqual(secondary.calls, 0)
+        self.assertEqual(llm_stats.counters(["structured:repaired"])["structured:repaired"], 2)
+        # Gemini is asked for JSON natively when there is a schema
+        self.assertEqual(primary.kwargs, {"generation_config": {"response_mime_type": "application/json"}})
+        with patch_providers(primary, secondary):
+            ai_tools.llm_fallback("Say hi", str)
+        self.assertEqual(primary.kwargs, {})
+
+    def test_proposal_tool_parses_into_its_declared_output(self):
+        reply = ("```json\n{'system_overview': 'RO plant', 'technical_specs': {'flow_rate': '10 m3/day'},"
+                 " 'cost_breakdown': {'equipment': 100, 'installation': 10},}\n```")
+        with patch_providers(_FakeLLM("primary", reply), _FakeLLM("secondary", "unused")), \
+                mock.patch.object(prompts, "_encoding", return_value=None):
+            result = ai_tools.proposal_generator.invoke({
+                "ro_system_specs": "## RO", "customer_request": {"daily_flow_rate": 10}, "cost_estimate": {"total": 116}
+            })
+        self.assertEqual(result["final_proposal"]["cost_breakdown"], {"equipment": 100.0, "installation": 10.0})
+        self.assertEqual(result["final_proposal"]["technical_specs"]["treatment_stages"], [])
+
+    @override_settings(LLM_HEDGING_ENABLED=False)
+    def test_sequential_failure_reports_last_error(self):
+        with patch_providers(_FakeLLM("primary", "no json here"), _FakeLLM("secondary", RuntimeError("down"))):
+            with self.assertRaisesRegex(ValueError, "Last error: down"):
+                ai_tools.llm_fallback("What is the answer?", _Answer)
+
+
+class PipelineBatchTest(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        create_guideline([('Iron', 'mg/L', None, 0.3)])
+        self.requests = []
+        for i in range(3):
+            customer_request = create_customer_request(
+                site_location={'name': 'Nairobi'}, username=f'customer{i}', email=f'customer{i}@example.com'
+            )
+            create_lab_report(customer_request, [('Iron', 'mg/L', 0.9)])
+            self.requests.append(customer_request)
+        self.runs = []
+        patcher = mock.patch("management.services.pipeline.run_pipeline", self.fake_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_run(self, tool_input, customer_request_id=None, **kwargs):
+        self.runs.append(customer_request_id)
+        return {"success": True, "errors": []}
+
+    def test_interrupted_batch_resumes_after_cursor(self):
+        batch = PipelineBatch.objects.create(name="march", filters={"status": "pending"})
+        stop = threading.Event()
+        run_batch(batch, stop=stop, on_result=lambda request, outcome: stop.set())
+        self.assertEqual(batch.processed, 1)
+        self.assertIsNone(batch.finished_at)
+
+        batch = PipelineBatch.objects.get(name="march")
+        run_batch(batch)
+        self.assertEqual(self.runs, [r.id for r in sorted(self.requests, key=lambda r: (r.created_at, r.id))])
+        self.assertEqual((batch.processed, batch.succeeded), (3, 3))
+        self.assertIsNotNone(batch.finished_at)
+        self.assertEqual(batch.jobs.filter(status=PipelineJob.Status.SUCCEEDED).count(), 3)
+
+    def test_command_filters_requests(self):
+        call_command('run_pipeline_batch', 'one', ids=str(self.requests[1].id), concurrency=1, stdout=StringIO())
+        self.assertEqual(self.runs, [self.requests[1].id])
+        out = StringIO()
+        call_command('run_pipeline_batch', 'one', stdout=out)
+        self.assertIn("already finished", out.getvalue())
+
+    def test_admin_action_queues_jobs(self):
+        jobs, errors = enqueue_requests(CustomerRequest.objects.all())
+        self.assertEqual((len(jobs), errors), (3, {}))
+        self.assertEqual(PipelineJob.objects.filter(status=PipelineJob.Status.QUEUED).count(), 3)
+
+
+class _PipelineLLM(_FakeLLM):
+    """Answers each tool's prompt the way a model would: JSON where the tool asks for it, else Markdown."""
+    REPLIES = (
+        ("project cost estimator", json.dumps({"base_price": 9000.0, "components": [], "total_cost": 12000.0})),
+        ("proposal document", json.dumps({
+            "system_overview": "Borehole RO plant",
+            "technical_specs": {"flow_rate": "10 m3/day", "treatment_stages": ["Iron removal", "RO"]},
+            "cost_breakdown": {"equipment": 9000.0, "installation": 3000.0},
+        })),
+    )
+
+    def __init__(self, model):
+        super().__init__(model, "## Treatment plan")
+
+    def reply(self, prompt):
+        return next((reply for marker, reply in self.REPLIES if marker in str(prompt)), self.response)
+
+    def invoke(self, prompt, **kwargs):
+        super().invoke(prompt, **kwargs)
+        return mock.Mock(content=self.reply(prompt))
+
+    def stream(self, prompt):
+        yield from super().stream(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await super().ainvoke(prompt, **kwargs)
+        return mock.Mock(content=self.reply(prompt))
+
+
+class PipelineEndToEndTest(ManagementTransactionTestCase):
+    """
+    The real tool graph (TOOL_DEPENDENCY_MAP) from a queued job to a proposal,
+    with only the models faked. Tools read the database from worker threads,
+    which the test transaction of a TestCase would keep locked.
+    """
+
+    def setUp(self):
+        super().setUp()
+        create_guideline([('Iron', 'mg/L', None, 0.3)])
+        self.customer_request = create_customer_request(site_location={'name': 'Nairobi'})
+        create_lab_report(self.customer_request, [('Iron', 'mg/L', 0.9), ('TDS', 'mg/L', 800)])
+        patcher = mock.patch.object(prompts, "_encoding", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_job_produces_a_proposal(self):
+        job = start(self.customer_request.id, build_tool_input(self.customer_request.id), "test-worker")
+        with patch_providers(_PipelineLLM("primary"), _PipelineLLM("secondary")):
+            status = run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(status, PipelineJob.Status.SUCCEEDED, job.error)
+        self.assertEqual([entry['tool'] for entry in job.progress], list(mainai.TOOL_DEPENDENCY_MAP))
+        output = job.result['results']
+        self.assertEqual(output['treatment_specs']['violated_parameters'], ['Iron'])
+        self.assertEqual(output['sizing_details']['inputs']['feed_tds_mg_l'], 800)
+        self.assertEqual(output['cost_estimate']['total_cost'], 12000.0)
+        self.assertEqual(output['final_proposal']['cost_breakdown']['installation'], 3000.0)
+        self.assertEqual(job.result['final_output']['final_proposal'], output['final_proposal'])
+
+
+class ToolDependencyMapTest(ManagementTransactionTestCase):
+    """The shipped TOOL_DEPENDENCY_MAP against the tools it names and the input the pipeline starts from."""
+
+    def setUp(self):
+        super().setUp()
+        create_guideline([('Iron', 'mg/L', None, 0.3)])
+        customer_request = create_customer_request(site_location={'name': 'Nairobi'})
+        create_lab_report(customer_request, [('Iron', 'mg/L', 0.9)])
+        self.tool_input = build_tool_input(customer_request.id)
+
+    def test_every_input_is_provided(self):
+        available = set(self.tool_input)
+        for name, spec in mainai.TOOL_DEPENDENCY_MAP.items():
+            self.assertIn(name, mainai.tools_by_name)
+            self.assertEqual(set(spec["requires"]) - available, set(), name)
+            available.update(spec["provides"])
+
+    def test_schemas_take_the_map_inputs(self):
+        for name, spec in mainai.TOOL_DEPENDENCY_MAP.items():
+            fields = mainai.tools_by_name[name].args_schema.model_fields
+            required = {field for field, info in fields.items() if info.is_required()}
+            self.assertEqual(set(spec["requires"]) - set(fields), set(), name)
+            self.assertEqual(set(spec.get("optional", [])) - set(fields), set(), name)
+            self.assertEqual(required - set(spec["requires"]), set(), name)
+
+    def test_sequence_runs_on_the_real_map(self):
+        with patch_providers(_PipelineLLM("primary"), _PipelineLLM("secondary")), \
+                mock.patch.object(prompts, "_encoding", return_value=None), \
+                mock.patch.object(ai_tools, "compare_lab_values", side_effect=AssertionError("stored results unused")):
+            result = mainai.execute_tool_sequence(self.tool_input, full_sequence=True)
+        self.assertEqual(result["errors"], [])
+        self.assertEqual({e["status"] for e in result["execution_sequence"]}, {"success"})
+        self.assertIn("final_proposal", result["final_output"])
+
+
+class RateLimiterTest(ManagementTestCase):
+    def test_request_budget(self):
+        limiter = TokenBucketLimiter("primary", rpm=2)
+        limiter.acquire(1, max_wait=0.1)
+        limiter.acquire(1, max_wait=0.1)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(1, max_wait=0.1)
+        self.assertEqual(limiter.queue_depth(), 0)
+
+    def test_token_budget_is_settled_from_usage(self):
+        limiter = TokenBucketLimiter("primary", tpm=150)
+        limiter.acquire(100, max_wait=0.1)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(100, max_wait=0.1)
+        limiter.settle(reserved=100, used=20)
+        limiter.acquire(100, max_wait=0.1)
+
+    @override_settings(LLM_CACHE_ENABLED=False, LLM_HEDGING_ENABLED=False, LLM_RATE_LIMIT_MAX_WAIT_SECONDS=0.1,
+                       LLM_RATE_LIMITS={"primary": {"rpm": 1}})
+    def test_exhausted_provider_hands_over_without_tripping_breaker(self):
+        primary, secondary = _FakeLLM("primary", '{"answer": 42}'), _FakeLLM("secondary", '{"answer": 7}')
+        with patch_providers(primary, secondary):
+            self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 42})
+            self.assertEqual(ai_tools.llm_fallback("q", _Answer), {"answer": 7})
+        snapshot = ProviderRouter([primary, secondary]).snapshot()["primary"]
+        self.assertEqual((snapshot["circuit"], snapshot["calls"], snapshot["queue_depth"]), ("closed", 1, 0))
+
+    def test_lock_cache_must_be_atomic(self):
+        self.assertEqual(check_lock_cache(None), [])
+        file_based = {**settings.CACHES, 'locks': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': settings.CACHES['default']['LOCATION']}}
+        with override_settings(CACHES=file_based):
+            self.assertEqual([error.id for error in check_lock_cache(None)], ['management.E002'])
+
+
+class ImportBudgetTest(TestCase):
+    """Booting Django and loading the URLconf must not pull in the AI stack, and must stay fast."""
+    # Generous for CI machines; today's boot takes well under half of it
+    BUDGET_SECONDS = 6.0
+    # Prefixes of modules only the pipeline may import (langchain matches langchain_core and friends)
+    HEAVY_MODULES = ("langchain", "google.generativeai", "tiktoken", "langgraph", "weasyprint")
+
+    def test_boot_skips_ai_stack_and_stays_within_budget(self):
+        script = (
+            "import json, sys, time; started = time.perf_counter(); import django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; import management.admin; "
+            f"elapsed = time.perf_counter() - started; heavy = {self.HEAVY_MODULES!r}; "
+            "print(json.dumps({'elapsed': elapsed, 'loaded': sorted(m for m in sys.modules if m.startswith(heavy))}))"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120,
+                                env={**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE},
+                                cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        boot = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(boot['loaded'], [])
+        self.assertLess(boot['elapsed'], self.BUDGET_SECONDS)
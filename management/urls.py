@@ -17,5 +17,7 @@ urlpatterns = [
     # router.urls,
     
     path("agent/process-customer-request", FormatCustomerRequestPromptView.as_view()),
+    path("agent/process-customer-request/stream", StreamCustomerRequestPipelineView.as_view()),
+    path("agent/jobs/<uuid:job_id>", PipelineJobView.as_view(), name='pipeline_job'),
 
 ]
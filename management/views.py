@@ -2,7 +2,9 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
 
 from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
 
 from rest_framework.decorators import action
@@ -13,17 +15,15 @@ from .models import *
 from .serializers import *
 from uuid import UUID
 
-from .AI.tools import *
 # from .AI.old.mainai import run_agent
-from .AI.mainai import run_sequential_workflow,execute_tool_sequence
-from functools import lru_cache
-
-@lru_cache(maxsize=100)
-def get_guideline_with_params(guideline_id):
-    """Cache guideline queries"""
-    return WaterGuideline.objects.prefetch_related(
-        Prefetch('parameters', queryset=WaterGuidelineParameter.objects.only('name', 'unit', 'min_value', 'max_value'))
-    ).get(id=guideline_id)
+from .services.compliance import compare_report, screen_matrix, lab_value_matrix, violation_counts, screen_result
+from .services.guideline_cache import (
+    get_guideline_snapshot, get_compiled_guideline, get_composite_guideline, guideline_representation
+)
+from .services.guideline_store import guideline_store, active_guidelines_for_usage
+from .services.jobs import enqueue
+from .services.pipeline import PipelineInputError, build_tool_input
+from .services.streaming import stream_pipeline
 
 import logging
 
@@ -72,10 +72,12 @@ class WaterGuidelineViewSet(viewsets.ModelViewSet):
         tags=["Water Quality Standards"]
     )
     def retrieve(self, request, *args, **kwargs):
-        # use my new cache function
-        guideline = get_guideline_with_params(kwargs['pk'])
-        serializer = self.get_serializer(guideline)
-        return Response(serializer.data)
+        # Served from the shared guideline cache, no DB hit when warm
+        try:
+            snapshot = get_guideline_snapshot(kwargs['pk'])
+        except (WaterGuideline.DoesNotExist, ValueError):
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(guideline_representation(snapshot))
         # return super().retrieve(request, *args, **kwargs)
 
     # -------------------------
@@ -122,6 +124,7 @@ class WaterGuidelineViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         method='get',
         operation_summary="Get guidelines by usage type",
+        operation_description="Returns the active guidelines for a usage; pass include_inactive=true for every status",
         manual_parameters=[
             openapi.Parameter(
                 'usage',
@@ -129,6 +132,13 @@ class WaterGuidelineViewSet(viewsets.ModelViewSet):
                 description="Filter by water usage type (domestic, industrial, etc.)",
                 type=openapi.TYPE_STRING,
                 required=True
+            ),
+            openapi.Parameter(
+                'include_inactive',
+                openapi.IN_QUERY,
+                description="Also return pending and inactive guidelines",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
             )
         ],
         responses={200: WaterGuidelineSerializer(many=True)},
@@ -136,10 +146,52 @@ class WaterGuidelineViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'])
     def by_usage(self, request):
-        usage = request.query_params.get('usage')
-        guidelines = WaterGuideline.objects.filter(usage__iexact=usage)
-        serializer = self.get_serializer(guidelines, many=True)
-        return Response(serializer.data)
+        usage = normalize_usage(request.query_params.get('usage'))
+        if request.query_params.get('include_inactive', '').lower() in ('1', 'true'):
+            guidelines = WaterGuideline.objects.filter(usage=usage).prefetch_related('parameters')
+            serializer = self.get_serializer(guidelines, many=True)
+            return Response(serializer.data)
+        return Response([
+            guideline_representation(get_guideline_snapshot(guideline_id))
+            for guideline_id in active_guidelines_for_usage(usage)
+        ])
+
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Strictest composite of several guidelines",
+        operation_description="Intersects the limits of several guidelines (e.g. KEBS + WHO) per canonical parameter: "
+                              "the highest minimum and the lowest maximum, in canonical units. Parameters whose "
+                              "combined minimum exceeds the combined maximum are flagged as conflicts.",
+        manual_parameters=[
+            openapi.Parameter(
+                'ids',
+                openapi.IN_QUERY,
+                description="Comma-separated guideline ids",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={200: openapi.Response(description="Composite envelope"),
+                   404: openapi.Response(description="Guideline not found")},
+        tags=["Water Quality Standards"]
+    )
+    @action(detail=False, methods=['get'])
+    def composite(self, request):
+        guideline_ids = [i for i in request.query_params.get('ids', '').split(',') if i.strip()]
+        if not guideline_ids:
+            return Response({"error": "ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            composite = get_composite_guideline(i.strip() for i in guideline_ids)
+        except (WaterGuideline.DoesNotExist, ValueError):
+            return Response({"error": "Guideline not found"}, status=status.HTTP_404_NOT_FOUND)
+        parameters = composite.envelope()
+        return Response({
+            "guidelines": composite.guideline_ids,
+            "body": composite.body,
+            "usage": composite.usage,
+            "conflicts": [row["name"] for row in parameters if row["conflict"]],
+            "parameters": parameters,
+        })
     # -------------------------
     # 🟩 DESTROY
     # -------------------------
@@ -195,6 +247,42 @@ class CustomerRequestViewSet(viewsets.ModelViewSet):
             self.queryset = self.queryset.filter(status=status_filter.lower())
         return super().list(request, *args, **kwargs)
 
+    # -------------------------
+    # 🟩 CUSTOM ACTIONS
+    # -------------------------
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Severity-ranked triage queue",
+        operation_description="Pending customer requests, most severe first. The severity score is the weighted "
+                              "exceedance of a request's worst lab report, with health-critical parameters "
+                              "(Lead, Nitrate, Fluoride, ...) weighing more; it is kept up to date as reports arrive.",
+        manual_parameters=[
+            openapi.Parameter(
+                'min_score',
+                openapi.IN_QUERY,
+                description="Only requests scoring at least this much",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            )
+        ],
+        responses={200: CustomerRequestSerializer(many=True)},
+        tags=["Customer Requests"]
+    )
+    @action(detail=False, methods=['get'])
+    def triage(self, request):
+        # Served straight from the (status, -severity_score) index
+        queryset = self.get_queryset().filter(status='pending').order_by('-severity_score', 'created_at')
+        min_score = request.query_params.get('min_score')
+        if min_score:
+            try:
+                queryset = queryset.filter(severity_score__gte=float(min_score))
+            except ValueError:
+                return Response({"error": "min_score must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
 
     # -------------------------
     # 🟩 RETRIEVE
@@ -348,12 +436,26 @@ class WaterLabReportViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         method='get',
         operation_summary="Compare report against guidelines",
+        operation_description="Checks every parameter of the report against a guideline in one vectorized pass. "
+                              "Without guideline_id, the first active guideline for the request's water usage is used. "
+                              "Pass several comma-separated ids to check against their strictest composite.",
+        manual_parameters=[
+            openapi.Parameter(
+                'guideline_id',
+                openapi.IN_QUERY,
+                description="Guideline to compare against, or comma-separated guidelines to meet at once",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
         responses={200: openapi.Response(
             description="Comparison results",
             schema=openapi.Schema(
                 type=openapi.TYPE_OBJECT,
                 properties={
                     'guideline': openapi.Schema(type=openapi.TYPE_STRING),
+                    'compliant': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'violations': openapi.Schema(type=openapi.TYPE_INTEGER),
                     'parameters': openapi.Schema(
                         type=openapi.TYPE_ARRAY,
                         items=openapi.Items(
@@ -362,22 +464,136 @@ class WaterLabReportViewSet(viewsets.ModelViewSet):
                                 'name': openapi.Schema(type=openapi.TYPE_STRING),
                                 'value': openapi.Schema(type=openapi.TYPE_NUMBER),
                                 'unit': openapi.Schema(type=openapi.TYPE_STRING),
+                                'canonical_value': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'canonical_unit': openapi.Schema(type=openapi.TYPE_STRING),
                                 'guideline_min': openapi.Schema(type=openapi.TYPE_NUMBER),
                                 'guideline_max': openapi.Schema(type=openapi.TYPE_NUMBER),
-                                'status': openapi.Schema(type=openapi.TYPE_STRING)
+                                'status': openapi.Schema(type=openapi.TYPE_STRING),
+                                'exceedance_ratio': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'margin': openapi.Schema(type=openapi.TYPE_NUMBER)
                             }
                         )
                     )
                 }
             )
-        )},
+        ),
+            404: openapi.Response(description="Guideline not found")
+        },
         tags=["Laboratory Reports"]
     )
     @action(detail=True, methods=['get'])
     def compare(self, request, pk=None):
         report = self.get_object()
-        # Implementation would compare report parameters against guidelines
-        return Response({"message": "Comparison results would go here"})
+        guideline_id = request.query_params.get('guideline_id')
+        if not guideline_id:
+            guideline_ids = active_guidelines_for_usage(report.customer_request.water_usage)
+            guideline_id = guideline_ids[0] if guideline_ids else None
+            if guideline_id is None:
+                return Response({"error": "No active guideline for this water usage, pass guideline_id"},
+                                status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            if ',' in guideline_id:
+                compiled = get_composite_guideline(i.strip() for i in guideline_id.split(',') if i.strip())
+            else:
+                compiled = get_compiled_guideline(guideline_id)
+        except (WaterGuideline.DoesNotExist, ValueError):
+            return Response({"error": "Guideline not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        parameters = list(report.parameters.values('parameter_id', 'name', 'value', 'unit'))
+        return Response(compare_report(compiled, parameters))
+
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Stored compliance results of a report",
+        operation_description="Precomputed results against every active guideline for the request's water usage. "
+                              "They are kept up to date as lab values and guideline limits change.",
+        responses={200: ComplianceResultSerializer(many=True)},
+        tags=["Laboratory Reports"]
+    )
+    @action(detail=True, methods=['get'])
+    def compliance(self, request, pk=None):
+        report = self.get_object()
+        results = report.compliance_results.select_related('guideline').order_by('guideline__created_at')
+        return Response(ComplianceResultSerializer(results, many=True).data)
+
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Screen many reports against many guidelines",
+        operation_description="Returns a reports x guidelines pass/fail matrix with violation counts. "
+                              "Select reports by report_ids or by customer_request_ids / customer_request_status; "
+                              "without guideline_ids, all active guidelines are used.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'report_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                'customer_request_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                'customer_request_status': openapi.Schema(type=openapi.TYPE_STRING),
+                'guideline_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+            }
+        ),
+        responses={200: openapi.Response(
+            description="Screening matrix",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'reports': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                    'guidelines': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                    'violations': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER))),
+                    'passed': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_BOOLEAN))),
+                }
+            )
+        ),
+            400: openapi.Response(description="Invalid input data")
+        },
+        tags=["Laboratory Reports"]
+    )
+    @action(detail=False, methods=['post'])
+    def screen(self, request):
+        try:
+            report_ids = [UUID(str(i)) for i in request.data.get('report_ids', [])]
+            request_ids = [UUID(str(i)) for i in request.data.get('customer_request_ids', [])]
+            guideline_ids = [UUID(str(i)) for i in request.data.get('guideline_ids', [])]
+        except (ValueError, TypeError):
+            return Response({"error": "Ids must be valid UUIDs"}, status=status.HTTP_400_BAD_REQUEST)
+        request_status = request.data.get('customer_request_status')
+
+        lab_params = WaterLabParameter.objects.all()
+        if report_ids:
+            lab_params = lab_params.filter(lab_report_id__in=report_ids)
+        elif request_ids or request_status:
+            if request_ids:
+                lab_params = lab_params.filter(lab_report__customer_request_id__in=request_ids)
+            if request_status:
+                lab_params = lab_params.filter(lab_report__customer_request__status=request_status.lower())
+        else:
+            return Response({"error": "Provide report_ids, customer_request_ids or customer_request_status"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Active guidelines come straight from the shared compiled set, no guideline query
+        store = guideline_store.current()
+        if store is not None and all(g in store for g in guideline_ids):
+            guideline_ids = guideline_ids or store.ids
+            rows = store.rows(guideline_ids)
+            report_ids, values = lab_value_matrix(
+                lab_params.values_list('lab_report_id', 'parameter_id', 'unit', 'value'), report_ids
+            )
+            violations = violation_counts(values, store.min_values[rows], store.max_values[rows])
+            return Response(screen_result(report_ids, [str(g) for g in guideline_ids], violations))
+
+        guideline_params = WaterGuidelineParameter.objects.all()
+        if guideline_ids:
+            guideline_params = guideline_params.filter(guideline_id__in=guideline_ids)
+        else:
+            guideline_params = guideline_params.filter(guideline__status='active')
+
+        matrix = screen_matrix(
+            lab_params.values_list('lab_report_id', 'parameter_id', 'unit', 'value'),
+            guideline_params.values_list('guideline_id', 'parameter_id', 'unit', 'min_value', 'max_value'),
+            report_ids=report_ids,
+            guideline_ids=guideline_ids,
+        )
+        return Response(matrix)
 
 class WaterReportAttachmentViewSet(viewsets.ModelViewSet):
     """
@@ -457,10 +673,13 @@ logger = logging.getLogger(__name__)
 
 class FormatCustomerRequestPromptView(APIView):
     """
-    View that formats a customer request using LLM to produce a structured, AI-ready prompt.
+    Queues the AI pipeline (analysis through proposal) for a customer request.
+    The run happens on the pipeline worker pool; poll the returned job.
     """
     @swagger_auto_schema(
-        operation_summary="Generate AI-ready prompt from customer request",
+        operation_summary="Queue the AI pipeline for a customer request",
+        operation_description="Validates the request and guideline, assembles the pipeline input and returns a job id "
+                              "immediately. A run_pipeline_worker process executes it; poll the status URL for progress.",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             required=['customer_request_id'],
@@ -468,6 +687,8 @@ class FormatCustomerRequestPromptView(APIView):
                 'customer_request_id': openapi.Schema(type=openapi.TYPE_STRING, format='uuid'),
                 'guideline_id': openapi.Schema(type=openapi.TYPE_STRING),
                 'override_usage_check': openapi.Schema(type=openapi.TYPE_BOOLEAN, default=False),
+                'resume': openapi.Schema(type=openapi.TYPE_BOOLEAN, default=True,
+                                         description="Reuse checkpointed tool outputs whose inputs are unchanged"),
                 'ai_settings': openapi.Schema(
                     type=openapi.TYPE_OBJECT,
                     properties={
@@ -478,138 +699,108 @@ class FormatCustomerRequestPromptView(APIView):
             }
         ),
         responses={
-            200: openapi.Response(description="Formatted prompt returned successfully"),
+            202: openapi.Response(description="Pipeline job queued"),
             400: openapi.Response(description="Invalid input data"),
             404: openapi.Response(description="Customer request or guideline not found"),
         },
         tags=["Customer Request Initiator"]
     )
-    
     def post(self, request):
         # Validate required fields
         customer_request_id = request.data.get('customer_request_id')
         if not customer_request_id:
             return Response({"error": "customer_request_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            request_id = UUID(customer_request_id)
-        except ValueError:
-            return Response({"error": "Invalid customer_request_id format"}, status=status.HTTP_400_BAD_REQUEST)
-
         # Get optional parameters
         guideline_id = request.data.get('guideline_id')
         override_usage_check = request.data.get('override_usage_check', False)
         ai_settings = request.data.get('ai_settings', {})
 
-        # Fetch customer request with optimized query
         try:
-            request_obj = CustomerRequest.objects.select_related(
-                'customer'
-            ).prefetch_related(
-                'water_lab_reports__parameters',
-                'handlers'
-            ).get(id=request_id)
-        except CustomerRequest.DoesNotExist:
-            return Response({"error": "Customer request not found."}, status=status.HTTP_404_NOT_FOUND)
-
-        # Fetch guideline if provided
-        if guideline_id:
-            try:
-                guideline = get_guideline_with_params(guideline_id)
-                if not override_usage_check and guideline.usage.lower() != request_obj.water_usage.lower():
-                    return Response({
-                        "error": f"Guideline usage mismatch ({guideline.usage} vs {request_obj.water_usage})",
-                        "solution": "Set override_usage_check=True to bypass"
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            except WaterGuideline.DoesNotExist:
-                return Response({"error": "Guideline not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Prepare clean water parameters
-        water_params = [
-            {
-                "name": param.name,
-                "value": param.value,
-                "unit": param.unit
-            }
-            for report in request_obj.water_lab_reports.all()
-            for param in report.parameters.all()
-        ]
-
-        # Prepare guideline parameters if exists
-        guideline_params = None
-        if guideline:
-            
-            guideline_params = {
-                param.name: {
-                    "unit": param.unit,
-                    "min_value": param.min_value,
-                    "max_value": param.max_value
-                }
-                for param in guideline.parameters.all()
-            }
-
-
-        # Build tool input
-        tool_input = {
-                "customer_request": {
-                    "location": request_obj.site_location.get('name') if isinstance(request_obj.site_location, dict) 
-                                else request_obj.site_location.name,
-                    "water_source": request_obj.water_source,
-                    "water_usage": request_obj.water_usage,
-                    "daily_flow_rate": request_obj.daily_flow_rate,
-                    # "daily_water_requirement": request_obj.daily_water_requirement,
-                    "budget": request_obj.budjet,
-                    "water_parameters": water_params,
-                    "notes": request_obj.extras.get("notes", "No additional notes provided."),
-                },
-                "guideline": guideline_params,
-                "ai_settings": ai_settings 
+            tool_input = build_tool_input(customer_request_id, guideline_id, override_usage_check, ai_settings)
+        except PipelineInputError as e:
+            return Response(e.as_response_data(), status=e.status_code)
+
+        job = enqueue(customer_request_id, tool_input, resume=bool(request.data.get('resume', True)))
+        logger.info(f"Queued pipeline job {job.id} for customer request {customer_request_id}")
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse('pipeline_job', kwargs={'job_id': job.id})),
+            "request_id": customer_request_id,
+            "guideline_id": guideline_id,
+            "ai_settings_used": ai_settings
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class StreamCustomerRequestPipelineView(APIView):
+    """
+    Runs the AI pipeline for a customer request and streams it as server-sent
+    events: tool boundaries, plus LLM tokens as they are produced.
+    """
+    @swagger_auto_schema(
+        operation_summary="Stream the AI pipeline for a customer request (SSE)",
+        operation_description="Takes the same body as process-customer-request but runs the pipeline right away and "
+                              "answers with text/event-stream. Events: tool_start {tool}, token {tool, text}, "
+                              "tool_end (execution log entry), then done {success, final_output, errors} or error "
+                              "{error}. Tokens come from the LLM calls only: treatment_recommendation (markdown, "
+                              "unless the rules cover the request), proposal_generator (raw JSON, parsed into "
+                              "final_proposal when complete), ro_sizing without a daily flow rate (markdown) and "
+                              "quotation_generator with an empty catalog (raw JSON).",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['customer_request_id'],
+            properties={
+                'customer_request_id': openapi.Schema(type=openapi.TYPE_STRING, format='uuid'),
+                'guideline_id': openapi.Schema(type=openapi.TYPE_STRING),
+                'override_usage_check': openapi.Schema(type=openapi.TYPE_BOOLEAN, default=False),
+                'resume': openapi.Schema(type=openapi.TYPE_BOOLEAN, default=True),
+                'ai_settings': openapi.Schema(type=openapi.TYPE_OBJECT),
             }
+        ),
+        responses={
+            200: openapi.Response(description="text/event-stream of pipeline events"),
+            400: openapi.Response(description="Invalid input data"),
+            404: openapi.Response(description="Customer request or guideline not found"),
+        },
+        tags=["Customer Request Initiator"]
+    )
+    def post(self, request):
+        customer_request_id = request.data.get('customer_request_id')
+        if not customer_request_id:
+            return Response({"error": "customer_request_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-        
-            # result = analyse_lab_report(tool_input)
-            sequence_to_run = ["treatment_recommendation", "ro_sizing", "quotation_generator", "proposal_generator"]
-
-            agent_res = analyse_lab_report2(
-            tool_input
+            tool_input = build_tool_input(
+                customer_request_id,
+                request.data.get('guideline_id'),
+                request.data.get('override_usage_check', False),
+                request.data.get('ai_settings', {}),
             )
+        except PipelineInputError as e:
+            return Response(e.as_response_data(), status=e.status_code)
+
+        response = StreamingHttpResponse(
+            stream_pipeline(tool_input, customer_request_id, resume=bool(request.data.get('resume', True))),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
-            # agent_res2= execute_tool_sequence(
-            #     initial_data=tool_input, 
-            #     # target_tool="proposal_generator",
-            #     full_sequence=True
-            # )
-
-
-
-            # if agent_res2['success']:
-            #     return Response({
-            #     "formatted_prompt": agent_res2,
-            #     "agent": agent_res2,
-            #         "status": "success",
-            #         "result": agent_res2['final_output'],
-            #         "execution_flow": agent_res2['execution_sequence']
-            #     })
-            # else:
-            #     return Response({
-            #         "status": "error",
-            #         "errors": agent_res2,
-            #         "completed_steps": agent_res2['execution_sequence'],
-            #         "available_data": agent_res2['results']
-            #     }, status=400)
-            
-            # agent_res = run_agent(result)
-            return Response({
-                # "formatted_prompt": result,
-                "agent": agent_res,
-                # "debug_data": result["debug_data"],
-                "request_id": customer_request_id,
-                "guideline_id": guideline_id,
-                "ai_settings_used": ai_settings
-            }, status=status.HTTP_200_OK)
-        
-        except Exception as e:
-            logger.error(f"Error in format_customer_request_prompt: {e}")
-            return Response({"error": "Failed to format customer request prompt","detail":str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class PipelineJobView(APIView):
+    """
+    Status and progress of a queued AI pipeline run.
+    """
+    @swagger_auto_schema(
+        operation_summary="Get pipeline job status",
+        operation_description="Status (queued, running, succeeded, failed), the tools finished so far and, "
+                              "once finished, the pipeline result.",
+        responses={200: PipelineJobSerializer(), 404: openapi.Response(description="Job not found")},
+        tags=["Customer Request Initiator"]
+    )
+    def get(self, request, job_id):
+        job = get_object_or_404(PipelineJob, id=job_id)
+        return Response(PipelineJobSerializer(job).data)
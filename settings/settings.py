@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -202,6 +203,80 @@ DATABASES = {
 # }
 
 
+# Cache
+# Must be shared by every gunicorn worker (guideline snapshots, counters), so the
+# default is file based; point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached when available.
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    },
+    # LLM rate-limit buckets and the guideline store rebuild lock: add() must be atomic across processes,
+    # so Redis, Memcached or the database cache (run `manage.py createcachetable`), never file based
+    'locks': {
+        'BACKEND': config('LOCK_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('LOCK_CACHE_LOCATION', default='cache_locks'),
+    },
+}
+
+# Compiled guideline arrays, memory-mapped read-only by every worker
+GUIDELINE_STORE_DIR = config('GUIDELINE_STORE_DIR', default=str(BASE_DIR / '.guideline_store'))
+# How often each process checks the shared cache for parameter/alias changes made by another one
+PARAMETER_REGISTRY_CHECK_SECONDS = config('PARAMETER_REGISTRY_CHECK_SECONDS', default=5.0, cast=float)
+
+# AI pipeline jobs run by `manage.py run_pipeline_worker`, outside the web workers
+PIPELINE_WORKER_CONCURRENCY = config('PIPELINE_WORKER_CONCURRENCY', default=2, cast=int)
+PIPELINE_WORKER_POLL_SECONDS = config('PIPELINE_WORKER_POLL_SECONDS', default=2.0, cast=float)
+# A running job without a heartbeat for this long is assumed orphaned and re-queued; workers sweep this often
+PIPELINE_JOB_STALE_SECONDS = config('PIPELINE_JOB_STALE_SECONDS', default=600, cast=int)
+PIPELINE_JOB_MAX_ATTEMPTS = config('PIPELINE_JOB_MAX_ATTEMPTS', default=3, cast=int)
+# Running jobs refresh their heartbeat this often, however long a single tool takes
+PIPELINE_JOB_HEARTBEAT_SECONDS = config('PIPELINE_JOB_HEARTBEAT_SECONDS', default=60.0, cast=float)
+
+# Identical LLM prompts are answered from the database instead of the paid APIs
+LLM_CACHE_ENABLED = config('LLM_CACHE_ENABLED', default=True, cast=bool)
+LLM_CACHE_TTL_SECONDS = config('LLM_CACHE_TTL_SECONDS', default=7 * 24 * 3600, cast=int)
+LLM_CACHE_MAX_ENTRIES = config('LLM_CACHE_MAX_ENTRIES', default=5000, cast=int)
+
+# Hedged LLM calls: the secondary provider is fired once the primary runs past this
+# percentile of its recent latencies (the default applies until enough samples exist)
+LLM_HEDGING_ENABLED = config('LLM_HEDGING_ENABLED', default=True, cast=bool)
+LLM_HEDGE_PERCENTILE = config('LLM_HEDGE_PERCENTILE', default=95, cast=float)
+LLM_HEDGE_DEFAULT_SECONDS = config('LLM_HEDGE_DEFAULT_SECONDS', default=15.0, cast=float)
+LLM_HEDGE_MIN_SECONDS = config('LLM_HEDGE_MIN_SECONDS', default=1.0, cast=float)
+
+# Provider circuit breakers: a failing LLM provider is skipped for a cooldown
+LLM_BREAKER_FAILURES = config('LLM_BREAKER_FAILURES', default=3, cast=int)
+LLM_BREAKER_ERROR_RATE = config('LLM_BREAKER_ERROR_RATE', default=0.5, cast=float)
+LLM_BREAKER_COOLDOWN_SECONDS = config('LLM_BREAKER_COOLDOWN_SECONDS', default=60, cast=int)
+LLM_RATE_LIMIT_COOLDOWN_SECONDS = config('LLM_RATE_LIMIT_COOLDOWN_SECONDS', default=30, cast=int)
+
+# Provider quotas enforced before calling out, shared by all workers, as JSON keyed by model, e.g.
+# {"gemini-1.5-pro": {"rpm": 360, "tpm": 4000000}, "deepseek-ai/deepseek-r1": {"rpm": 40}}
+LLM_RATE_LIMITS = config('LLM_RATE_LIMITS', default='{}', cast=json.loads)
+# Longest a call queues for quota before it is handed to the next provider
+LLM_RATE_LIMIT_MAX_WAIT_SECONDS = config('LLM_RATE_LIMIT_MAX_WAIT_SECONDS', default=30, cast=float)
+# Completion tokens reserved up front for clients without max_tokens; corrected from reported usage
+LLM_COMPLETION_TOKEN_ESTIMATE = config('LLM_COMPLETION_TOKEN_ESTIMATE', default=1024, cast=int)
+
+# Tool prompts are trimmed to a token budget (per tool in TOOL_DEPENDENCY_MAP, else this)
+AI_PROMPT_TOKEN_BUDGET = config('AI_PROMPT_TOKEN_BUDGET', default=2000, cast=int)
+AI_PROMPT_ENCODING = config('AI_PROMPT_ENCODING', default='cl100k_base')
+
+# Treatment recommendations for textbook cases come from info.json rules instead of the LLM
+AI_RULES_FAST_PATH = config('AI_RULES_FAST_PATH', default=True, cast=bool)
+
+# Hours of permeate production the RO product tank holds
+RO_TANK_BUFFER_HOURS = config('RO_TANK_BUFFER_HOURS', default=4, cast=float)
+
+# Quotations priced from the local catalog (services.pricing): installation as a share of equipment, then VAT
+QUOTE_CURRENCY = config('QUOTE_CURRENCY', default='KES')
+QUOTE_INSTALLATION_RATE = config('QUOTE_INSTALLATION_RATE', default=0.10, cast=float)
+QUOTE_VAT_RATE = config('QUOTE_VAT_RATE', default=0.16, cast=float)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 